@@ -1,9 +1,16 @@
+from db_models.alert_counter import AlertCounter
 from db_models.alerts import Alert, Warn
-from db_models.epg import Epg, EpgProgram
+from db_models.epg import Epg, EpgProgram, EpgProgramEntry
+from db_models.ingest_job import IngestJob
 from db_models.journey import Journey
+from db_models.live_event import LiveEvent
+from db_models.live_event_counter import LiveEventCounter
+from db_models.mos_counts import MosCounts
 from db_models.mos_percentages import MosPercentages
 from db_models.probe_config import ProbeConfig
 from db_models.program import Program
+from db_models.program_data_bucket import ProgramDataBucket
 from db_models.status_data import StatusData
 from db_models.video_analysis import MosAnalysis, VideoSettings, AudioSettings, VideoAnalysis, VideoSRC
+from db_models.video_analysis_rollup import VideoAnalysisRollup
 
@@ -0,0 +1,11 @@
+import mongoengine as me
+
+
+class AlertCounter(me.Document):
+    channel_id = me.StringField(description="Channel of the counted alerts. Not set for the default channel")
+    journey_datetime = me.DateTimeField(description="Datetime of journey (identifier) of the counted alerts")
+    program_name = me.StringField(default="", description="Name of program. Empty for the counters of the whole journey")
+    alerts = me.IntField(default=0, description="Number of alerts")
+    warnings = me.IntField(default=0, description="Number of warnings")
+    alert_categories = me.DictField(default={}, description="Number of alerts by category")
+    warning_categories = me.DictField(default={}, description="Number of warnings by category")
@@ -2,6 +2,7 @@ import mongoengine as me
 from datetime import datetime
 
 class Alert(me.Document):
+    channel_id = me.StringField(description="Channel of the alert. Not set for the default channel")
     journey_datetime = me.DateTimeField(description="Datetime of journey (identifier) for this object")
     program_name = me.StringField(description="Name of program")
     document_id = me.ObjectIdField(db_field="video_analysis")
@@ -17,6 +18,7 @@ class Alert(me.Document):
     video_second = me.IntField(description="Second of video where the alert is produced. Only for VOD")
 
 class Warn(me.Document):
+    channel_id = me.StringField(description="Channel of the alert. Not set for the default channel")
     journey_datetime = me.DateTimeField(description="Datetime of journey (identifier) for this object")
     program_name = me.StringField(description="Name of program")
     document_id = me.ObjectIdField(db_field="video_analysis")
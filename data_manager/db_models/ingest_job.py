@@ -0,0 +1,14 @@
+import mongoengine as me
+
+
+class IngestJob(me.Document):
+    channel_id = me.StringField(description="Channel of the measures. Not set for the default channel")
+    measures = me.ListField(me.DictField(), description="Measures from probe accepted by the ingest pipeline")
+    document_ids = me.ListField(me.StringField(), description="Ids assigned to the VideoAnalysis documents of the measures")
+    headers = me.DictField(description="Headers of the request that sent the measures")
+    worker_pid = me.IntField(description="PID of the worker processing the measures. PIDs are reused after a restart")
+    owner = me.StringField(description="Token of the worker process processing the measures. Not set after a failure")
+    leased_at = me.FloatField(description="Timestamp when the owner took the measures. Any worker takes them after the lease")
+    retry_at = me.FloatField(description="Timestamp when measures released after a failure can be processed again")
+    attempts = me.IntField(default=0, description="Number of failures processing the measures")
+    accepted_at = me.FloatField(description="Timestamp when the measures were accepted")
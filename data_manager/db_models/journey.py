@@ -1,11 +1,15 @@
 import mongoengine as me
+from db_models.mos_counts import MosCounts
 from db_models.mos_percentages import MosPercentages
 
 
 class Journey(me.Document):
+    channel_id = me.StringField(description="Channel of the journey. Not set for the default channel")
     journey_datetime = me.DateTimeField(description="Datetime of journey (identifier) for this object")
-    mos = me.FloatField(description="Average MOS of journey")
-    mos_percentages = me.EmbeddedDocumentField(MosPercentages, description="Array of percentages for MOS categories")
+    mos = me.FloatField(description="Average MOS of journey. Derived from mos_sum and measures on read")
+    mos_percentages = me.EmbeddedDocumentField(MosPercentages, description="Array of percentages for MOS categories. Derived from mos_counts on read")
+    mos_sum = me.FloatField(description="Sum of MOS values of journey measures")
+    mos_counts = me.EmbeddedDocumentField(MosCounts, description="Number of samples for each MOS category")
     measures = me.IntField(description="Measures")
     duration = me.IntField(description="Duration of journey in minutes")
     program_duration = me.IntField(description="Duration of programs in minutes if EPG is not provided")
@@ -0,0 +1,11 @@
+import mongoengine as me
+
+
+class LiveEvent(me.Document):
+    seq = me.IntField(description="Sequence number of the event, from LiveEventCounter. Id of the server-sent event")
+    channel_id = me.StringField(description="Channel of the event. Not set for the default channel")
+    event = me.StringField(description="Type of event: measure, status, alert or warning")
+    data = me.StringField(description="Content of the event, as JSON")
+    created_at = me.FloatField(description="Timestamp when the event was published")
+    # Capped, so it can be tailed by every worker and old events are dropped
+    meta = {"max_size": 16 * 1024 * 1024, "max_documents": 10000}
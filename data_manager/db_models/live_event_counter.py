@@ -0,0 +1,6 @@
+import mongoengine as me
+
+
+class LiveEventCounter(me.Document):
+    name = me.StringField(primary_key=True, description="Name of the sequence")
+    seq = me.IntField(default=0, description="Last sequence number given to a LiveEvent, by any worker")
@@ -0,0 +1,7 @@
+import mongoengine as me
+
+class MosCounts(me.EmbeddedDocument):
+    mos_poor = me.IntField(description="Number of POOR samples", default=0)
+    mos_regular = me.IntField(description="Number of REGULAR samples", default=0)
+    mos_good = me.IntField(description="Number of GOOD samples", default=0)
+    mos_excellent = me.IntField(description="Number of EXCELLENT samples", default=0)
@@ -2,6 +2,7 @@ import mongoengine as me
 
 
 class ProbeConfig(me.Document):
+    channel_id = me.StringField(description="Channel of the config. Not set for the default channel")
     url = me.StringField(default="udp://224.0.1.4:5678", description="URL where the video is being played")
     program_number = me.IntField(description="Program number in multiplex")
     mode = me.StringField(default="complete", description="Mode of analysis")
@@ -16,3 +17,4 @@ class ProbeConfig(me.Document):
     mos_regular = me.FloatField(default=1.7, description="Upper MOS threshold (not inclusive) for poor MOS category. Lower threshold for regular MOS category")
     mos_good = me.FloatField(default=2.7, description="Upper MOS threshold (not inclusive) for regular MOS category. Lower threshold for good MOS category")
     mos_excellent = me.FloatField(default=4.2, description="Lower MOS threshold for excellent MOS category.")
+    version = me.IntField(default=0, description="Version of the config. Increased on every change")
@@ -1,16 +1,21 @@
 import mongoengine as me
+from db_models.mos_counts import MosCounts
 from db_models.mos_percentages import MosPercentages
 
 
 class Program(me.Document):
+    channel_id = me.StringField(description="Channel of the program. Not set for the default channel")
     journey_datetime = me.DateTimeField(description="Datetime of journey (identifier) for this object")
     program_name = me.StringField(description="Title of program")
     start_datetime = me.DateTimeField(description="Initial datetime of program")
     end_datetime = me.DateTimeField(description="Final datetime of program")
     duration = me.IntField(description="Duration of program in minutes")
-    mos = me.FloatField(description="Average MOS value of program")
-    mos_percentages = me.EmbeddedDocumentField(MosPercentages, description="Array of percentages for MOS categories")
+    mos = me.FloatField(description="Average MOS value of program. Derived from mos_sum and measures on read")
+    mos_percentages = me.EmbeddedDocumentField(MosPercentages, description="Array of percentages for MOS categories. Derived from mos_counts on read")
+    mos_sum = me.FloatField(description="Sum of MOS values of program measures")
+    mos_counts = me.EmbeddedDocumentField(MosCounts, description="Number of samples for each MOS category")
     url = me.StringField(description="url of input", default="")
-    data = me.ListField(me.DictField(default={}), description="Data to draw histogram of program")
+    data = me.ListField(me.DictField(default={}), description="Data to draw histogram of program. Only used by programs stored before ProgramDataBucket")
+    measures = me.IntField(default=0, description="Number of measures of program")
     content_type = me.StringField(description="type of content: vod or live", default="live")
     video_settings = me.DictField(description="video settings of program")
\ No newline at end of file
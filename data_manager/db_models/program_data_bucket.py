@@ -0,0 +1,10 @@
+import mongoengine as me
+
+
+class ProgramDataBucket(me.Document):
+    channel_id = me.StringField(description="Channel of the program. Not set for the default channel")
+    journey_datetime = me.DateTimeField(description="Datetime of journey (identifier) of the program")
+    program_name = me.StringField(description="Title of program")
+    bucket_start = me.IntField(description="Ingestion timestamp, in ms, where the bucket starts")
+    count = me.IntField(default=0, description="Number of points in the bucket")
+    data = me.ListField(me.DictField(default={}), description="Points to draw histogram of program, in ingestion order")
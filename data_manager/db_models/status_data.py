@@ -3,6 +3,7 @@ from datetime import datetime
 
 
 class StatusData(me.Document):
+    channel_id = me.StringField(description="Channel of the probe. Not set for the default channel")
     url = me.StringField(default="udp://224.0.1.4:5678", description="URL where the video is being obtained")
     program_number = me.IntField(description="Program number of channel in multiplex")
     probe_pid = me.IntField(description="PID of probe process")
@@ -1,8 +1,70 @@
+import math
+import struct
 import mongoengine as me
+from bson.binary import Binary
 from db_models.mos_percentages import MosPercentages
 
+# Statistics kept as named fields in the compact layout too, as queries, aggregations and alerts use them
+VIDEO_STATISTICS_UNPACKED = ["temp_inf_avg", "spat_inf_avg", "blurring_avg"]
+# Statistics of VideoSettings packed as little-endian float64 in the stats field, by stats_version.
+# A released layout must never change, new statistics need a new version.
+VIDEO_STATISTICS_LAYOUTS = {
+    1: [
+        f"{measure}_{statistic}"
+        for measure in [
+            "temp_inf", "spat_inf", "blurring", "brightness_Y", "brightness_Cr", "brightness_Cb", "brightness_sat",
+            "contrast_Y", "contrast_Cr", "contrast_Cb", "contrast_sat"
+        ]
+        for statistic in ["max", "min", "std", "median", "avg", "skewness", "kurtosis"]
+        if f"{measure}_{statistic}" not in VIDEO_STATISTICS_UNPACKED
+    ]
+}
+# Version used when the compact layout is enabled
+VIDEO_STATISTICS_VERSION = 1
+
+
+def pack_video_statistics(video_settings, stats_version=VIDEO_STATISTICS_VERSION):
+    """Moves the statistics of a VideoSettings dict to the packed stats field. Missing values are stored as NaN.
+
+    :param video_settings: VideoSettings as stored in MongoDB. It is modified
+    :type video_settings: dict
+    :param stats_version: Layout of the packed statistics, defaults to VIDEO_STATISTICS_VERSION
+    :type stats_version: int, optional
+    :return: Same dict
+    :rtype: dict
+    """
+    layout = VIDEO_STATISTICS_LAYOUTS[stats_version]
+    values = [video_settings.pop(statistic, None) for statistic in layout]
+    video_settings["stats"] = Binary(struct.pack(
+        "<{}d".format(len(layout)), *[math.nan if value is None else float(value) for value in values]))
+    video_settings["stats_version"] = stats_version
+    return video_settings
+
+
+def unpack_video_statistics(video_settings):
+    """Restores the named statistics of a VideoSettings dict with packed stats. Dicts without them are not changed.
+
+    :param video_settings: VideoSettings as stored in MongoDB. It is modified
+    :type video_settings: dict
+    :return: Same dict
+    :rtype: dict
+    """
+    stats = video_settings.pop("stats", None)
+    stats_version = video_settings.pop("stats_version", None)
+    if stats is None or stats_version is None:
+        return video_settings
+    layout = VIDEO_STATISTICS_LAYOUTS[stats_version]
+    for statistic, value in zip(layout, struct.unpack("<{}d".format(len(layout)), bytes(stats))):
+        if not math.isnan(value):
+            video_settings[statistic] = value
+    return video_settings
+
 
 class VideoSettings(me.EmbeddedDocument):
+    """Video settings and statistics of a measure.
+    Statistics are stored as named fields or, with stats_version, packed in stats (see pack_video_statistics).
+    Packed statistics are unpacked when the document is loaded, so the rest of the code always sees named fields.
+    """
     codec = me.StringField(description="Video Codec", required=True)
     scan_type = me.StringField(description="Scan type of the sequence", required=True)
     duration = me.FloatField(description="Sequence duration in seconds", required=True)
@@ -106,6 +168,21 @@ class VideoSettings(me.EmbeddedDocument):
     contrast_sat_skewness = me.FloatField(description="Skewness value of blurring information")
     contrast_sat_kurtosis = me.FloatField(description="Kurtosis value of blurring information")
 
+    stats = me.BinaryField(description="Statistics packed with the layout of stats_version. Only in the compact layout")
+    stats_version = me.IntField(description="Layout of the packed statistics. Set it before saving to store them packed")
+
+    def __init__(self, *args, **kwargs):
+        super(VideoSettings, self).__init__(*args, **kwargs)
+        # Not marked as changed, so saving the loaded document does not write the statistics as named fields
+        if self._data.get("stats") is not None:
+            unpack_video_statistics(self._data)
+
+    def to_mongo(self, *args, **kwargs):
+        son = super(VideoSettings, self).to_mongo(*args, **kwargs)
+        if self._data.get("stats_version") is not None:
+            pack_video_statistics(son, self._data["stats_version"])
+        return son
+
 class AudioSettings(me.EmbeddedDocument):
     codec = me.StringField(description="Audio codec", required=True)
     sample_rate = me.FloatField(description="Sample rate of the audio signal", required=True)
@@ -129,12 +206,14 @@ class MosAnalysis(me.EmbeddedDocument):
     mos = me.FloatField(description="Mean Opinion Score (Mos)", default=2.5, required=True)
 
 class VideoAnalysis(me.Document):
+    channel_id = me.StringField(description="Channel of the measure. Not set for the default channel")
     journey_datetime = me.DateTimeField(description="Datetime of journey (identifier) for this object")
     content_type = me.StringField(description="type of content in streaming")
     timestamp = me.StringField(description="timestamp", default="2019-10-01 15:58:03 CEST", required=True)
     lost_frames = me.IntField(description="Lost frames in streaming", default=-2)
     mode = me.StringField(description="Mode of the process", default="complete", required=True)
     inserted_at = me.IntField(description="Ingestion timestamp", required=True)
+    created_at = me.DateTimeField(description="Ingestion datetime. Measures expire by the TTL index on this field")
     confidence_intervals = me.FloatField(description="Confidence percentage for the interval")
     mosAnalysis = me.EmbeddedDocumentField(MosAnalysis, description="Mos analysis information")
     videoSRC = me.EmbeddedDocumentField(VideoSRC, description="Video source information")
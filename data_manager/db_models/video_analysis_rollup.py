@@ -0,0 +1,27 @@
+import mongoengine as me
+from db_models.mos_counts import MosCounts
+from db_models.video_analysis import VideoSRC
+
+# Seconds of the period of each rollup resolution, finest first
+ROLLUP_RESOLUTIONS = {"minute": 60, "hour": 3600}
+
+
+class VideoAnalysisRollup(me.Document):
+    channel_id = me.StringField(description="Channel of the measures. Not set for the default channel")
+    resolution = me.StringField(description="Period of the rollup: minute or hour")
+    period_start = me.IntField(description="Ingestion timestamp, in ms, where the period starts")
+    period_datetime = me.DateTimeField(description="Datetime where the period starts")
+    expire_at = me.DateTimeField(description="Datetime when the rollup is removed by the TTL index of its resolution")
+    journey_datetime = me.DateTimeField(description="Datetime of journey (identifier) of the measures")
+    videoSRC = me.EmbeddedDocumentField(VideoSRC, description="Video source of the measures")
+    measures = me.IntField(default=0, description="Number of measures of the period")
+    mos_sum = me.FloatField(default=0.0, description="Sum of the MOS of the measures")
+    mos_min = me.FloatField(description="Minimum MOS of the period")
+    mos_max = me.FloatField(description="Maximum MOS of the period")
+    mos_counts = me.EmbeddedDocumentField(MosCounts, description="Number of measures of each MOS category")
+    feature_sums = me.DictField(default={}, description="Sum of each video feature, as spat_inf_avg or bitrate")
+    feature_samples = me.DictField(default={}, description="Number of measures with a numeric value of each video feature")
+    timestamp = me.StringField(description="Timestamp of the first measure of the period")
+    video_second = me.IntField(description="Video second of the first measure of the period")
+    pts = me.IntField(description="PTS of the first measure of the period")
+    first_values = me.DictField(default={}, description="First video settings and mode of the period, as width or codec")
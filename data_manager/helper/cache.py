@@ -1,4 +1,147 @@
+import functools
+import hashlib
+import pytz
+from uuid import uuid4
+from datetime import datetime
+from flask import request, make_response
 from flask_caching import Cache
+from pyrfc3339 import parse
 
+from helper import config as cfg
+from helper import global_variables as gv
+from helper.channel_scope import get_channel_id
 
-cache = Cache(config={'CACHE_TYPE': 'simple'})
\ No newline at end of file
+
+cache = Cache(config={'CACHE_TYPE': 'simple'})
+
+# Responses of the read endpoints, shared by every worker
+response_cache = Cache(config={
+    'CACHE_TYPE': cfg.response_cache_type,
+    'CACHE_DIR': cfg.response_cache_dir,
+    'CACHE_THRESHOLD': cfg.response_cache_threshold,
+    'CACHE_DEFAULT_TIMEOUT': cfg.response_cache_timeout
+})
+
+# Scope of the current and previous journey and program, changed by every ingested batch
+CURRENT_SCOPE = "current"
+
+
+def get_journey_scope(journey_datetime):
+    """Gets the scope of the cached responses of a journey
+
+    :param journey_datetime: Datetime of the journey, "current" or "previous"
+    :type journey_datetime: str or datetime.datetime
+    :return: Scope name
+    :rtype: str
+    """
+    if journey_datetime in [None, "", "current", "previous"]:
+        return CURRENT_SCOPE
+    if isinstance(journey_datetime, str):
+        journey_datetime = parse(journey_datetime)
+    # Same journey whatever the timezone of the datetime. Naive datetimes are UTC, as read from db
+    if journey_datetime.tzinfo is not None:
+        journey_datetime = journey_datetime.astimezone(pytz.utc).replace(tzinfo=None)
+    return "journey:{}".format(journey_datetime.replace(microsecond=0).isoformat())
+
+
+def get_program_scope(program_name):
+    """Gets the scope of the cached responses of a program
+
+    :param program_name: Name of the program, "current" or "previous"
+    :type program_name: str
+    :return: Scope name
+    :rtype: str
+    """
+    if program_name in [None, "", "None", "current", "previous"]:
+        return CURRENT_SCOPE
+    return "program:{}".format(program_name)
+
+
+def get_search_scopes():
+    """Scopes of a historic search, from the body of the request
+    """
+    search_data = request.get_json(force=True, silent=True) or {}
+    return [get_journey_scope(search_data.get("journey_datetime"))]
+
+
+def get_version_key(scope):
+    """Gets the key of the version of a scope. Scopes of each channel have their own versions
+
+    :param scope: Scope from get_journey_scope and get_program_scope
+    :type scope: str
+    :return: Key in response_cache
+    :rtype: str
+    """
+    return "version:{}:{}".format(get_channel_id() or "", scope)
+
+
+def invalidate_response_cache(scopes):
+    """Discards the cached responses of some scopes of the channel in scope. Called by the ingest path when their data changes.
+
+    :param scopes: Scopes from get_journey_scope and get_program_scope
+    :type scopes: list[str]
+    """
+    try:
+        response_cache.set_many({get_version_key(scope): uuid4().hex for scope in set(scopes)}, timeout=0)
+    except Exception as e:
+        gv.logger.error(e)
+
+
+def get_scope_versions(scopes):
+    versions = response_cache.get_many(*[get_version_key(scope) for scope in scopes])
+    for index, version in enumerate(versions):
+        if version is None:
+            versions[index] = uuid4().hex
+            response_cache.set(get_version_key(scopes[index]), versions[index], timeout=0)
+    return versions
+
+
+def get_response_cache_timeout(scopes):
+    """Responses of closed journeys do not expire, they are only discarded by invalidate_response_cache
+    """
+    try:
+        current_journey_scope = get_journey_scope(gv.api_dm.db_manager.journey_manager.journey_datetime)
+    except Exception:
+        return cfg.response_cache_timeout
+    for scope in scopes:
+        if not scope.startswith("journey:") or current_journey_scope == CURRENT_SCOPE:
+            return cfg.response_cache_timeout
+        if datetime.fromisoformat(scope[len("journey:"):]) >= datetime.fromisoformat(current_journey_scope[len("journey:"):]):
+            return cfg.response_cache_timeout
+    return 0
+
+
+def cached_response(get_scopes):
+    """Caches the successful responses of a view in response_cache, by channel, path, query string, body and
+    the versions of their scopes, so they are discarded when the ingest path invalidates any of them.
+
+    :param get_scopes: Function that receives the arguments of the view and returns the scopes of the response
+    :type get_scopes: function
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                scopes = get_scopes(*args, **kwargs)
+                request_hash = hashlib.sha1(request.query_string + request.get_data()).hexdigest()
+                cache_key = "response:{}:{}:{}:{}:{}".format(
+                    get_channel_id() or "", request.method, request.path, request_hash,
+                    ":".join(get_scope_versions(scopes)))
+                cached = response_cache.get(cache_key)
+            except Exception as e:
+                gv.logger.error(e)
+                return view(*args, **kwargs)
+            if cached is not None:
+                return cached["body"], cached["status"], cached["headers"]
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                headers = {
+                    header: value for header, value in response.headers.items()
+                    if header in ["Content-Type", "X-Total-Count"]
+                }
+                response_cache.set(
+                    cache_key, {"body": response.get_data(), "status": response.status_code, "headers": headers},
+                    timeout=get_response_cache_timeout(scopes))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,57 @@
+import re
+from contextlib import contextmanager
+from threading import local
+
+from helper import config as cfg
+
+# Channel of the current request or thread. Greenlet-local once gevent has patched threading
+_scope = local()
+
+
+def get_channel_id():
+    """Gets the channel of the current request or thread
+
+    :return: Id of the channel, None for the default channel
+    :rtype: str
+    """
+    return getattr(_scope, "channel_id", None)
+
+
+def set_channel_id(channel_id):
+    """Sets the channel of the current request or thread
+
+    :param channel_id: Id of the channel, None for the default channel
+    :type channel_id: str
+    """
+    _scope.channel_id = channel_id
+
+
+@contextmanager
+def channel_scope(channel_id):
+    """Runs a block in the scope of a channel, restoring the previous one after it
+
+    :param channel_id: Id of the channel, None for the default channel
+    :type channel_id: str
+    """
+    previous_channel_id = get_channel_id()
+    set_channel_id(channel_id)
+    try:
+        yield
+    finally:
+        set_channel_id(previous_channel_id)
+
+
+def parse_channel_id(value):
+    """Validates a channel id received by the API
+
+    :param value: Channel id from a query argument or a header, empty or None for the default channel
+    :type value: str
+    :raises ValueError: The id does not match cfg.channel_id_pattern
+    :return: Id of the channel, None for the default channel
+    :rtype: str
+    """
+    if value in [None, ""]:
+        return None
+    if re.fullmatch(cfg.channel_id_pattern, value) is None:
+        raise ValueError(f"Invalid channel id {value}, it must match {cfg.channel_id_pattern}")
+    return value
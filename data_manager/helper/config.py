@@ -17,12 +17,29 @@ db_name = "VideoDB"
 db_host = "127.0.0.1"
 db_port = str(os.getenv("DB_PORT"))
 collection_name = "video_params"
+#Pool of the MongoDB client of each worker, shared by every manager and thread.
+#A worker opens at most db_max_pool_size connections, plus one per server to monitor it
+db_max_pool_size = int(os.getenv("VIDEOMOS_DB_MAX_POOL_SIZE")) if "VIDEOMOS_DB_MAX_POOL_SIZE" in os.environ else 20
+db_min_pool_size = 0
+#Milliseconds an idle connection is kept in the pool
+db_max_idle_time_ms = 60000
+#Milliseconds a request waits for a free connection of the pool before failing, instead of queueing forever
+db_wait_queue_timeout_ms = 10000
+db_connect_timeout_ms = 5000
+db_server_selection_timeout_ms = 10000
+#Milliseconds without answer before a query fails. Long enough for the historic aggregations
+db_socket_timeout_ms = 120000
+#Wire compression, e.g. "zstd,zlib" for a remote MongoDB. Empty disables it
+db_compressors = os.getenv("VIDEOMOS_DB_COMPRESSORS") if "VIDEOMOS_DB_COMPRESSORS" in os.environ else ""
 success_msg = "Successful operation"
 error_msg = "An error occurred when processing."
 
 
 # Tasks
 bulk_data_task = "Bulk document into MongoDB"
+batch_data_task = "Bulk batch of documents into MongoDB"
+get_ingest_stats_task = "Get ingest pipeline stats"
+get_live_feed_task = "Get live feed of measures, status and alerts"
 get_document_id_task = "Get document by ID"
 put_document_id_task = "Put document by ID"
 delete_document_id_task = "Delete document by ID"
@@ -32,8 +49,12 @@ export_db_task = "Export db"
 get_documents_by_datetime_range = "Get documents by Datetime range"
 launch_videoqualityprobe = "Launch video quality probe"
 stop_videoqualityprobe = "Stopped video quality probe"
+get_probe_resources = "Get resources used by video quality probe"
+get_channels_task = "Get channels and the status of their probes"
 update_frame = "Frame updated"
 get_journey_data = "Get data from specific journey"
+get_program_data = "Get data from specific program"
+get_epg_now_next = "Get current and next EPG programs"
 get_average_mos = "Get average MOS in a concrete period of time"
 get_mos_percentages = "Get MOS categories in a concrete period of time"
 get_historic_samples = "Get samples to build the historigram of a datetime range"
@@ -58,6 +79,24 @@ dict_filetypes = {
 # Dict of allowed filetypes for the historic
 historic_filetypes_allowed = ["csv", "json"]
 
+#Documents read and written together when exporting a historic search file
+export_chunk_documents = 1000
+#Maximum size (MB) of the export cache of historic search files
+export_cache_max_size_mb = 1024
+#Seconds since their last use before export cache files are removed
+export_cache_max_age = 7 * 86400
+#Seconds between evictions of the export cache
+export_cache_janitor_interval = 600
+
+#Backend of the response cache of read endpoints, shared by the workers: "filesystem", or "simple" (one per process, for tests)
+response_cache_type = os.getenv("RESPONSE_CACHE_TYPE") if "RESPONSE_CACHE_TYPE" in os.environ else "filesystem"
+#Directory of the filesystem response cache. Shared memory, so it does not wear the disk
+response_cache_dir = "/dev/shm/data_manager_response_cache"
+#Seconds a cached response of the current journey is kept. Responses of closed journeys do not expire
+response_cache_timeout = 300
+#Maximum number of cached responses
+response_cache_threshold = 10000
+
 # Dict of filenames for server
 dict_server_filenames = {
     "csv_datetime_filename": "historic.csv",
@@ -104,13 +143,113 @@ no_audio_settings = {
 rss_threshold_mb = float(os.getenv("VIDEOMOS_MAX_RAM_MB")) \
     if "VIDEOMOS_MAX_RAM_MB" in os.environ else 1.5*1024
 
+#Seconds the probe memory has to stay over rss_threshold_mb to restart it
+resource_breach_seconds = float(os.getenv("VIDEOMOS_MAX_RAM_SECONDS")) \
+    if "VIDEOMOS_MAX_RAM_SECONDS" in os.environ else 60
+
+#A memory breach ends when the probe memory goes below this ratio of rss_threshold_mb
+resource_release_ratio = 0.9
+
+#Seconds between samples of the probe resources (memory, CPU and open files)
+resource_sample_interval = 5
+
+#Samples of the probe resources kept in memory (1 hour)
+resource_history_size = 720
+
+#Seconds of samples used to compute the trends of the probe resources, as the memory leak rate
+resource_trend_seconds = 600
+
 log_level = os.getenv("VIDEOMOS_LOG_LEVEL") \
     if ("VIDEOMOS_LOG_LEVEL" in os.environ and os.getenv("VIDEOMOS_LOG_LEVEL") in ["DEBUG", "INFO", "WARNING", "ERROR"]) \
     else "WARNING"
 
+#Stores the VideoSettings statistics packed in a binary vector (see db_models.video_analysis)
+video_statistics_compact = os.getenv("VIDEOMOS_COMPACT_STATISTICS") in ["1", "true", "True"] \
+    if "VIDEOMOS_COMPACT_STATISTICS" in os.environ else False
+
 #Interval time to check health of videoqualityprobe (s)
 healthcheck_interval = 10
 
+#Restart policy of the probes after they exit, by content type: "always", "on-failure" (exit code not 0) or "never"
+probe_restart_policy = {
+    "live": os.getenv("VIDEOMOS_PROBE_RESTART_POLICY")
+        if os.getenv("VIDEOMOS_PROBE_RESTART_POLICY") in ["always", "on-failure", "never"] else "always",
+    "vod": "never",
+    "playlist": "never"
+}
+
+#Seconds before restarting a probe that exits again right after a restart. Doubled on each exit up to the maximum
+probe_restart_backoff = 0.5
+probe_restart_max_backoff = 30
+
+#Seconds a probe has to keep running to restart it without delay the next time it exits
+probe_restart_reset_seconds = 60
+
+#Seconds a probe has to exit after SIGTERM before being killed
+probe_stop_timeout = 3
+
+#Seconds a probe launched by another worker can be dead before this worker restarts it
+probe_orphan_timeout = probe_restart_max_backoff + healthcheck_interval
+
+#Channels: each one has its own config, probe, status, journeys, programs and alerts.
+#Requests choose it with the channel_id query argument or the X-Channel-Id header, the default channel otherwise
+channel_id_pattern = r"[A-Za-z0-9_-]{1,64}"
+channel_header = "X-Channel-Id"
+#Maximum number of channels handled by each worker
+max_channels = int(os.getenv("VIDEOMOS_MAX_CHANNELS")) if "VIDEOMOS_MAX_CHANNELS" in os.environ else 64
+
+#Seconds before the cached probe status is reloaded from DB
+status_cache_ttl = 1.0
+
+#Minimum seconds between checks of the config version in DB
+config_version_check_interval = 2.0
+
+#Maximum number of measures accepted in a single batch request
+max_batch_documents = 500
+
+#Ingest pipeline: measures are accepted and then predicted, persisted, aggregated and checked for alerts in background
+ingest_pipeline_enabled = True
+#Maximum number of items waiting in each stage of the ingest pipeline
+ingest_queue_size = 1000
+#Maximum number of accepted requests predicted together in a single request to VideoQA
+ingest_predict_batch_size = 50
+#Workers of the predict stage. Rest of stages use one worker to keep the order of the measures
+ingest_predict_workers = 1
+#Journal accepted measures in MongoDB, so they are processed after a restart
+ingest_journal_enabled = True
+#Seconds a worker owns the journaled measures it accepted or recovered. Then any worker can process them again
+ingest_job_lease_seconds = 300
+#Seconds between searches of journaled measures left by stopped workers or released after a failure
+ingest_journal_recover_interval = 30
+#Seconds before journaled measures are retried after a failure, doubled on each failure up to the lease
+ingest_job_retry_seconds = 5
+
+#Seconds between keep-alive comments of the live feed streams
+live_feed_heartbeat = 15
+#Events waiting to be sent to each live feed client. Slower clients are disconnected and replay the missed events
+live_feed_client_queue_size = 1000
+
+#Minutes of measures stored in each bucket of program data
+program_data_bucket_minutes = 10
+
+#Maximum number of points of the historic graph. Larger searches are downsampled, 0 returns every point
+historic_graph_max_points = 2000
+#Downsampling of the historic graph: "bucket" (min/avg/max MOS per time bucket, computed in MongoDB) or "lttb"
+historic_graph_downsampling = "bucket"
+
+#Days raw measures are kept before their TTL index removes them. 0 keeps them forever.
+#Off by default, as enabling it also deletes the measures stored before the upgrade older than these days
+raw_measures_retention_days = float(os.getenv("VIDEOMOS_RAW_RETENTION_DAYS")) \
+    if "VIDEOMOS_RAW_RETENTION_DAYS" in os.environ else 0
+#Days the rollups of each resolution are kept. 0 keeps them forever
+rollup_retention_days = {"minute": 180, "hour": 5*365}
+#Seconds between rollups of the measures
+rollup_interval = 60
+#Seconds measures wait before being rolled up, so batches still being inserted are complete
+rollup_delay = 60
+#Hours of raw measures read by each rollup query
+rollup_chunk_hours = 6
+
 #Confidence interval
 confidence_percentage = 0.95
 
@@ -118,6 +257,9 @@ confidence_percentage = 0.95
 warning_anomaly_threshold = 0.5
 alert_anomaly_threshold = 0.75
 
+#Seconds between writes of the open alerts extended in memory
+alert_flush_interval = 1.0
+
 process_name = "videoqualityprobe"
 
 playlist_extension = ".mvs"
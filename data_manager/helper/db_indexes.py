@@ -0,0 +1,168 @@
+import traceback
+
+from helper import global_variables as gv
+
+# Indexes of each collection, with the queries they serve. Queries by _id only use the default index.
+# Keys are ordered equality fields first, then sort and range fields.
+INDEX_REGISTRY = {
+    "video_analysis": [
+        # Rollups, retention and legacy expiration of the measures of every channel
+        {"keys": [("inserted_at", -1)]},
+        # Time searches of a channel
+        {"keys": [("channel_id", 1), ("inserted_at", -1)]},
+        # Time searches of a channel by url and program
+        {"keys": [("channel_id", 1), ("videoSRC.url", 1), ("videoSRC.program_name", 1), ("inserted_at", 1)]},
+        # Journey searches, by url and program
+        {"keys": [("channel_id", 1), ("journey_datetime", -1), ("videoSRC.url", 1), ("videoSRC.program_name", 1),
+                  ("inserted_at", 1)]},
+        # Last measures of a channel
+        {"keys": [("channel_id", 1), ("_id", -1)]}
+    ],
+    "video_analysis_rollup": [
+        # Identifies each rollup, and serves the time searches
+        {"keys": [("channel_id", 1), ("resolution", 1), ("period_start", 1), ("journey_datetime", 1),
+                  ("videoSRC.url", 1), ("videoSRC.program_name", 1)], "unique": True},
+        # Journey searches
+        {"keys": [("channel_id", 1), ("resolution", 1), ("journey_datetime", -1), ("period_start", 1)]},
+        # Last hour rolled up, of every channel
+        {"keys": [("resolution", 1), ("period_start", -1)]},
+        # Each rollup has the expiration datetime of its resolution
+        {"keys": [("expire_at", 1)], "expireAfterSeconds": 0}
+    ],
+    "journey": [
+        # Journey by datetime, journey list and previous journey
+        {"keys": [("channel_id", 1), ("journey_datetime", -1)]}
+    ],
+    "program": [
+        # Program by journey and name
+        {"keys": [("channel_id", 1), ("journey_datetime", -1), ("program_name", -1)]},
+        # Programs of a journey, newest first
+        {"keys": [("channel_id", 1), ("journey_datetime", -1), ("start_datetime", -1)]},
+        # Previous program
+        {"keys": [("channel_id", 1), ("start_datetime", -1)]},
+        # Last program
+        {"keys": [("channel_id", 1), ("_id", -1)]}
+    ],
+    "program_data_bucket": [
+        {"keys": [("channel_id", 1), ("journey_datetime", -1), ("program_name", -1), ("bucket_start", 1)]}
+    ],
+    "alert": [
+        # Alert lists of a program and counts by category
+        {"keys": [("channel_id", 1), ("journey_datetime", -1), ("program_name", -1), ("start_datetime", -1),
+                  ("_id", -1)]},
+        # Alert lists of a journey
+        {"keys": [("channel_id", 1), ("journey_datetime", -1), ("start_datetime", -1), ("_id", -1)]},
+        # Last alert of a category, to extend it
+        {"keys": [("channel_id", 1), ("journey_datetime", -1), ("program_name", -1), ("category", 1),
+                  ("start_datetime", -1)]},
+        # Alert lists of a program name in any journey
+        {"keys": [("channel_id", 1), ("program_name", -1), ("start_datetime", -1), ("_id", -1)]},
+        # Alert lists of everything and of a time range
+        {"keys": [("channel_id", 1), ("start_datetime", -1), ("_id", -1)]}
+    ],
+    "alert_counter": [
+        {"keys": [("channel_id", 1), ("journey_datetime", -1), ("program_name", -1)], "unique": True},
+        # Counters of a program name in every journey
+        {"keys": [("channel_id", 1), ("program_name", -1)]}
+    ],
+    "status_data": [
+        # Latest status of a channel
+        {"keys": [("channel_id", 1), ("_id", -1)]}
+    ],
+    "live_event": [
+        # Last event and resume of the tailing cursor of each worker
+        {"keys": [("seq", 1)]},
+        # Events missed by a client of a channel
+        {"keys": [("channel_id", 1), ("seq", 1)]}
+    ],
+    "ingest_job": [
+        # Journaled measures of a channel, in order
+        {"keys": [("channel_id", 1), ("_id", 1)]}
+    ],
+    "epg": [
+        {"keys": [("channels", -1)]},
+        {"keys": [("epg_program", -1)]},
+        {"keys": [("epg_program.channel", -1)]}
+    ],
+    "epg_program": [
+        # Programs are unique by channel and time, which also serves the range queries of a channel
+        {"keys": [("channel", 1), ("start_datetime", 1), ("end_datetime", 1)], "unique": True},
+        # Programs of every channel not finished yet
+        {"keys": [("end_datetime", 1)]}
+    ]
+}
+# Same indexes for both types of alert
+INDEX_REGISTRY["warn"] = INDEX_REGISTRY["alert"]
+
+# Indexes replaced by the ones of INDEX_REGISTRY, dropped at startup. Unique ones would reject
+# the documents of a channel with the same key as another channel.
+OBSOLETE_INDEXES = {
+    "video_analysis": [
+        [("videoSRC.url", 1), ("videoSRC.program_name", 1), ("inserted_at", 1)],
+        [("journey_datetime", -1), ("videoSRC.url", 1), ("videoSRC.program_name", 1), ("inserted_at", 1)]
+    ],
+    "video_analysis_rollup": [
+        [("resolution", 1), ("period_start", 1), ("journey_datetime", 1), ("videoSRC.url", 1),
+         ("videoSRC.program_name", 1)],
+        [("resolution", 1), ("journey_datetime", -1), ("period_start", 1)]
+    ],
+    "journey": [
+        [("journey_datetime", -1)]
+    ],
+    "program": [
+        [("journey_datetime", -1), ("program_name", -1)],
+        [("journey_datetime", -1), ("start_datetime", -1)],
+        [("start_datetime", -1)]
+    ],
+    "program_data_bucket": [
+        [("journey_datetime", -1), ("program_name", -1), ("bucket_start", 1)]
+    ],
+    "alert": [
+        [("journey_datetime", -1), ("program_name", -1), ("start_datetime", -1), ("_id", -1)],
+        [("journey_datetime", -1), ("start_datetime", -1), ("_id", -1)],
+        [("journey_datetime", -1), ("program_name", -1), ("category", 1), ("start_datetime", -1)],
+        [("program_name", -1), ("start_datetime", -1), ("_id", -1)],
+        [("start_datetime", -1), ("_id", -1)]
+    ],
+    "alert_counter": [
+        [("journey_datetime", -1), ("program_name", -1)],
+        [("program_name", -1)]
+    ]
+}
+OBSOLETE_INDEXES["warn"] = OBSOLETE_INDEXES["alert"]
+
+
+def create_indexes(db):
+    """Creates the indexes of INDEX_REGISTRY that do not exist yet. Called once at startup, never from the queries.
+    Indexes are built in background so the collections are not locked while building them.
+    Obsolete indexes are dropped before.
+
+    :param db: MongoDB database
+    :type db: pymongo.database.Database
+    """
+    drop_obsolete_indexes(db)
+    for collection_name, indexes in INDEX_REGISTRY.items():
+        for index in indexes:
+            try:
+                options = {option: value for option, value in index.items() if option != "keys"}
+                _ = db[collection_name].create_index(index["keys"], background=True, **options)
+            except Exception as e:
+                gv.logger.error("Index {} of {} not created: {}".format(index["keys"], collection_name, e))
+                gv.logger.error(traceback.print_exc())
+
+
+def drop_obsolete_indexes(db):
+    """Drops the indexes of OBSOLETE_INDEXES that still exist
+
+    :param db: MongoDB database
+    :type db: pymongo.database.Database
+    """
+    for collection_name, obsolete_keys in OBSOLETE_INDEXES.items():
+        try:
+            for index in list(db[collection_name].list_indexes()):
+                if list(index["key"].items()) in obsolete_keys:
+                    db[collection_name].drop_index(index["name"])
+                    gv.logger.warning("Obsolete index {} of {} dropped".format(index["name"], collection_name))
+        except Exception as e:
+            gv.logger.error("Obsolete indexes of {} not dropped: {}".format(collection_name, e))
+            gv.logger.error(traceback.print_exc())
@@ -1,3 +1,8 @@
+import math
+from datetime import datetime
+from bson import ObjectId, json_util
+
+
 def build_output(task, status, message, output):
     """Creates the generic output message of the API
     
@@ -13,4 +18,100 @@ def build_output(task, status, message, output):
     :rtype: dict
     """
     return {"task": task, "code": status, "message": message,
-                    "output": output}
\ No newline at end of file
+                    "output": output}
+
+def to_extended_json(document):
+    """Formats the ids and dates of a document read with as_pymongo or aggregate as MongoDB extended JSON,
+    the same output as to_json without building the mongoengine document
+
+    :param document: Document from pymongo
+    :type document: dict
+    :return: Document ready to be parsed as a JSON
+    :rtype: dict
+    """
+    return {
+        field: json_util.default(value) if isinstance(value, (ObjectId, datetime)) else value
+        for field, value in document.items()
+    }
+
+def get_graph_bucket_size(init_time, end_time, resolution, max_points):
+    """Gets the size of the graph buckets of a time range, the resolution enlarged if needed to fit max_points
+    
+    :param init_time: First time of the range
+    :type init_time: int
+    :param end_time: Last time of the range
+    :type end_time: int
+    :param resolution: Minimum size of each bucket, None for no minimum
+    :type resolution: int
+    :param max_points: Maximum number of buckets, 0 for no maximum
+    :type max_points: int
+    :return: Size of each bucket, at least 1
+    :rtype: int
+    """
+    bucket_size = 1
+    if resolution is not None:
+        bucket_size = resolution
+    if max_points > 0:
+        bucket_size = max(bucket_size, math.ceil((end_time - init_time + 1) / max_points))
+    return max(1, int(math.ceil(bucket_size)))
+
+def get_bucket_start_expression(field, init_time, bucket_size):
+    """Builds the aggregation expression of the start of the bucket of a field.
+    Buckets are aligned to init_time, so a range of max_points * bucket_size never spans an extra bucket.
+    
+    :param field: Numeric field of the documents
+    :type field: str
+    :param init_time: First time of the range
+    :type init_time: int
+    :param bucket_size: Size of each bucket, in units of field
+    :type bucket_size: int
+    :return: Aggregation expression
+    :rtype: dict
+    """
+    return {"$subtract": [f"${field}", {"$mod": [{"$subtract": [f"${field}", init_time]}, bucket_size]}]}
+
+def downsample_lttb(points, threshold, x_index=0, y_index=1):
+    """Downsamples a series with the Largest-Triangle-Three-Buckets algorithm, which keeps the visual shape of the series.
+    First and last points are always kept.
+    
+    :param points: Points of the series, sorted by x
+    :type points: list[tuple]
+    :param threshold: Maximum number of points returned
+    :type threshold: int
+    :param x_index: Index of the x value in each point, defaults to 0
+    :type x_index: int, optional
+    :param y_index: Index of the y value in each point, defaults to 1
+    :type y_index: int, optional
+    :return: Selected points of the series
+    :rtype: list[tuple]
+    """
+    if threshold >= len(points):
+        return points
+    if threshold < 3:
+        return [points[0], points[-1]][:threshold]
+    sampled_points = [points[0]]
+    # Points between first and last are split in threshold - 2 buckets
+    bucket_size = (len(points) - 2) / (threshold - 2)
+    selected_index = 0
+    for bucket in range(threshold - 2):
+        bucket_start = int(bucket * bucket_size) + 1
+        bucket_end = int((bucket + 1) * bucket_size) + 1
+        # Average of the next bucket is the third vertex of the triangle
+        next_start = bucket_end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, len(points))
+        next_points = points[next_start:next_end] or [points[-1]]
+        avg_x = sum(point[x_index] for point in next_points) / len(next_points)
+        avg_y = sum(point[y_index] for point in next_points) / len(next_points)
+        selected_x = points[selected_index][x_index]
+        selected_y = points[selected_index][y_index]
+        max_area = -1
+        for index in range(bucket_start, bucket_end):
+            area = abs((selected_x - avg_x) * (points[index][y_index] - selected_y)
+                - (selected_x - points[index][x_index]) * (avg_y - selected_y))
+            if area > max_area:
+                max_area = area
+                next_selected_index = index
+        selected_index = next_selected_index
+        sampled_points.append(points[selected_index])
+    sampled_points.append(points[-1])
+    return sampled_points
@@ -16,7 +16,8 @@ import time
 from helper import config as cfg
 from helper import global_variables as gv
 from helper import utils
-from helper.cache import cache
+from helper.cache import cache, response_cache
+from helper.channel_scope import parse_channel_id, set_channel_id
 
 # Import views (endpoints)
 import views
@@ -29,6 +30,7 @@ warnings.filterwarnings('ignore')
 
 app = Flask(__name__, template_folder="static/templates")
 cache.init_app(app)
+response_cache.init_app(app)
 CORS(app, resources={r"/*": {"origins": "*"}})
 app.config['CORS_SUPPORTS_CREDENTIALS'] = True
 app.config['CORS_ALLOW_HEADERS'] = 'Content-Type, Authorization'
@@ -57,6 +59,30 @@ app.register_blueprint(views.vod_view)
 app.register_blueprint(views.anomalies_view)
 
 
+@app.before_request
+def set_request_channel():
+    """Sets the channel of the request, from the channel_id query argument or the X-Channel-Id header.
+    Channels are created when their config is put for the first time.
+    """
+    # Greenlets are reused by keep-alive connections, so the scope is always set
+    set_channel_id(None)
+    try:
+        channel_id = parse_channel_id(request.args.get("channel_id") or request.headers.get(cfg.channel_header))
+    except ValueError as e:
+        return jsonify(utils.build_output(task="Set channel", status=400, message=str(e), output={})), 400
+    if channel_id is None or gv.api_dm is None:
+        return None
+    try:
+        gv.api_dm.get_channel(channel_id, create=(
+            request.method == "PUT" and request.endpoint == "probe.api_put_config_videoqualityprobe"))
+    except KeyError as e:
+        return jsonify(utils.build_output(task="Set channel", status=404, message=str(e.args[0]), output={})), 404
+    except ValueError as e:
+        return jsonify(utils.build_output(task="Set channel", status=400, message=str(e), output={})), 400
+    set_channel_id(channel_id)
+    return None
+
+
 """DOCS"""
 @app.route('/docs', methods=['GET'])
 def api_render_docs():
@@ -1,25 +1,26 @@
 import subprocess
 import traceback 
-import psutil
 import time
 from gevent.lock import BoundedSemaphore
 from helper import global_variables as gv
 from helper import config as cfg
 from helper import utils
-from db_models import StatusData
 import routers
-from managers.thread_playlist import PlaylistPlayer
+from helper.channel_scope import channel_scope, get_channel_id, set_channel_id
 from managers.db_connection import DbConnection
-from managers.db_managers.mongodb_manager import MongoDbManager
-from managers.probe_healthchecker import ProbeHealthChecker
+from managers.channel import Channel
+from managers.export_cache import ExportCache
+from managers.live_feed import LiveFeed
 from managers import VideoQualityPredManager
+from db_models import ProbeConfig
 
 
 class DataManagerAPI:
     """
     This class represents the DataManager's API Server Manager
-    It contains the MongoDB Managing module named as dbManager in addition to
-    the different routers for each type of blueprint
+    It contains the channels, each one with its MongoDB Managing module named as dbManager in addition to
+    the different routers for each type of blueprint. Managers and routers of the channel in scope
+    (see helper.channel_scope) are available as attributes of this object.
 
     :param db_manager: MongoDB manager, defaults to None
     :type db_manager: managers.db_managers.mongodb_manager, optional
@@ -45,128 +46,214 @@ class DataManagerAPI:
                 program_router=None, historic_router=None, document_router=None):
         """Constructor        
         """
-        self.db_manager = MongoDbManager(DbConnection())
+        self.db_connection = DbConnection()
+        self.live_feed = LiveFeed()
+        self.live_feed.start()
         self.videoqualitypred_manager = VideoQualityPredManager()
         self.db_router = routers.DbRouter()
         self.file_router = routers.FileRouter()
-        self.config_router = routers.ConfigRouter(self.db_manager.config_manager)
-        self.probe_router = routers.ProbeRouter(self.db_manager.config_manager)
-        self.alert_router = routers.AlertRouter(self.db_manager.alert_manager)
-        self.journey_router = routers.JourneyRouter(self.db_manager.journey_manager)
-        self.program_router = routers.ProgramRouter(self.db_manager.program_manager)
-        self.historic_router = routers.HistoricRouter(self.db_manager.historic_manager,
-                                                    self.db_manager.journey_manager,
-                                                    self.db_manager.alert_manager,
-                                                    self.db_manager.mos_calculator)
-        self.document_router = routers.DocumentRouter(self.db_manager.document_manager,
-                                                     self.videoqualitypred_manager)
-        self.probe_healthchecker = ProbeHealthChecker()
-        self.probe_healthchecker.start()
-        self.probe_status_lock = BoundedSemaphore(1)
-        self.last_document_time_lock = BoundedSemaphore(1)
+        self.export_cache = ExportCache()
+        self.export_cache.start()
+        # Channels by id. The default channel (None) always exists and creates the EPG shared by the rest
+        self.channels = {}
+        self.channels_lock = BoundedSemaphore(1)
+        self.default_channel = self.add_channel(None)
+        # (url, program_number) of the source of each channel, to know the channel of the measures
+        self.source_channels = {}
+        self.source_channels_loaded_at = None
+        for channel_id in ProbeConfig.objects(channel_id__ne=None).distinct("channel_id"):
+            self.add_channel(channel_id)
+
+    def add_channel(self, channel_id):
+        """Creates and starts a channel, unless it already exists
+
+        :param channel_id: Id of the channel, None for the default channel
+        :type channel_id: str
+        :raises ValueError: There are already cfg.max_channels channels
+        :return: Channel
+        :rtype: managers.channel.Channel
+        """
+        self.channels_lock.acquire()
+        try:
+            channel = self.channels.get(channel_id)
+            if channel is None:
+                if len(self.channels) >= cfg.max_channels:
+                    raise ValueError("Maximum number of channels ({}) reached".format(cfg.max_channels))
+                epg_manager = self.default_channel.db_manager.epg_manager if channel_id is not None else None
+                with channel_scope(channel_id):
+                    channel = Channel(channel_id, self.db_connection, self.live_feed,
+                                      self.videoqualitypred_manager, self.export_cache, epg_manager)
+                self.channels[channel_id] = channel
+                channel.start()
+        finally:
+            self.channels_lock.release()
+        return channel
+
+    def get_channel(self, channel_id=None, create=False):
+        """Gets a channel. Channels configured by another worker are created on first use.
+
+        :param channel_id: Id of the channel, defaults to None (default channel)
+        :type channel_id: str, optional
+        :param create: Creates the channel even if it has no config yet, defaults to False
+        :type create: bool, optional
+        :raises KeyError: The channel does not exist
+        :return: Channel
+        :rtype: managers.channel.Channel
+        """
+        channel = self.channels.get(channel_id)
+        if channel is not None:
+            return channel
+        if not create and ProbeConfig.objects(channel_id=channel_id).count() == 0:
+            raise KeyError("Channel {} not found".format(channel_id))
+        return self.add_channel(channel_id)
 
     @property
-    def probe_status(self):
-        """Probe status getter
-        Possible values:
-            stopped = Default value. It is set after probe is stopped.
-            idle = Intermediate status between running and stopped. It happens after probe is launched but it hasn´t processed anything yet.
-            running = Probe is processing information.
-            killed = Special mode to terminate a playlist.
+    def channel(self):
+        """Channel of the current request or thread
+
+        :return: Channel in scope
+        :rtype: managers.channel.Channel
+        """
+        return self.get_channel(get_channel_id())
+
+    def get_channels(self):
+        """Gets every channel with the status of its probe
         
+        API Endpoint: '/videoAnalysis/probe/channels', methods=['GET']
+
+        :return: Summary of each channel, default channel first
+        :rtype: list[dict]
+        """
+        for channel_id in ProbeConfig.objects(channel_id__ne=None).distinct("channel_id"):
+            self.get_channel(channel_id)
+        channels = []
+        for channel in sorted(list(self.channels.values()), key=lambda channel: channel.channel_id or ""):
+            with channel_scope(channel.channel_id):
+                channels.append(channel.get_summary())
+        return channels
+
+    def get_source_channel_id(self, measure):
+        """Gets the channel of a measure from its source. The probe does not know its channel,
+        so it is the one configured with the url and program number of the measure, or only its url.
+
+        :param measure: Measure sent by a probe
+        :type measure: dict
+        :return: Id of the channel, None for the default channel
+        :rtype: str
+        """
+        if self.source_channels_loaded_at is None or \
+                time.time() - self.source_channels_loaded_at > cfg.config_version_check_interval:
+            source_channels = {}
+            for probe_config in ProbeConfig.objects.only("channel_id", "url", "program_number", "version").order_by("id"):
+                # Default configs of new channels do not take the source of the default channel
+                if probe_config.channel_id is not None and not probe_config.version:
+                    continue
+                source_channels[(probe_config.url, probe_config.program_number)] = probe_config.channel_id
+                source_channels.setdefault((probe_config.url, None), probe_config.channel_id)
+            # Playlists and VOD analyse urls that are not in the config
+            for channel in list(self.channels.values()):
+                current_status = channel.status_cache.status
+                if current_status is not None:
+                    source_channels.setdefault((current_status.url, None), channel.channel_id)
+            self.source_channels = source_channels
+            self.source_channels_loaded_at = time.time()
+        video_src = measure.get("videoSRC") or {}
+        url = video_src.get("url")
+        program_number = video_src.get("program_number")
+        if (url, program_number) in self.source_channels:
+            return self.source_channels[(url, program_number)]
+        return self.source_channels.get((url, None))
+
+    def scope_measures(self, measures):
+        """Sets the channel of the measures of a probe request, unless the request chose one
+
+        :param measures: Measures sent by a probe
+        :type measures: list[dict]
+        """
+        if get_channel_id() is None and len(measures) > 0 and isinstance(measures[0], dict):
+            channel_id = self.get_source_channel_id(measures[0])
+            if channel_id is not None:
+                self.get_channel(channel_id)
+                set_channel_id(channel_id)
+
+    @property
+    def db_manager(self):
+        return self.channel.db_manager
+
+    @property
+    def status_cache(self):
+        return self.channel.status_cache
+
+    @property
+    def config_router(self):
+        return self.channel.config_router
+
+    @property
+    def probe_supervisor(self):
+        return self.channel.probe_supervisor
+
+    @property
+    def resource_monitor(self):
+        return self.channel.resource_monitor
+
+    @property
+    def probe_router(self):
+        return self.channel.probe_router
+
+    @property
+    def alert_router(self):
+        return self.channel.alert_router
+
+    @property
+    def journey_router(self):
+        return self.channel.journey_router
+
+    @property
+    def program_router(self):
+        return self.channel.program_router
+
+    @property
+    def historic_router(self):
+        return self.channel.historic_router
+
+    @property
+    def ingest_pipeline(self):
+        return self.channel.ingest_pipeline
+
+    @property
+    def document_router(self):
+        return self.channel.document_router
+
+    @property
+    def probe_healthchecker(self):
+        return self.channel.probe_healthchecker
+
+    @property
+    def probe_status(self):
+        """Status of the probe of the channel in scope, see managers.channel.Channel.probe_status
+
         :return: Current status of the Video Quality Probe
         :rtype: str
         """
-        value = ""
-        self.probe_status_lock.acquire()
-        try:
-            status_data = StatusData.objects.order_by('-id').first()
-            if status_data is None:
-                value = "stopped"
-            # Case where VOD stops running
-            elif self.is_vod_stopped(status_data):
-                value = "stopped"
-            else:
-                value = status_data.probe_status
-        finally:
-            self.probe_status_lock.release()
-        return value
-    
+        return self.channel.probe_status
+
     @probe_status.setter
     def probe_status(self, value):
-        """Probe status setter
-        
-        Possible values:
-            stopped = Default value. It is set after probe is stopped.
-            idle = Intermediate status between running and stopped. It happens after probe is launched but it hasn´t processed anything yet.
-            running = Probe is processing information.
-            killed = Special mode to terminate a playlist.
-        
-        :param value: Current status of Video Quality Probe.
-        :type value: str
-        """
-        self.probe_status_lock.acquire()
-        try:
-            status_data = StatusData.objects.order_by('-id').first()
-            if status_data is None:
-                self._probe_status = "stopped"
-            else:
-                status_data.update(probe_status=value)
-                status_data.reload()
-                status_data.save()
-                self._probe_status = value
-        finally:
-            self.probe_status_lock.release()
+        self.channel.probe_status = value
 
     @property
     def last_document_time(self):
-        """Last_document_time attribute getter
-        
+        """Timestamp of the last document of the channel in scope, see managers.channel.Channel.last_document_time
+
         :return: timestamp (time module) of last document inserted
         :rtype: float
         """
-        value = ""
-        self.last_document_time_lock.acquire()
-        try:
-            status_data = StatusData.objects.order_by('-id').first()
-            if status_data is None:
-                value = time.time()
-            else:
-                value = status_data.last_document_time
-        finally:
-            self.last_document_time_lock.release()
-        return value
+        return self.channel.last_document_time
 
     @last_document_time.setter
     def last_document_time(self, value):
-        """Last_document_time attribute setter
-        
-        :param value: Time in terms of time module of last document inserted
-        :type value: float
-        """
-        self.last_document_time_lock.acquire()
-        try:
-            status_data = StatusData.objects.order_by('-id').first()
-            if status_data is None:
-                self._last_document_time = time.time()
-            else:
-                status_data.update(last_document_time=value)
-                status_data.reload()
-                status_data.save()
-                self._last_document_time = value
-        finally:
-            self.last_document_time_lock.release()
-    
-    def is_vod_stopped(self, status_data):
-        if status_data.content_type == "vod":
-            if (
-                status_data.probe_status == "running" and 
-                not psutil.pid_exists(status_data.probe_pid)
-            ):
-                return True
-        return False
-            
-    
+        self.channel.last_document_time = value
+
     def update_frame(self):
         """Updates the current frame displayed at website
 
@@ -0,0 +1,182 @@
+import time
+from gevent.lock import BoundedSemaphore
+from helper import global_variables as gv
+from helper import config as cfg
+import routers
+from managers.db_managers.mongodb_manager import MongoDbManager
+from managers.probe_healthchecker import ProbeHealthChecker
+from managers.probe_supervisor import ProbeSupervisor
+from managers.resource_monitor import ResourceMonitor
+from managers.status_cache import StatusCache
+from managers.ingest_pipeline import IngestPipeline
+
+
+class Channel:
+    """
+    A monitored service: its config, probe, status, journeys, programs and alerts.
+    Every channel has its own DB managers, routers, probe supervisor, resource monitor and ingest pipeline,
+    and shares with the rest the DB connection, the live feed, the VideoQA client, the export cache and the EPG.
+
+    :param channel_id: Id of the channel, None for the default channel
+    :type channel_id: str
+    :param db_connection: DbConnection object to handle MongoDb
+    :type db_connection: managers.DbConnection
+    :param live_feed: Push feed of measures, status changes and alerts
+    :type live_feed: managers.live_feed.LiveFeed
+    :param videoqualitypred_manager: Manager in charge of handling requests to the Video Quality Analysis AI Module
+    :type videoqualitypred_manager: managers.VideoQualityPredManager
+    :param export_cache: Cache of historic search files
+    :type export_cache: managers.export_cache.ExportCache
+    :param epg_manager: EPG manager shared by every channel, defaults to None (the channel creates it)
+    :type epg_manager: managers.epg_manager.EpgManager, optional
+    """
+    def __init__(self, channel_id, db_connection, live_feed, videoqualitypred_manager, export_cache, epg_manager=None):
+        """Constructor
+        """
+        self.channel_id = channel_id
+        self.live_feed = live_feed
+        self.status_cache = StatusCache(channel_id=channel_id)
+        self.db_manager = MongoDbManager(db_connection, self.status_cache, channel_id, epg_manager)
+        self.config_router = routers.ConfigRouter(self.db_manager.config_manager)
+        self.probe_supervisor = ProbeSupervisor(self.status_cache)
+        self.resource_monitor = ResourceMonitor(self.status_cache, self.probe_supervisor)
+        self.probe_router = routers.ProbeRouter(self.db_manager.config_manager, self.status_cache,
+                                                self.probe_supervisor, self.resource_monitor)
+        self.alert_router = routers.AlertRouter(self.db_manager.alert_manager)
+        self.journey_router = routers.JourneyRouter(self.db_manager.journey_manager)
+        self.program_router = routers.ProgramRouter(self.db_manager.program_manager)
+        self.historic_router = routers.HistoricRouter(self.db_manager.historic_manager,
+                                                    self.db_manager.journey_manager,
+                                                    self.db_manager.alert_manager,
+                                                    self.db_manager.mos_calculator,
+                                                    export_cache)
+        self.ingest_pipeline = IngestPipeline(self.db_manager.document_manager, videoqualitypred_manager)
+        self.document_router = routers.DocumentRouter(self.db_manager.document_manager,
+                                                     videoqualitypred_manager,
+                                                     self.ingest_pipeline,
+                                                     live_feed)
+        self.probe_healthchecker = ProbeHealthChecker(self.status_cache, self.probe_supervisor)
+        self.probe_status_lock = BoundedSemaphore(1)
+        self.last_document_time_lock = BoundedSemaphore(1)
+
+    def start(self):
+        """
+        Starts the background threads of the channel
+        """
+        gv.logger.info("Channel {} started".format(self.channel_id))
+        self.resource_monitor.start()
+        if cfg.ingest_pipeline_enabled:
+            self.ingest_pipeline.start()
+        self.probe_healthchecker.start()
+
+    @property
+    def probe_status(self):
+        """Probe status getter
+        Possible values:
+            stopped = Default value. It is set after probe is stopped.
+            idle = Intermediate status between running and stopped. It happens after probe is launched but it hasn´t processed anything yet.
+            running = Probe is processing information.
+            killed = Special mode to terminate a playlist.
+
+        :return: Current status of the Video Quality Probe
+        :rtype: str
+        """
+        value = ""
+        self.probe_status_lock.acquire()
+        try:
+            status_data = self.status_cache.status
+            if status_data is None:
+                value = "stopped"
+            # Case where VOD stops running
+            elif self.is_vod_stopped(status_data):
+                value = "stopped"
+            else:
+                value = status_data.probe_status
+        finally:
+            self.probe_status_lock.release()
+        return value
+
+    @probe_status.setter
+    def probe_status(self, value):
+        """Probe status setter
+
+        Possible values:
+            stopped = Default value. It is set after probe is stopped.
+            idle = Intermediate status between running and stopped. It happens after probe is launched but it hasn´t processed anything yet.
+            running = Probe is processing information.
+            killed = Special mode to terminate a playlist.
+
+        :param value: Current status of Video Quality Probe.
+        :type value: str
+        """
+        self.probe_status_lock.acquire()
+        try:
+            status_data = self.status_cache.status
+            previous_value = status_data.probe_status if status_data is not None else None
+            if self.status_cache.update(probe_status=value):
+                self._probe_status = value
+            else:
+                self._probe_status = "stopped"
+        finally:
+            self.probe_status_lock.release()
+        if self._probe_status != previous_value:
+            self.live_feed.publish("status", {"STATUS": self._probe_status})
+
+    @property
+    def last_document_time(self):
+        """Last_document_time attribute getter
+
+        :return: timestamp (time module) of last document inserted
+        :rtype: float
+        """
+        value = ""
+        self.last_document_time_lock.acquire()
+        try:
+            status_data = self.status_cache.status
+            if status_data is None:
+                value = time.time()
+            else:
+                value = status_data.last_document_time
+        finally:
+            self.last_document_time_lock.release()
+        return value
+
+    @last_document_time.setter
+    def last_document_time(self, value):
+        """Last_document_time attribute setter
+
+        :param value: Time in terms of time module of last document inserted
+        :type value: float
+        """
+        self.last_document_time_lock.acquire()
+        try:
+            if self.status_cache.update(last_document_time=value):
+                self._last_document_time = value
+            else:
+                self._last_document_time = time.time()
+        finally:
+            self.last_document_time_lock.release()
+
+    def is_vod_stopped(self, status_data):
+        if status_data.content_type == "vod":
+            if (
+                status_data.probe_status == "running" and
+                not self.probe_supervisor.is_alive(status_data.probe_pid)
+            ):
+                return True
+        return False
+
+    def get_summary(self):
+        """Gets the id, source and probe status of the channel
+
+        :return: Summary of the channel
+        :rtype: dict
+        """
+        config = self.db_manager.config_manager.config
+        return {
+            "channel_id": self.channel_id,
+            "url": config.url if config is not None else None,
+            "program_number": config.program_number if config is not None else None,
+            "epg_channel_name": config.epg_channel_name if config is not None else None,
+            "status": self.probe_status
+        }
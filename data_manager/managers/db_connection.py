@@ -1,9 +1,62 @@
-import pymongo
-from mongoengine import connect
+import os
 import traceback
+from gevent.lock import BoundedSemaphore
+from mongoengine import connect, disconnect
+from mongoengine.connection import get_connection, DEFAULT_CONNECTION_NAME
 
 from helper import global_variables as gv
 from helper import config as cfg
+from helper.db_indexes import create_indexes
+
+db_client_lock = BoundedSemaphore(1)
+# Process where the client was created
+db_client_pid = None
+
+
+def get_db_client():
+    """Gets the MongoDB client of this process. It is the only one, registered as the default mongoengine alias,
+    so documents, raw pymongo queries and every thread share its pool.
+    Sockets can not be shared with forked processes, so each gunicorn worker creates its own client on first use.
+
+    :return: Client of the process
+    :rtype: pymongo.MongoClient
+    """
+    global db_client_pid
+    db_client_lock.acquire()
+    try:
+        if db_client_pid != os.getpid():
+            disconnect(DEFAULT_CONNECTION_NAME)
+            connect(cfg.db_name, alias=DEFAULT_CONNECTION_NAME, **get_db_client_options())
+            db_client_pid = os.getpid()
+            gv.logger.info("MongoDB client created with a pool of {} connections".format(cfg.db_max_pool_size))
+        return get_connection(DEFAULT_CONNECTION_NAME)
+    finally:
+        db_client_lock.release()
+
+
+def get_db_client_options():
+    """Options of the MongoDB client, from config. Sockets are patched by gevent, so the pool is shared by greenlets.
+
+    :return: Keyword arguments for mongoengine connect
+    :rtype: dict
+    """
+    options = {
+        "host": cfg.db_host,
+        "port": int(cfg.db_port),
+        "appname": "data_manager-{}".format(os.getpid()),
+        "maxPoolSize": cfg.db_max_pool_size,
+        "minPoolSize": cfg.db_min_pool_size,
+        "maxIdleTimeMS": cfg.db_max_idle_time_ms,
+        "waitQueueTimeoutMS": cfg.db_wait_queue_timeout_ms,
+        "connectTimeoutMS": cfg.db_connect_timeout_ms,
+        "serverSelectionTimeoutMS": cfg.db_server_selection_timeout_ms,
+        "socketTimeoutMS": cfg.db_socket_timeout_ms,
+        # Connects on the first query, in the worker that uses it
+        "connect": False
+    }
+    if cfg.db_compressors != "":
+        options["compressors"] = cfg.db_compressors
+    return options
 
 class DbConnection:
     """This class represent a MongoDB connection handler.   
@@ -44,6 +97,8 @@ class DbConnection:
                 if self.collection_name is None:
                     self.collection_name = cfg.collection_name
                 self.create_new_collection_instance(collection_name=self.collection_name)
+                if self.db is not None:
+                    create_indexes(self.db)
                 gv.logger.info("DB connection has been set up properly")
             else:
                 gv.logger.info("DB connection already available")
@@ -56,8 +111,7 @@ class DbConnection:
         """Connects the client with the MongoDB database
         """
         try:
-            self.db_client = pymongo.MongoClient(cfg.db_host, int(cfg.db_port))
-            connect(cfg.db_name, host=cfg.host, port=int(cfg.db_port))
+            self.db_client = get_db_client()
             self.db = self.db_client[cfg.db_name]
             if not self.check_database_exists():
                 gv.logger.info("The new db created!")
@@ -6,4 +6,5 @@ from .program_db_manager import ProgramDbManager
 from .document_db_manager import DocumentDbManager
 from .historic_db_manager import HistoricDbManager
 from .anomaly_db_manager import AnomalyDbManager
-from .alert_db_manager import AlertDbManager
\ No newline at end of file
+from .alert_db_manager import AlertDbManager
+from .retention_db_manager import RetentionDbManager
\ No newline at end of file
@@ -3,16 +3,29 @@ from datetime import datetime, timedelta, timezone
 from collections import OrderedDict
 from pyrfc3339 import parse, generate
 import json
+import base64
 import pytz
 from dateutil.tz import tzlocal
 
 import time
 import traceback
+from threading import Thread
+from gevent.lock import BoundedSemaphore
+from pymongo import UpdateOne
+from bson import ObjectId
 
 from managers.db_managers import BaseDbManager, AnomalyDbManager
 from helper import global_variables as gv
 from helper import config as cfg
-from db_models import Alert, Warn, StatusData, Journey, Program, VideoAnalysis
+from helper import utils
+from helper.channel_scope import set_channel_id
+from db_models import Alert, AlertCounter, Warn, Journey, Program, VideoAnalysis
+
+# Fields of the alerts and warnings returned by the lists
+ALERT_LIST_FIELDS = [
+    "id", "journey_datetime", "program_name", "document_id", "description", "start_datetime", "end_datetime",
+    "duration", "category", "confidence", "mos", "url", "init_sample_frame", "video_second"
+]
 
 class AlertDbManager(BaseDbManager):
     """Class that represents the handler object use to manage Alerts in MongoDB
@@ -25,32 +38,54 @@ class AlertDbManager(BaseDbManager):
     :type journey_manager: data_manager.managers.db_managers.JourneyDbManager
     :param program_manager: MongoDb handler that manages programs
     :type program_manager: data_manager.managers.db_managers.ProgramDbManager
+    :param status_cache: Cache of the latest probe status
+    :type status_cache: data_manager.managers.status_cache.StatusCache
     """
     
-    def __init__(self, db_connection, config_manager, journey_manager, program_manager):
+    def __init__(self, db_connection, config_manager, journey_manager, program_manager, status_cache):
         """Constructor
         """
         BaseDbManager.__init__(self, db_connection)
+        self.status_cache = status_cache
         self.config_manager = config_manager
         self.journey_manager = journey_manager
         self.program_manager = program_manager
+        self.channel_id = config_manager.channel_id
         self.alert = None
         self.alert_dict_info_list = []
         self.last_alert_current_program = None
         self.last_alert_timestamp = 0.0
         self.document = None
         self.current_status = None
-        self.create_indexes()
+        # Open alerts by (journey_datetime, program_name, category, alert_type). Extended in memory and flushed in batches
+        self.open_alerts = {}
+        self.last_open_alert = None
+        self.open_alerts_lock = BoundedSemaphore(1)
+        # (journey_datetime, program_name) of the AlertCounter documents already checked by this worker
+        self.seeded_alert_counters = set()
         self.anomaly_manager = AnomalyDbManager(db_connection, program_manager)
+        self.start_alert_flush_thread()
 
-    def create_indexes(self):
-        """Creates indexes to speed up the queries to the db
+    def start_alert_flush_thread(self):
         """
-        _ = self.db_connection.db.alert.create_index([ ("journey_datetime", -1) , ("program_name", -1)])
-        _ = self.db_connection.db.alert.create_index([ ("journey_datetime", -1) , ("program_name", -1), ("document_id", -1)])
-        _ = self.db_connection.db.warn.create_index([ ("journey_datetime", -1) , ("program_name", -1)])
-        _ = self.db_connection.db.warn.create_index([ ("journey_datetime", -1) , ("program_name", -1), ("document_id", -1)])
-            
+        Starts a thread that writes the changes of the open alerts every cfg.alert_flush_interval seconds
+        """
+        gv.logger.info("Alert flush thread started")
+        thread = Thread(target=self.alert_flush_run, args=())
+        thread.daemon = True
+        thread.start()
+
+    def alert_flush_run(self):
+        """Thread run method
+        """
+        while gv.api_dm is None:
+            time.sleep(1)
+        set_channel_id(self.channel_id)
+        self.seed_alert_counters()
+        while True:
+            time.sleep(cfg.alert_flush_interval)
+            self.flush_open_alerts()
+
     def find_alerts_warnings(self, document):
         """Checks if there is any alert or warning on the current analysis document
         
@@ -60,7 +95,7 @@ class AlertDbManager(BaseDbManager):
         try:
             self.check_db()
             self.document = document
-            self.current_status = StatusData.objects.order_by('-id').first()
+            self.current_status = self.status_cache.status
             # check each type of alert and adds them to the list
             self.check_video_audio_alerts()
             self.check_mos_alerts()
@@ -143,6 +178,7 @@ class AlertDbManager(BaseDbManager):
         :param alert: Dict containing all information about data
         :type alert: dict
         """
+        self.open_alerts_lock.acquire()
         try:
             self.set_last_alert_current_program(alert)
             if self.last_alert_current_program is not None:
@@ -153,19 +189,103 @@ class AlertDbManager(BaseDbManager):
         except (IndexError, DoesNotExist, AttributeError) as e: 
             gv.logger.info(e)
             self.insert_new_alert_to_db(alert)
+        finally:
+            self.open_alerts_lock.release()
 
     def set_last_alert_current_program(self, alert):
-        """ """
-        if alert["alert_type"] == "warning":
-            self.last_alert_current_program = Warn.objects(
-                journey_datetime=self.journey_manager.journey_datetime,
-                program_name=self.program_manager.current_program_name,
-                category=alert["category"]).order_by("-start_datetime").first()
-        elif alert["alert_type"] == "alert":
-            self.last_alert_current_program = Alert.objects(
-                journey_datetime=self.journey_manager.journey_datetime,
-                program_name=self.program_manager.current_program_name,
-                category=alert["category"]).order_by("-start_datetime").first()
+        """Gets the last alert of the current program with the same category and type.
+        It is taken from the open alerts in memory, and only read from db when this worker has not used it recently,
+        as another worker may have extended or closed it.
+        """
+        open_alert_key = self.get_open_alert_key(alert)
+        open_alert = self.open_alerts.get(open_alert_key)
+        if open_alert is None or (time.time() - open_alert["used_at"]) > self.get_open_alert_ttl():
+            if open_alert is not None:
+                self.flush_open_alert(open_alert)
+            # Only alerts and warnings are stored and extended, other types never have a last alert
+            last_alert = None
+            if alert["alert_type"] == "warning":
+                last_alert = Warn.objects(
+                    channel_id=self.channel_id,
+                    journey_datetime=open_alert_key[0],
+                    program_name=open_alert_key[1],
+                    category=alert["category"]).order_by("-start_datetime").first()
+            elif alert["alert_type"] == "alert":
+                last_alert = Alert.objects(
+                    channel_id=self.channel_id,
+                    journey_datetime=open_alert_key[0],
+                    program_name=open_alert_key[1],
+                    category=alert["category"]).order_by("-start_datetime").first()
+            open_alert = self.set_open_alert(open_alert_key, last_alert)
+        else:
+            open_alert["used_at"] = time.time()
+        self.last_open_alert = open_alert
+        self.last_alert_current_program = open_alert["alert"] if open_alert is not None else None
+
+    def get_open_alert_key(self, alert):
+        return (
+            self.journey_manager.journey_datetime,
+            self.program_manager.current_program_name,
+            alert["category"],
+            alert["alert_type"]
+        )
+
+    def get_open_alert_ttl(self):
+        # Alerts not extended in two measures are closed
+        return 2 * float(cfg.probe_measure_seconds) + cfg.alert_flush_interval
+
+    def set_open_alert(self, open_alert_key, alert_document):
+        """Keeps an alert as the open one of its key. Dates are kept as naive UTC, as they are read from db
+        """
+        if alert_document is None:
+            self.open_alerts.pop(open_alert_key, None)
+            return None
+        for field in ["start_datetime", "end_datetime"]:
+            if alert_document[field] is not None and alert_document[field].tzinfo is not None:
+                alert_document[field] = alert_document[field].astimezone(pytz.utc).replace(tzinfo=None)
+        open_alert = {"alert": alert_document, "dirty": False, "used_at": time.time()}
+        self.open_alerts[open_alert_key] = open_alert
+        return open_alert
+
+    def mark_open_alert_changed(self):
+        if self.last_open_alert is not None:
+            self.last_open_alert["dirty"] = True
+            self.last_open_alert["used_at"] = time.time()
+
+    def flush_open_alert(self, open_alert):
+        if open_alert["dirty"]:
+            self.write_open_alerts([open_alert])
+
+    def flush_open_alerts(self):
+        """Writes end datetime, duration and MOS of the changed open alerts with one bulk write per collection,
+        and forgets the ones not used recently
+        """
+        self.open_alerts_lock.acquire()
+        try:
+            self.write_open_alerts([open_alert for open_alert in self.open_alerts.values() if open_alert["dirty"]])
+            now = time.time()
+            for open_alert_key, open_alert in list(self.open_alerts.items()):
+                if (now - open_alert["used_at"]) > self.get_open_alert_ttl():
+                    del self.open_alerts[open_alert_key]
+        except Exception as e:
+            gv.logger.error(e)
+            gv.logger.error(traceback.print_exc())
+        finally:
+            self.open_alerts_lock.release()
+
+    def write_open_alerts(self, open_alerts):
+        operations = {Alert: [], Warn: []}
+        for open_alert in open_alerts:
+            alert_document = open_alert["alert"]
+            operations[type(alert_document)].append(UpdateOne({"_id": alert_document.id}, {"$set": {
+                "end_datetime": alert_document.end_datetime,
+                "duration": alert_document.duration,
+                "mos": alert_document.mos
+            }}))
+            open_alert["dirty"] = False
+        for alert_model, alert_operations in operations.items():
+            if len(alert_operations) > 0:
+                alert_model._get_collection().bulk_write(alert_operations, ordered=False)
     
     def check_alert_increment(self, alert):
         """ 
@@ -197,11 +317,10 @@ class AlertDbManager(BaseDbManager):
 
     def update_content_alert(self):
         gv.logger.warning("Updating no content ALERT")
-        self.last_alert_current_program.update(
-            # Mean mos value
-            end_datetime=datetime.now(tzlocal()),
-            duration=int(time.time() - gv.api_dm.last_document_time - int(cfg.probe_measure_seconds))
-        )
+        self.last_alert_current_program.end_datetime = datetime.now(pytz.utc).replace(tzinfo=None)
+        self.last_alert_current_program.duration = int(
+            time.time() - gv.api_dm.last_document_time - int(cfg.probe_measure_seconds))
+        self.mark_open_alert_changed()
     
     def check_common_alert_increment(self, alert):
         """Checks if the difference between documents with same alert category is lower than measure time + 1sec
@@ -247,15 +366,11 @@ class AlertDbManager(BaseDbManager):
         mos_alert = self.last_alert_current_program.mos*self.last_alert_current_program.duration
         mos_actual = mos_alert / (self.last_alert_current_program.duration + 1)
         duration = self.get_updated_alert_duration()
-        self.last_alert_current_program.update(
-            # Mean mos value
-            mos = mos_actual + mos_increase,
-            end_datetime=datetime.now(tzlocal()),
-            duration=duration
-        )
-        # Save db object and reloads it to use in future methods
-        self.last_alert_current_program.save()
-        self.last_alert_current_program.reload()
+        # Mean mos value. Written to db by flush_open_alerts
+        self.last_alert_current_program.mos = mos_actual + mos_increase
+        self.last_alert_current_program.end_datetime = datetime.now(pytz.utc).replace(tzinfo=None)
+        self.last_alert_current_program.duration = duration
+        self.mark_open_alert_changed()
 
     def get_updated_alert_duration(self):
         if self.document.videoSettings.video_second is not None:
@@ -271,6 +386,7 @@ class AlertDbManager(BaseDbManager):
         :type alert: dict
         """
         alert_dict = {
+            "channel_id": self.channel_id,
             "journey_datetime": self.journey_manager.journey_datetime,
             "program_name": self.program_manager.current_program_name,
             "document_id": self.document.id,
@@ -309,27 +425,111 @@ class AlertDbManager(BaseDbManager):
                 self.update_content_alert()
 
     def save_alert(self, alert_dict, alert_type):
+        alert_document = None
         if alert_type == "alert":
-            alert = Alert(**alert_dict) #Gets content of alert ddict into object (dbModel)
-            alert.save()
+            alert_document = Alert(**alert_dict) #Gets content of alert ddict into object (dbModel)
         elif alert_type == "warning":
-            warn = Warn(**alert_dict) #Gets content of warning ddict into object (dbModel)
-            warn.save()
+            alert_document = Warn(**alert_dict) #Gets content of warning ddict into object (dbModel)
+        else:
+            return
+        self.seed_alert_counter(alert_dict["journey_datetime"])
+        self.seed_alert_counter(alert_dict["journey_datetime"], alert_dict["program_name"])
+        alert_document.save()
+        self.increment_alert_counters(alert_dict, alert_type)
         gv.logger.warning(f"NEW {alert_type} of category {alert_dict['category']}")
-        
-    def get_alert_warning_list(self, journey_datetime=None, program_name=None):
-        """Gets the list of alerts and warning documents from a concrete Journey or Program
+        if gv.api_dm is not None:
+            gv.api_dm.live_feed.publish(alert_type, utils.to_extended_json(alert_document.to_mongo()))
+        # The new alert closes the previous one of its category and type
+        open_alert_key = (alert_dict["journey_datetime"], alert_dict["program_name"], alert_dict["category"], alert_type)
+        if open_alert_key in self.open_alerts:
+            self.flush_open_alert(self.open_alerts[open_alert_key])
+        self.set_open_alert(open_alert_key, alert_document)
+
+    def increment_alert_counters(self, alert_dict, alert_type):
+        """Adds a new alert or warning to the counters of its journey and program
+        """
+        (number_field, categories_field) = ("alerts", "alert_categories")
+        if alert_type == "warning":
+            (number_field, categories_field) = ("warnings", "warning_categories")
+        operations = []
+        for program_name in set(["", self.get_counter_program_name(alert_dict["program_name"])]):
+            operations.append(UpdateOne(
+                {"channel_id": self.channel_id, "journey_datetime": alert_dict["journey_datetime"],
+                 "program_name": program_name},
+                {"$inc": {number_field: 1, f"{categories_field}.{alert_dict['category']}": 1}},
+                upsert=True))
+        AlertCounter._get_collection().bulk_write(operations, ordered=False)
+
+    def seed_alert_counter(self, journey_datetime, program_name=""):
+        """Creates the AlertCounter of a journey or program with alerts stored before the counters existed.
+        Counters already created are not changed.
+
+        :param journey_datetime: Datetime of the journey
+        :type journey_datetime: datetime.datetime
+        :param program_name: Name of the program, empty for the whole journey, defaults to ""
+        :type program_name: str, optional
+        """
+        program_name = self.get_counter_program_name(program_name)
+        if (journey_datetime, program_name) in self.seeded_alert_counters:
+            return
+        counter_query = {"channel_id": self.channel_id, "journey_datetime": journey_datetime, "program_name": program_name}
+        if AlertCounter.objects(**counter_query).count() == 0:
+            alert_query = {"channel_id": self.channel_id, "journey_datetime": journey_datetime}
+            if program_name != "":
+                alert_query["program_name"] = program_name
+            counter = {"alerts": 0, "warnings": 0, "alert_categories": {}, "warning_categories": {}}
+            for (alert_model, number_field, categories_field) in [
+                    (Alert, "alerts", "alert_categories"), (Warn, "warnings", "warning_categories")]:
+                for category_count in alert_model._get_collection().aggregate([
+                        {"$match": alert_query}, {"$group": {"_id": "$category", "count": {"$sum": 1}}}]):
+                    counter[number_field] += category_count["count"]
+                    counter[categories_field][str(category_count["_id"])] = category_count["count"]
+            # Only the first worker seeding the counter writes it
+            AlertCounter._get_collection().update_one(counter_query, {"$setOnInsert": counter}, upsert=True)
+        self.seeded_alert_counters.add((journey_datetime, program_name))
+
+    def seed_alert_counters(self):
+        """Creates the counters of every journey and program with alerts and no counters
+        """
+        try:
+            stored_keys = set()
+            for alert_model in [Alert, Warn]:
+                for alert_key in alert_model._get_collection().aggregate([
+                        {"$match": {"channel_id": self.channel_id}},
+                        {"$group": {"_id": {"journey_datetime": "$journey_datetime", "program_name": "$program_name"}}}]):
+                    stored_keys.add((alert_key["_id"].get("journey_datetime"), alert_key["_id"].get("program_name")))
+            for (journey_datetime, program_name) in stored_keys:
+                self.seed_alert_counter(journey_datetime)
+                self.seed_alert_counter(journey_datetime, program_name)
+        except Exception as e:
+            gv.logger.error(e)
+            gv.logger.error(traceback.print_exc())
+
+    def get_counter_program_name(self, program_name):
+        if program_name in [None, "", "None"]:
+            return ""
+        return str(program_name)
+
+    def get_alert_warning_list(self, journey_datetime=None, program_name=None, limit=None, cursor=None):
+        """Gets the list of alerts and warning documents from a concrete Journey or Program, newest first.
+        With a limit, a page of each list is returned with the cursor of the next one in next_cursor
         
         :param journey_datetime: Datetime of a Journey, defaults to None
         :type journey_datetime: datetime.datetime, optional
         :param program_name: Name of a program, defaults to None
         :type program_name: str, optional
+        :param limit: Maximum number of alerts and of warnings to return, defaults to None
+        :type limit: int, optional
+        :param cursor: next_cursor of the previous page, defaults to None
+        :type cursor: str, optional
+        :raises ValueError: Malformed cursor
         :return: A list of db_models.Alert and db.models.Warning objects from MongoDB 
         :rtype: list
         """
         self.check_db()
         alert_dict = {"alerts": [], "warnings": []}
         db_alerts = {"alerts": [], "warnings": []}
+        positions = self.decode_alert_cursor(cursor)
         try:
             # Obtains program and journey from the db
             (journey_datetime, program_name) = self.program_manager.check_journey_and_program(journey_datetime, program_name)
@@ -337,7 +537,7 @@ class AlertDbManager(BaseDbManager):
             if self.is_empty_db_alerts(db_alerts, program_name, journey_datetime):
                 return {}
             else:
-                alert_dict = self.update_alert_dict(alert_dict, db_alerts)
+                alert_dict = self.update_alert_dict(alert_dict, db_alerts, limit, positions)
         except Exception as e:
             gv.logger.error(e)
             gv.logger.error(traceback.print_exc())
@@ -352,8 +552,8 @@ class AlertDbManager(BaseDbManager):
             db_alerts = self.get_program_alerts(program_name)
         else:
             # Alerts/Warning from everything
-            db_alerts["alerts"] = Alert.objects().order_by("-start_datetime")
-            db_alerts["warnings"] = Warn.objects().order_by("-start_datetime")
+            db_alerts["alerts"] = Alert.objects(channel_id=self.channel_id).order_by("-start_datetime")
+            db_alerts["warnings"] = Warn.objects(channel_id=self.channel_id).order_by("-start_datetime")
         return db_alerts
 
     def is_empty_db_alerts(self, db_alerts, program_name, journey_datetime):
@@ -364,30 +564,79 @@ class AlertDbManager(BaseDbManager):
                 return True
         return False
 
-    def update_alert_dict(self, alert_dict, db_alerts):
-        """Parse alert/warning querysets to a list of dicts
+    def update_alert_dict(self, alert_dict, db_alerts, limit=None, positions=None):
+        """Parse alert/warning querysets to a list of dicts, with the same format as to_json.
+        With a limit, only reads a page of each queryset after the positions of the cursor
         """
-        for key in alert_dict.keys():
-            if db_alerts[key] is not []:
-                alert_dict[key] = json.loads(db_alerts[key].to_json()) 
-            else:
-                alert_dict[key] = []
+        next_positions = {}
+        for key in list(alert_dict.keys()):
+            alert_dict[key] = []
+            if isinstance(db_alerts[key], list) or (positions is not None and positions.get(key) is None):
+                # Empty or every page already returned
+                next_positions[key] = None
+                continue
+            queryset = db_alerts[key].order_by("-start_datetime", "-id").only(*ALERT_LIST_FIELDS)
+            if positions is not None:
+                queryset = queryset.filter(__raw__=self.get_alert_page_query(positions[key]))
+            if limit is not None:
+                queryset = queryset.limit(limit)
+            last_document = None
+            for document in queryset.as_pymongo():
+                alert_dict[key].append(utils.to_extended_json(document))
+                last_document = document
+            next_positions[key] = None
+            if limit is not None and len(alert_dict[key]) == limit:
+                next_positions[key] = [
+                    (last_document["start_datetime"] - datetime(1970, 1, 1)) // timedelta(milliseconds=1),
+                    str(last_document["_id"])
+                ]
+        if limit is not None:
+            alert_dict["next_cursor"] = self.encode_alert_cursor(next_positions)
         return alert_dict
+
+    def get_alert_page_query(self, position):
+        """Alerts after the last one of the previous page, in (-start_datetime, -_id) order
+        """
+        start_datetime = datetime(1970, 1, 1) + timedelta(milliseconds=position[0])
+        return {"$or": [
+            {"start_datetime": {"$lt": start_datetime}},
+            {"start_datetime": start_datetime, "_id": {"$lt": ObjectId(position[1])}}
+        ]}
+
+    def encode_alert_cursor(self, next_positions):
+        if all(position is None for position in next_positions.values()):
+            return None
+        return base64.urlsafe_b64encode(json.dumps(next_positions).encode("utf-8")).decode("ascii")
+
+    def decode_alert_cursor(self, cursor):
+        """Positions of the last alert and warning returned, None if the list has no more pages
+
+        :raises ValueError: Malformed cursor
+        """
+        if cursor in [None, ""]:
+            return None
+        try:
+            positions = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+            return {key: positions.get(key) for key in ["alerts", "warnings"]}
+        except Exception:
+            raise ValueError("Invalid cursor {}".format(cursor))
     
     def get_journey_alerts(self, journey_datetime, program_name):
         db_alerts = {"alerts": [], "warnings": []}
         if program_name not in [None, "", "None"]:
             # Alerts/Warning from program and journey
             db_alerts["alerts"] = Alert.objects(
-                journey_datetime=journey_datetime, program_name=str(program_name)).order_by("-start_datetime")
+                channel_id=self.channel_id, journey_datetime=journey_datetime,
+                program_name=str(program_name)).order_by("-start_datetime")
             db_alerts["warnings"] = Warn.objects(
-                journey_datetime=journey_datetime, program_name=str(program_name)).order_by("-start_datetime")
+                channel_id=self.channel_id, journey_datetime=journey_datetime,
+                program_name=str(program_name)).order_by("-start_datetime")
         else:
             # Alerts/Warning from journey 
             db_alerts["alerts"] = Alert.objects(
-                journey_datetime=journey_datetime).order_by("-start_datetime")
+                channel_id=self.channel_id, journey_datetime=journey_datetime).order_by("-start_datetime")
             db_alerts["warnings"]  = Warn.objects(
-                journey_datetime=journey_datetime).order_by("-start_datetime")
+                channel_id=self.channel_id, journey_datetime=journey_datetime).order_by("-start_datetime")
         return db_alerts
 
     def get_program_alerts(self, program_name):
@@ -395,9 +644,9 @@ class AlertDbManager(BaseDbManager):
         """
         db_alerts = {"alerts": [], "warnings": []}
         db_alerts["alerts"] = Alert.objects(
-            program_name=str(program_name)).order_by("-start_datetime")
+            channel_id=self.channel_id, program_name=str(program_name)).order_by("-start_datetime")
         db_alerts["warnings"]  = Warn.objects(
-            program_name=str(program_name)).order_by("-start_datetime")
+            channel_id=self.channel_id, program_name=str(program_name)).order_by("-start_datetime")
         return db_alerts
     
     def get_alert_warning_number_list(self, journey_datetime=None, program_name=None):
@@ -406,19 +655,35 @@ class AlertDbManager(BaseDbManager):
         self.check_db()
         alert_number_dict = {}
         (journey_datetime, program_name) = self.program_manager.check_journey_and_program(journey_datetime, program_name)
-        db_alerts = {"alerts": [], "warnings": []}
         try:
-            db_alerts = self.get_db_alerts(journey_datetime, program_name)
-            if self.is_empty_db_alerts(db_alerts, journey_datetime, program_name):
-                return {}
-            else:
-                alert_number_dict["alert_number"] = len(db_alerts["alerts"])
-                alert_number_dict["warning_number"] = len(db_alerts["warnings"])
+            alert_number_dict = {
+                "alert_number": 0, "warning_number": 0, "alert_categories": {}, "warning_categories": {}
+            }
+            for counter in self.get_alert_counters(journey_datetime, program_name):
+                alert_number_dict["alert_number"] += counter.get("alerts", 0)
+                alert_number_dict["warning_number"] += counter.get("warnings", 0)
+                for (categories_field, counter_categories) in [
+                        ("alert_categories", counter.get("alert_categories", {})),
+                        ("warning_categories", counter.get("warning_categories", {}))]:
+                    for category, count in counter_categories.items():
+                        alert_number_dict[categories_field][category] = (
+                            alert_number_dict[categories_field].get(category, 0) + count)
         except Exception as e:
             gv.logger.error(e)
             gv.logger.error(traceback.print_exc())
         return alert_number_dict
 
+    def get_alert_counters(self, journey_datetime, program_name):
+        """Gets the AlertCounter documents to add: the one of the journey or program,
+        or the ones of every journey without a journey datetime
+        """
+        program_name = self.get_counter_program_name(program_name)
+        if journey_datetime is not None:
+            self.seed_alert_counter(journey_datetime, program_name)
+            return AlertCounter.objects(
+                channel_id=self.channel_id, journey_datetime=journey_datetime, program_name=program_name).as_pymongo()
+        return AlertCounter.objects(channel_id=self.channel_id, program_name=program_name).as_pymongo()
+
     def get_alert_warning_list_by_datetime(self, init_datetime=None, end_datetime=None):
         """Gets a list of alerts and warnings from MongoDB in a specific range of dates
         
@@ -431,16 +696,15 @@ class AlertDbManager(BaseDbManager):
         """
         try:
             self.check_db()
-            alert_dict = {}
             alerts_db = Alert.objects(
+                channel_id=self.channel_id,
                 start_datetime__gte=init_datetime,
                 start_datetime__lte=end_datetime).order_by("-start_datetime")
             warnings_db = Warn.objects(
+                channel_id=self.channel_id,
                 start_datetime__gte=init_datetime,
                 start_datetime__lte=end_datetime).order_by("-start_datetime")
-            alert_dict["alerts"] = json.loads(alerts_db.to_json())
-            alert_dict["warnings"] = json.loads(warnings_db.to_json())
-            return alert_dict
+            return self.update_alert_dict({"alerts": [], "warnings": []}, {"alerts": alerts_db, "warnings": warnings_db})
         except Exception as e:
             gv.logger.error(e)
             gv.logger.error(traceback.print_exc())
@@ -20,6 +20,7 @@ class AnomalyDbManager(BaseDbManager):
         """
         BaseDbManager.__init__(self, db_connection)
         self.program_manager = program_manager
+        self.channel_id = program_manager.channel_id
 
     def check_anomaly_results(self, timestamp_ms, anomaly):
         """Check the results of the anomaly analysis to add any alert
@@ -49,12 +50,13 @@ class AnomalyDbManager(BaseDbManager):
         self.save_new_distortion_alert_in_db(anomaly_alert_dict, anomaly_data["alert_type"])
 
     def create_new_distortion_event(self, anomaly_data):
-        last_document = VideoAnalysis.objects.order_by('-id').first()
-        current_program = Program.objects.order_by('-id').first()
+        last_document = VideoAnalysis.objects(channel_id=self.channel_id).order_by('-id').first()
+        current_program = Program.objects(channel_id=self.channel_id).order_by('-id').first()
         (journey_datetime, program_name) = self.program_manager.check_journey_and_program(journey_datetime=None, program_name="current")
         anomaly_confidence_score = int(anomaly_data["anomaly"].scores[anomaly_data["index"]]*100)
         alert_init_sample_frame = self.get_alert_init_sample_frame(anomaly_data, last_document)
         anomaly_alert_dict = {
+            "channel_id": self.channel_id,
             "journey_datetime": journey_datetime,
             "program_name": program_name,
             "document_id": last_document.id,
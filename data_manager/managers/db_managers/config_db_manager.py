@@ -6,9 +6,11 @@ Created on 16 mar. 2020
 from gevent.lock import BoundedSemaphore
 from datetime import datetime, timedelta, timezone
 import pytz
+import time
 import traceback
 import json
 import subprocess
+from pymongo import ReturnDocument
 
 from managers.db_managers import BaseDbManager
 from helper import global_variables as gv
@@ -18,48 +20,102 @@ from db_models import ProbeConfig, StatusData
 
 class ConfigDbManager(BaseDbManager):
     """Class that represents the handler object use to manage Alerts in MongoDB
+
+    The config is kept as an in-memory snapshot, so reading it is an attribute lookup.
+    The snapshot is replaced by put_config or when the version stored in MongoDB changes,
+    which is checked at most every cfg.config_version_check_interval seconds.
+    That version counter is how the rest of gunicorn workers notice a new config.
         
     :param db_connection: DbConnection instance to handle MongoDb connection
     :type db_connection: data_manager.managers.DbConnection
+    :param channel_id: Channel of the config, defaults to None (default channel)
+    :type channel_id: str, optional
     """
     
-    def __init__(self, db_connection):
+    def __init__(self, db_connection, channel_id=None):
         """Constructor
         """
         BaseDbManager.__init__(self, db_connection)
+        self.channel_id = channel_id
         self.config_lock = BoundedSemaphore(1)
+        self.config_listeners = []
+        self.config_checked_at = 0.0
         self.config = self.get_config()
         
     @property
     def config(self):
         """Getter for the config attribute
         
-        :return: Current config in DB
-        :rtype: dict
+        :return: Current config snapshot
+        :rtype: db_models.ProbeConfig
         """
-        value = ""
-        self.config_lock.acquire()
-        try:
-            self.check_db()
-            value = self.get_config()
-        finally:
-            self.config_lock.release()
-        return value
+        if (time.time() - self.config_checked_at) > cfg.config_version_check_interval:
+            self.check_config_version()
+        return self._config
 
     @config.setter
     def config(self, value):
-        """Setter for config attribute
+        """Setter for config attribute. Notifies the listeners if the config has changed.
         
         :param value: New config
-        :type value: dict
+        :type value: db_models.ProbeConfig
         """
         self.config_lock.acquire()
         try:
-            self.check_db()
+            previous_config = getattr(self, "_config", None)
             self._config = value
+            self.config_checked_at = time.time()
         finally:
             self.config_lock.release()
+        if previous_config is not None and value is not None and \
+                self.get_config_version(previous_config) != self.get_config_version(value):
+            self.notify_config_listeners(previous_config, value)
+
+    def check_config_version(self):
+        """Compares the version of the config snapshot with the one in DB, reloading it if they differ.
+        Only the id and version fields are fetched.
+        """
+        try:
+            self.check_db()
+            db_version = ProbeConfig.objects(channel_id=self.channel_id).only('id', 'version').first()
+            if db_version is None or self.get_config_version(db_version) != self.get_config_version(self._config):
+                gv.logger.info("Config has changed in DB, reloading it")
+                self.config = self.get_config()
+            else:
+                self.config_checked_at = time.time()
+        except Exception as e:
+            gv.logger.error(e)
+
+    def refresh_config(self):
+        """Checks the config version right away, ignoring the check interval
+
+        :return: Current config snapshot
+        :rtype: db_models.ProbeConfig
+        """
+        self.check_config_version()
+        return self._config
+
+    @staticmethod
+    def get_config_version(config):
+        if config is None:
+            return None
+        return (config.id, config.version)
 
+    def add_config_listener(self, listener):
+        """Registers a function to be called when the config changes
+
+        :param listener: Function with (previous_config, new_config) as arguments
+        :type listener: callable
+        """
+        self.config_listeners.append(listener)
+
+    def notify_config_listeners(self, previous_config, new_config):
+        for listener in self.config_listeners:
+            try:
+                listener(previous_config, new_config)
+            except Exception as e:
+                gv.logger.error(e)
+                gv.logger.error(traceback.print_exc())
 
     def get_config(self):
         """Gets config from DB. If it does not exist, creates a new one from the default values of db_models.ProbeConfig.
@@ -71,15 +127,33 @@ class ConfigDbManager(BaseDbManager):
         try:
             self.check_db()
             # return config as Python
-            config_db = ProbeConfig.objects.first()
+            config_db = ProbeConfig.objects(channel_id=self.channel_id).first()
             if config_db is None:
                 # If there is no config, creates a default
-                config_db = ProbeConfig(**{})
+                config_db = ProbeConfig(channel_id=self.channel_id)
                 config_db.save()
         except Exception as e:
             gv.logger.error(e)
         return config_db
     
+    def check_source_channel(self, url, program_number=None):
+        """Checks that no other channel analyses the same source, as measures are assigned to their channel by it.
+        Default configs created for new channels (version 0) are not taken into account
+
+        :param url: URL of the source
+        :type url: str
+        :param program_number: Program number in multiplex, defaults to None
+        :type program_number: int, optional
+        :raises ValueError: The source is configured in another channel
+        """
+        program_number = int(program_number) if program_number not in [None, ""] else None
+        config_db = ProbeConfig.objects(
+            channel_id__ne=self.channel_id, url=url, program_number=program_number, version__gt=0
+        ).only('channel_id').first()
+        if config_db is not None:
+            raise ValueError("Source {} {} is already analysed by channel {}".format(
+                url, program_number or "", config_db.channel_id or "default"))
+
     def put_config(self, config_option_dict):
         """Sets new config in mongoDB as db_models.ProbeConfig
         
@@ -90,15 +164,29 @@ class ConfigDbManager(BaseDbManager):
             self.check_db()
             # parse dict keys to lowercase
             gv.logger.info(config_option_dict)
-            for old_key in config_option_dict.keys():
+            for old_key in list(config_option_dict.keys()):
                 config_option_dict[old_key.lower()] = config_option_dict.pop(old_key)
-            if ProbeConfig.objects.count() > 0:
-                ProbeConfig.objects.delete({})
             if "samples" in config_option_dict.keys():
                 del config_option_dict["samples"]
-            config = ProbeConfig(**config_option_dict)
-            config.save()
-            self.config = config
+            # Version and channel are handled by the manager, other workers check the version to reload their config
+            config_option_dict.pop("version", None)
+            config_option_dict.pop("channel_id", None)
+            config = ProbeConfig(channel_id=self.channel_id, **config_option_dict)
+            config.validate()
+            config_son = config.to_mongo()
+            for field in ["_id", "version", "channel_id"]:
+                config_son.pop(field, None)
+            update = {"$set": config_son, "$inc": {"version": 1}}
+            unset_fields = {
+                config._fields[field].db_field: "" for field in config._fields
+                if field not in ["id", "version", "channel_id"] and config._fields[field].db_field not in config_son
+            }
+            if len(unset_fields) > 0:
+                update["$unset"] = unset_fields
+            # Replaced in place, so the other workers never find the channel without config
+            config_son = ProbeConfig._get_collection().find_one_and_update(
+                {"channel_id": self.channel_id}, update, upsert=True, return_document=ReturnDocument.AFTER)
+            self.config = ProbeConfig._from_son(config_son)
 	        # TODO Add auto program filter functionality
         except Exception as e:
             gv.logger.error(e)
@@ -8,14 +8,16 @@ import json
 import pytz
 import traceback
 import time
-import psutil
 from datetime import datetime, timedelta, timezone
+from bson import json_util
 from bson.objectid import ObjectId
 
 from managers.db_managers import BaseDbManager
 from helper import global_variables as gv
 from helper import config as cfg
-from db_models import Journey, Program, StatusData, VideoAnalysis, Alert, Warn
+from helper.cache import invalidate_response_cache, get_journey_scope, get_program_scope, CURRENT_SCOPE
+from db_models import Journey, Program, VideoAnalysis, Alert, Warn
+from db_models.video_analysis import VIDEO_STATISTICS_VERSION, unpack_video_statistics
 
 
 class DocumentDbManager(BaseDbManager):
@@ -31,15 +33,19 @@ class DocumentDbManager(BaseDbManager):
     :type program_manager: data_manager.managers.db_managers.ProgramDbManager
     :param alert_manager: MongoDb handler that manages alerts
     :type alert_manager: data_manager.managers.db_managers.AlertDbManager
+    :param status_cache: Cache of the latest probe status
+    :type status_cache: data_manager.managers.status_cache.StatusCache
     """
-    def __init__(self, db_connection, config_manager, journey_manager, program_manager, alert_manager):
+    def __init__(self, db_connection, config_manager, journey_manager, program_manager, alert_manager, status_cache):
         """Constructor
         """
         BaseDbManager.__init__(self, db_connection)
+        self.status_cache = status_cache
         self.config_manager = config_manager
         self.journey_manager = journey_manager
         self.program_manager = program_manager
         self.alert_manager = alert_manager
+        self.channel_id = config_manager.channel_id
         self.last_document_id = ""
         self.videoanalysis_db_document = None # VideoAnalysis Document
         self.last_db_document = None # VideoAnalysis Document
@@ -47,37 +53,118 @@ class DocumentDbManager(BaseDbManager):
     def insert_video_analysis_document(self, document=None):
         """Inserts the analysis document into the DB
         
-        :param document: Analysis document
+        :param document: Analysis document, None if its prediction failed
         :type document: dict
-        :return: The id of the document inserted in db
-        :rtype: ObjectId
+        :return: The id of the document inserted in db, None if it was not inserted
+        :rtype: str
         """
-        self.check_db()
+        if document is None:
+            return None
+        doc_ids = self.insert_video_analysis_documents(documents=[document])
+        return doc_ids[0] if len(doc_ids) > 0 else None
+
+    def insert_video_analysis_documents(self, documents=[]):
+        """Inserts a batch of analysis documents into the DB with a single insert.
+        Journey and program are resolved once and their aggregates are updated once for the whole batch.
+        
+        :param documents: Analysis documents, in the order they were measured
+        :type documents: list[dict]
+        :return: The ids of the documents inserted in db, as strings
+        :rtype: list[str]
+        """
+        videoanalysis_db_documents = []
         try:
-            self.videoanalysis_db_document = VideoAnalysis(**document)
-            journey = self.get_journey_of_document()
-            self.update_videoanalysis_document_fields()
-            self.check_program_of_document()
-            self.journey_manager.update_journey_data(journey, self.videoanalysis_db_document)
-            # Create indexes for query speed-up
-            _ = self.db_connection.db.video_analysis.create_index([("inserted_at", -1)])
-            _ = self.db_connection.db.video_analysis.create_index([("journey_datetime", -1)])
-            self.videoanalysis_db_document.journey_datetime = self.journey_manager.journey_datetime
-            self.videoanalysis_db_document.save()
-            # search for alerts and warnings
-            self.alert_manager.find_alerts_warnings(self.videoanalysis_db_document)
+            videoanalysis_db_documents = self.persist_video_analysis_documents(documents)
+            self.aggregate_video_analysis_documents(videoanalysis_db_documents)
+            self.find_alerts_warnings_documents(videoanalysis_db_documents)
         except Exception as e:
             gv.logger.error(e)
             traceback.print_exc()
-        return str(self.videoanalysis_db_document.id)
+        return [str(videoanalysis_db_document.id) for videoanalysis_db_document in videoanalysis_db_documents]
+
+    def persist_video_analysis_documents(self, documents=[]):
+        """Completes the analysis documents with the current status and writes them with a single insert
+        
+        :param documents: Analysis documents, in the order they were measured
+        :type documents: list[dict]
+        :return: Documents inserted
+        :rtype: list[db_models.VideoAnalysis]
+        """
+        self.check_db()
+        videoanalysis_db_documents = [VideoAnalysis(**document) for document in documents]
+        self.videoanalysis_db_document = videoanalysis_db_documents[-1]
+        # Creates the journey if it does not exist yet
+        _ = self.get_journey_of_document()
+        document_fields = self.get_videoanalysis_document_fields()
+        for videoanalysis_db_document in videoanalysis_db_documents:
+            self.set_videoanalysis_document_fields(videoanalysis_db_document, document_fields)
+            if cfg.video_statistics_compact and videoanalysis_db_document.videoSettings is not None:
+                videoanalysis_db_document.videoSettings.stats_version = VIDEO_STATISTICS_VERSION
+        return VideoAnalysis.objects.insert(videoanalysis_db_documents)
+
+    def aggregate_video_analysis_documents(self, videoanalysis_db_documents):
+        """Updates journey and program aggregates once with a batch of inserted documents
+        
+        :param videoanalysis_db_documents: Documents inserted, in the order they were measured
+        :type videoanalysis_db_documents: list[db_models.VideoAnalysis]
+        """
+        self.videoanalysis_db_document = videoanalysis_db_documents[-1]
+        journey = self.get_journey_of_document()
+        self.check_program_of_documents(videoanalysis_db_documents)
+        self.journey_manager.update_journey_data_batch(journey, videoanalysis_db_documents)
+
+    def find_alerts_warnings_documents(self, videoanalysis_db_documents):
+        """Searches alerts and warnings in a batch of inserted documents, in order
+        
+        :param videoanalysis_db_documents: Documents inserted, in the order they were measured
+        :type videoanalysis_db_documents: list[db_models.VideoAnalysis]
+        """
+        for videoanalysis_db_document in videoanalysis_db_documents:
+            self.alert_manager.find_alerts_warnings(videoanalysis_db_document)
+        # Last step of the ingest of the batch, so aggregates and alerts are already updated
+        self.invalidate_documents_responses(videoanalysis_db_documents)
+        if gv.api_dm is not None:
+            gv.api_dm.live_feed.publish_many(
+                "measure", [self.get_document_dict(document) for document in videoanalysis_db_documents])
+
+    def invalidate_documents_responses(self, videoanalysis_db_documents):
+        """Discards the cached responses of the journeys and programs of some documents, and of current ones
+        """
+        scopes = [CURRENT_SCOPE]
+        for videoanalysis_db_document in videoanalysis_db_documents:
+            scopes.append(get_journey_scope(videoanalysis_db_document.journey_datetime))
+            scopes.append(get_program_scope(videoanalysis_db_document.videoSRC.program_name))
+        invalidate_response_cache(scopes)
 
     def update_videoanalysis_document_fields(self):
-        current_status = StatusData.objects.order_by('-id').first()
-        self.videoanalysis_db_document.videoSRC.url = current_status.url
-        self.videoanalysis_db_document.videoSRC.service_name = self.config_manager.config.channel_name
-        self.videoanalysis_db_document.journey_datetime = self.journey_manager.journey_datetime
-        self.videoanalysis_db_document.content_type = current_status.content_type
-        self.videoanalysis_db_document.videoSRC.program_name = self.program_manager.check_current_program_name()
+        self.set_videoanalysis_document_fields(
+            self.videoanalysis_db_document, self.get_videoanalysis_document_fields())
+
+    def get_videoanalysis_document_fields(self):
+        """Gets the fields that the data manager adds to every analysis document, from status and config
+        
+        :return: Values of the fields
+        :rtype: dict
+        """
+        current_status = self.status_cache.status
+        return {
+            "channel_id": self.channel_id,
+            "url": current_status.url,
+            "service_name": self.config_manager.config.channel_name,
+            "journey_datetime": self.journey_manager.journey_datetime,
+            "content_type": current_status.content_type,
+            "program_name": self.program_manager.check_current_program_name(),
+            "created_at": datetime.utcnow()
+        }
+
+    def set_videoanalysis_document_fields(self, videoanalysis_db_document, document_fields):
+        videoanalysis_db_document.channel_id = document_fields["channel_id"]
+        videoanalysis_db_document.videoSRC.url = document_fields["url"]
+        videoanalysis_db_document.videoSRC.service_name = document_fields["service_name"]
+        videoanalysis_db_document.journey_datetime = document_fields["journey_datetime"]
+        videoanalysis_db_document.content_type = document_fields["content_type"]
+        videoanalysis_db_document.videoSRC.program_name = document_fields["program_name"]
+        videoanalysis_db_document.created_at = document_fields["created_at"]
             
     def get_journey_of_document(self):
         """Checks the journey correspondent to the current document inserted in the DB
@@ -87,45 +174,51 @@ class DocumentDbManager(BaseDbManager):
         """
         journey = None
         try:
-            current_status = StatusData.objects.order_by('-id').first()
+            current_status = self.status_cache.status
             if current_status.probe_status in ["idle", "stopped"]:
                 gv.api_dm.probe_status = "running"
             self.journey_manager.set_journey_datetime()
-            journey = Journey.objects(journey_datetime=self.journey_manager.journey_datetime).get()
+            journey = Journey.objects(
+                channel_id=self.channel_id, journey_datetime=self.journey_manager.journey_datetime).get()
         except DoesNotExist:
             # Creates a new one
             journey = self.journey_manager.add_new_journey(current_status)
         except MultipleObjectsReturned:
-            latest_journey = Journey.objects.order_by('-id').first()
+            latest_journey = Journey.objects(channel_id=self.channel_id).order_by('-id').first()
             latest_journey.delete()
             gv.logger.warning("Multiple journeys, removing corrupted data from import")
         return journey
     
     def check_program_of_document(self):
-        """Checks the journey correspondent to the current document inserted in the DB
+        """Checks the program correspondent to the current document inserted in the DB
+        """
+        self.check_program_of_documents([self.videoanalysis_db_document])
+
+    def check_program_of_documents(self, videoanalysis_db_documents):
+        """Checks the program correspondent to a batch of documents inserted in the DB.
+        Creates it if needed and updates it once with all the documents.
         
-        :param document: Analysis document, as a dict
-        :type document: dict
-        :return: Current program
-        :rtype: db_models.Program
+        :param videoanalysis_db_documents: Analysis documents of the batch
+        :type videoanalysis_db_documents: list[db_models.VideoAnalysis]
         """
         program = None
         program_name = None
         try:
             program_name = self.program_manager.check_current_program_name()
             program = Program.objects(
-                program_name=program_name, journey_datetime=self.journey_manager.journey_datetime).get()
+                channel_id=self.channel_id, program_name=program_name,
+                journey_datetime=self.journey_manager.journey_datetime).get()
             if program is None:
-                self.program_manager.add_new_program(self.videoanalysis_db_document)
+                self.program_manager.add_new_program_batch(videoanalysis_db_documents)
                 gv.logger.info("Inserted new program on DB")
             else:
-                self.program_manager.update_program_in_db(self.videoanalysis_db_document, program)
+                self.program_manager.update_program_in_db_batch(videoanalysis_db_documents, program)
         except DoesNotExist:
-            self.program_manager.add_new_program(self.videoanalysis_db_document)
+            self.program_manager.add_new_program_batch(videoanalysis_db_documents)
             gv.logger.info("New program name {}".format(program_name))
             gv.logger.info("Inserted new program on DB due to DoesNotExist exception")
         except MultipleObjectsReturned:
-            latest_program = Program.objects.order_by('-id').first()
+            latest_program = Program.objects(channel_id=self.channel_id).order_by('-id').first()
             latest_program.delete()
             gv.logger.info("Multiple programs, removing corrupted data from import")
 
@@ -137,7 +230,7 @@ class DocumentDbManager(BaseDbManager):
         """
         document = None
         try:
-            self.last_db_document = VideoAnalysis.objects.order_by('-_id').first()
+            self.last_db_document = VideoAnalysis.objects(channel_id=self.channel_id).order_by('-_id').first()
             document = self.get_last_document()
         except Exception as e:
             gv.logger.error(e)
@@ -157,11 +250,27 @@ class DocumentDbManager(BaseDbManager):
         if self.last_db_document is None:
             return {}  
         self.check_no_content(last_document_time_difference)
-        document = json.loads(self.last_db_document.to_json(use_db_field=False))
+        document = self.get_document_dict(self.last_db_document)
+        self.last_document_id = str(self.last_db_document.id)
+        return document
+
+    @staticmethod
+    def get_document_dict(videoanalysis_db_document):
+        """Formats a VideoAnalysis document as returned by last document and the live feed.
+        Statistics stored packed are returned as named fields, as with the named layout
+
+        :param videoanalysis_db_document: Document to format
+        :type videoanalysis_db_document: db_models.VideoAnalysis
+        :return: Document ready to be parsed as a JSON
+        :rtype: dict
+        """
+        son = videoanalysis_db_document.to_mongo(use_db_field=False)
+        if son.get("videoSettings") is not None:
+            unpack_video_statistics(son["videoSettings"])
+        document = json.loads(json_util.dumps(son))
         # Convert to string
         if isinstance(document['_id'], ObjectId):
             document['_id'] = str(document['_id'])
-        self.last_document_id = str(self.last_db_document.id)
         return document
         
     def check_no_content(self, last_document_time_difference):
@@ -175,14 +284,15 @@ class DocumentDbManager(BaseDbManager):
             }
             self.alert_manager.document = self.last_db_document
             self.alert_manager.create_document_alert(alert)
+            self.invalidate_documents_responses([self.last_db_document])
 
     def is_document_old_and_probe_stopped(self, last_document_time_difference):
-        current_status = StatusData.objects.order_by('-id').first()
+        current_status = self.status_cache.status
         if current_status.content_type != "live":
             return False
         same_document_in_db = self.last_document_id == str(self.last_db_document.id)
         no_documents_in_3_measure_time = last_document_time_difference > (float(cfg.probe_measure_seconds)*3 + float(cfg.probe_measure_seconds)/3)
-        is_probe_running = psutil.pid_exists(current_status.probe_pid)
+        is_probe_running = gv.api_dm.probe_supervisor.is_alive(current_status.probe_pid)
         if same_document_in_db and no_documents_in_3_measure_time and is_probe_running:
             return True
 
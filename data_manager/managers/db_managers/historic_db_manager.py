@@ -1,9 +1,13 @@
+import time
 import traceback
 from datetime import datetime
 from pyrfc3339 import parse
 
 from helper import global_variables as gv
-from db_models import VideoAnalysis
+from helper import config as cfg
+from helper import utils
+from db_models import VideoAnalysis, VideoAnalysisRollup
+from db_models.video_analysis_rollup import ROLLUP_RESOLUTIONS
 from managers.db_managers import BaseDbManager
 
 class HistoricDbManager(BaseDbManager):
@@ -11,15 +15,16 @@ class HistoricDbManager(BaseDbManager):
 
     :param db_connection: DbConnection instance to handle MongoDb connection
     :type db_connection: data_manager.managers.DbConnection
+    :param channel_id: Channel of the searched measures, defaults to None (default channel)
+    :type channel_id: str, optional
     """
-    def __init__(self, db_connection):
+    def __init__(self, db_connection, channel_id=None):
         """Constructor
         """
         BaseDbManager.__init__(self, db_connection)
-        self.raw_search_query = {}
-        self.search_data = {}
+        self.channel_id = channel_id
     
-    def search(self, search_type="time", search_data={}):
+    def search(self, search_type="time", search_data={}, use_rollups=True):
         """Gets the list of documents resulting from a search using search data provided
         
         :param search_type: Type of search, defaults to "time". Possible values: "journey", "time"
@@ -30,54 +35,182 @@ class HistoricDbManager(BaseDbManager):
             For time searchs, "init_datetime" and "end_datetime" should be included. 
             In terms of journey search, only "journey datetime is required".
             Each of these required parameters is a string that represents a datetime in RFC3339 format.
+            "tier" forces the data of the search: "raw", "minute" or "hour".
         :type search_data: dict, optional
-        :return: The document QuerySet of videoAnalysis documents
-        :rtype: mongoengine.QuerySet
+        :param use_rollups: Allows serving the search from the rollups of the measures, defaults to True
+        :type use_rollups: bool, optional
+        :return: The document QuerySet of videoAnalysis documents, or of VideoAnalysisRollup documents if the tier is not raw,
+        the query of the search over the measures and the tier of the search. All are None if the search fails
+        :rtype: tuple(mongoengine.QuerySet, dict, str)
         """
         documents_queryset = None
+        raw_search_query = None
+        search_tier = None
         try: 
-            self.search_data = search_data
             if search_type == "time": #search using timestamp
-                dict_timestamps = self.get_search_timestamps_parsed()
-                self.raw_search_query = {
+                dict_timestamps = self.get_search_timestamps_parsed(search_data)
+                raw_search_query = {
                     "inserted_at": {
                         "$gte": int(dict_timestamps["init_timestamp"]),
                         "$lte": int(dict_timestamps["end_timestamp"])
                     }
                 }
             elif search_type == "journey": # search using journey data
-                self.raw_search_query = {'journey_datetime': parse(self.search_data["journey_datetime"])}
-            self.update_raw_search_query()
-            documents_queryset = self.get_document_queryset_from_search()
+                raw_search_query = {'journey_datetime': parse(search_data["journey_datetime"])}
+            self.update_raw_search_query(raw_search_query, search_data)
+            search_tier = self.get_search_tier(search_type, search_data) if use_rollups else "raw"
+            documents_queryset = self.get_document_queryset_from_search(raw_search_query, search_tier)
         except Exception as e:
             gv.logger.error(e)   
             gv.logger.error(traceback.print_exc())
-        return documents_queryset
+            raw_search_query = None
+            search_tier = None
+        return documents_queryset, raw_search_query, search_tier
     
-    def get_search_timestamps_parsed(self):
+    def get_search_timestamps_parsed(self, search_data):
         timestamp_dict = {}
-        init_datetime = parse(self.search_data["init_datetime"])
-        end_datetime = parse(self.search_data["end_datetime"])
+        init_datetime = parse(search_data["init_datetime"])
+        end_datetime = parse(search_data["end_datetime"])
         timestamp_dict["init_timestamp"] = datetime.timestamp(init_datetime)*1000
         timestamp_dict["end_timestamp"] =  datetime.timestamp(end_datetime)*1000
         return timestamp_dict
     
-    def get_document_queryset_from_search(self):
+    def get_document_queryset_from_search(self, raw_search_query, search_tier="raw"):
         """Returns historic search data as Mongoengine Queryset
         
-        :param search_data: Data to perform search, defaults to {}. 
-        :type search_data: dict
+        :param raw_search_query: Query of the search over the measures
+        :type raw_search_query: dict
+        :param search_tier: "raw", or the resolution of the rollups that serve the search, defaults to "raw"
+        :type search_tier: str, optional
         :return: Query of documents that match the search requirements
         :rtype: mongoengine.QuerySet
         """
-        gv.logger.info(self.raw_search_query)
-        documents_queryset = VideoAnalysis.objects(__raw__=self.raw_search_query).order_by("inserted_at")
+        gv.logger.info(raw_search_query)
+        if search_tier != "raw":
+            return VideoAnalysisRollup.objects(
+                __raw__=self.get_rollup_search_query(raw_search_query, search_tier)).order_by("period_start")
+        documents_queryset = VideoAnalysis.objects(__raw__=raw_search_query).order_by("inserted_at")
         return documents_queryset
 
-    def update_raw_search_query(self):
+    def get_search_tier(self, search_type, search_data):
+        """Chooses the coarsest tier whose periods still fit in the graph buckets of the search, 
+        from its range, "max_points" and "resolution". Searches starting before the retention of the raw measures 
+        are served from the finest rollups that keep their range.
+
+        :param search_type: Type of search, "journey" or "time"
+        :type search_type: str
+        :param search_data: Data of the search
+        :type search_data: dict
+        :return: "raw", or the resolution of the rollups
+        :rtype: str
+        """
+        if search_data.get("tier") in ["raw"] + list(ROLLUP_RESOLUTIONS):
+            return search_data["tier"]
+        if search_type == "time":
+            init_time = parse(search_data["init_datetime"]).timestamp()
+            end_time = parse(search_data["end_datetime"]).timestamp()
+        else:
+            # Journeys last a day at most
+            init_time = parse(search_data["journey_datetime"]).timestamp()
+            end_time = init_time + 24 * 3600
+        max_points = int(search_data.get("max_points", cfg.historic_graph_max_points))
+        resolution = search_data.get("resolution")
+        bucket_seconds = float(resolution) if resolution not in [None, ""] else 0
+        if max_points > 0:
+            bucket_seconds = max(bucket_seconds, (end_time - init_time) / max_points)
+        kept_tiers = [
+            tier for tier in ROLLUP_RESOLUTIONS
+            if self.is_kept(init_time, cfg.rollup_retention_days.get(tier, 0))
+        ]
+        if not self.is_kept(init_time, cfg.raw_measures_retention_days):
+            return kept_tiers[0] if len(kept_tiers) > 0 else list(ROLLUP_RESOLUTIONS)[-1]
+        search_tier = "raw"
+        for tier in kept_tiers:
+            if ROLLUP_RESOLUTIONS[tier] <= bucket_seconds:
+                search_tier = tier
+        return search_tier
+
+    def is_kept(self, init_time, retention_days):
+        return retention_days <= 0 or init_time >= time.time() - retention_days * 24 * 3600
+
+    def get_rollup_search_query(self, raw_search_query, search_tier):
+        """Translates the query of a search to the rollups of its tier, including the period of its start
+        """
+        rollup_search_query = {"resolution": search_tier}
+        for field, value in raw_search_query.items():
+            if field == "inserted_at":
+                period_ms = ROLLUP_RESOLUTIONS[search_tier] * 1000
+                rollup_search_query["period_start"] = {
+                    "$gte": value["$gte"] - value["$gte"] % period_ms,
+                    "$lte": value["$lte"]
+                }
+            else:
+                rollup_search_query[field] = value
+        return rollup_search_query
+
+    def get_graph_buckets(self, raw_search_query, search_tier, bucket_field, init_time, bucket_size):
+        """Groups the documents of a search in time buckets, computed in MongoDB
+        
+        :param raw_search_query: Query of the search over the measures, as returned by search
+        :type raw_search_query: dict
+        :param search_tier: Tier of the search, as returned by search
+        :type search_tier: str
+        :param bucket_field: Numeric time field used to build the buckets, "inserted_at" or "videoSettings.video_second"
+        :type bucket_field: str
+        :param init_time: First value of bucket_field in the search, where the first bucket starts
+        :type init_time: int
+        :param bucket_size: Size of each bucket, in units of bucket_field
+        :type bucket_size: int
+        :return: Buckets sorted by time, with first timestamp, video_second and pts and min/avg/max MOS of their measures
+        :rtype: list[dict]
+        """
+        if search_tier != "raw":
+            return self.get_rollup_graph_buckets(raw_search_query, search_tier, bucket_field, init_time, bucket_size)
+        pipeline = [
+            {"$match": raw_search_query},
+            {"$sort": {"inserted_at": 1}},
+            {"$group": {
+                "_id": utils.get_bucket_start_expression(bucket_field, init_time, bucket_size),
+                "timestamp": {"$first": "$timestamp"},
+                "video_second": {"$first": "$videoSettings.video_second"},
+                "pts": {"$first": "$videoSettings.pts"},
+                "mos": {"$avg": "$mosAnalysis.mos"},
+                "mos_min": {"$min": "$mosAnalysis.mos"},
+                "mos_max": {"$max": "$mosAnalysis.mos"},
+                "measures": {"$sum": 1}
+            }},
+            {"$sort": {"_id": 1}}
+        ]
+        return list(VideoAnalysis._get_collection().aggregate(pipeline, allowDiskUse=True))
+
+    def get_rollup_graph_buckets(self, raw_search_query, search_tier, bucket_field, init_time, bucket_size):
+        """Same as get_graph_buckets, merging the rollups of the search
+        """
+        rollup_bucket_field = "video_second" if bucket_field == "videoSettings.video_second" else "period_start"
+        pipeline = [
+            {"$match": self.get_rollup_search_query(raw_search_query, search_tier)},
+            {"$sort": {"period_start": 1}},
+            {"$group": {
+                "_id": utils.get_bucket_start_expression(rollup_bucket_field, init_time, bucket_size),
+                "timestamp": {"$first": "$timestamp"},
+                "video_second": {"$first": "$video_second"},
+                "pts": {"$first": "$pts"},
+                "mos_sum": {"$sum": "$mos_sum"},
+                "mos_min": {"$min": "$mos_min"},
+                "mos_max": {"$max": "$mos_max"},
+                "measures": {"$sum": "$measures"}
+            }},
+            {"$match": {"measures": {"$gt": 0}}},
+            {"$addFields": {"mos": {"$divide": ["$mos_sum", "$measures"]}}},
+            {"$sort": {"_id": 1}}
+        ]
+        return list(VideoAnalysisRollup._get_collection().aggregate(pipeline, allowDiskUse=True))
+
+    def update_raw_search_query(self, raw_search_query, search_data):
+        raw_search_query["channel_id"] = self.channel_id
         for field in ["program_name", "url"]:
-            if str(self.search_data.get(field)) not in [None, ""]:
-                self.raw_search_query.update({
-                    f"videoSRC.{field}": str(self.search_data[field])
+            if search_data.get(field) not in [None, ""]:
+                raw_search_query.update({
+                    f"videoSRC.{field}": str(search_data[field])
                 })
 
@@ -4,6 +4,7 @@ Created on 16 mar. 2020
 @author: victor
 '''
 import pytz
+import json
 import traceback
 import time
 from dateutil.tz import tzlocal
@@ -16,7 +17,8 @@ from datetime import datetime, timedelta, timezone
 from managers.db_managers import BaseDbManager, MosCalculator
 from helper import global_variables as gv
 from helper import config as cfg
-from db_models import Journey, Program, StatusData
+from helper import utils
+from db_models import Journey, Program, Alert, Warn
 from managers.file_manager import file_utils
 
 
@@ -27,15 +29,19 @@ class JourneyDbManager(BaseDbManager):
     :type db_connection: data_manager.managers.DbConnection
     :param config_manager: MongoDb handler that manages config
     :type config_manager: data_manager.managers.db_managers.ConfigDbManager
+    :param status_cache: Cache of the latest probe status
+    :type status_cache: data_manager.managers.status_cache.StatusCache
     """
-    def __init__(self, db_connection, config_manager):
+    def __init__(self, db_connection, config_manager, status_cache):
         """Constructor
         """
         BaseDbManager.__init__(self, db_connection)
+        self.status_cache = status_cache
         self.journey_datetime_lock = BoundedSemaphore(1)
         self.journey_datetime = None
         self.mos_calculator = MosCalculator(config_manager)
         self.config_manager = config_manager
+        self.channel_id = config_manager.channel_id
         
     @property
     def journey_datetime(self):
@@ -48,9 +54,9 @@ class JourneyDbManager(BaseDbManager):
         self.journey_datetime_lock.acquire()
         try:
             self.check_db()
-            current_status = StatusData.objects.order_by('-id').first()
+            current_status = self.status_cache.status
             # Initial status: No journeys and stopped
-            if self.get_journeys_date_list() == [] and current_status.probe_status in ["stopped", "idle"]:
+            if current_status.probe_status in ["stopped", "idle"] and not self.journeys_exist():
                 value = datetime.now(tzlocal())
             else:
                 value = current_status.journey_datetime.replace(tzinfo=pytz.utc).astimezone(pytz.utc)
@@ -68,12 +74,10 @@ class JourneyDbManager(BaseDbManager):
         self.journey_datetime_lock.acquire()
         try:
             self.check_db()
-            current_status = StatusData.objects.order_by('-id').first()
+            current_status = self.status_cache.status
             if current_status is not None and value is not None:
                 if self.is_different_journey(value, current_status.journey_datetime):
-                    current_status.update(journey_datetime=value)
-                    current_status.reload()
-                    current_status.save()
+                    self.status_cache.update(journey_datetime=value)
                     gv.logger.info("Journey has changed to {}".format(value))
             self._journey_datetime = value
         finally:
@@ -86,8 +90,13 @@ class JourneyDbManager(BaseDbManager):
             return True
         return False
 
+    def journeys_exist(self):
+        """Checks if there is any journey in DB, fetching at most one id
+        """
+        return Journey.objects(channel_id=self.channel_id).only('id').first() is not None
+
     def update_journey_data(self, journey, document):
-        """Updates Journey's mos and mos_percentages using the last document measured.
+        """Updates Journey's MOS counters using the last document measured.
         
         :param journey: Journey to be updated
         :type journey: db_models.Journey
@@ -96,11 +105,19 @@ class JourneyDbManager(BaseDbManager):
         :return: Updated Journey
         :rtype: db_models.Journey
         """
-        new_mos = self.mos_calculator.calculate_average_mos_db_object(journey, document.mosAnalysis.mos)
-        new_percentages = self.mos_calculator.calculate_mos_categories_db_object(journey, document.mosAnalysis.mos)
-        journey.update(mos=new_mos, mos_percentages=new_percentages, inc__measures=1)
-        journey.reload()
-        journey.save()
+        self.update_journey_data_batch(journey, [document])
+
+    def update_journey_data_batch(self, journey, documents):
+        """Updates Journey's MOS counters and measures with a single atomic update for a batch of documents.
+        
+        :param journey: Journey to be updated
+        :type journey: db_models.Journey
+        :param documents: VideoAnalysis documents of the batch
+        :type documents: list[db_models.VideoAnalysis]
+        """
+        mos_list = [document.mosAnalysis.mos for document in documents]
+        self.mos_calculator.seed_mos_counters(journey)
+        journey.update(**self.mos_calculator.get_mos_counters_update(mos_list))
     
     def get_journeys_date_list(self):
         """Gets the list of journey datetimes inside the databse to access them
@@ -110,7 +127,7 @@ class JourneyDbManager(BaseDbManager):
         """
         journeys_date_list = []
         try:
-            journeys = Journey.objects()
+            journeys = Journey.objects(channel_id=self.channel_id).order_by("journey_datetime").only("journey_datetime")
             journeys_date_list = [generate(journey.journey_datetime, accept_naive=True) for journey in journeys]
         except DoesNotExist as e:
             gv.logger.warn("No journeys in DB")
@@ -132,11 +149,12 @@ class JourneyDbManager(BaseDbManager):
         journey = None
         try:
             self.check_db()
-            journey = Journey.objects(journey_datetime=journey_datetime).get()
+            journey = self.mos_calculator.fill_mos_fields(
+                Journey.objects(channel_id=self.channel_id, journey_datetime=journey_datetime).get())
         except DoesNotExist as e:
             raise AttributeError("Journey {} Not Found".format(journey_datetime))
         except MultipleObjectsReturned as e:
-            latest_journey = Journey.objects.order_by('-id').first()
+            latest_journey = Journey.objects(channel_id=self.channel_id).order_by('-id').first()
             latest_journey.delete()
         except Exception as e:
             gv.logger.error(e)
@@ -155,7 +173,8 @@ class JourneyDbManager(BaseDbManager):
         program_name_list = None
         journey_datetime = self.check_journey(journey_datetime=journey_datetime)
         try:
-            programs_journey_db = Program.objects(journey_datetime=journey_datetime).order_by('-start_datetime')
+            programs_journey_db = Program.objects(
+                channel_id=self.channel_id, journey_datetime=journey_datetime).order_by('-start_datetime')
             program_name_list = [program.program_name for program in programs_journey_db]
         except DoesNotExist as e:
             raise AttributeError("Programs Journey {} Not Found".format(journey_datetime))
@@ -170,13 +189,15 @@ class JourneyDbManager(BaseDbManager):
         :param journey_datetime: datetime for the journey to list program from, defaults to None
         :type journey_datetime: datetime.datetime, optional
         :raises AttributeError: Journey not found
-        :return: List of programs from db.
+        :return: List of programs from db, with MOS fields filled from their counters.
         :rtype: List of db_models.Program
         """
         program_list_db = []
         journey_datetime = self.check_journey(journey_datetime=journey_datetime)
         try:
-            program_list_db = Program.objects(journey_datetime=journey_datetime)
+            program_list_db = [
+                self.mos_calculator.fill_mos_fields(program)
+                for program in Program.objects(channel_id=self.channel_id, journey_datetime=journey_datetime)]
         except DoesNotExist as e:
             raise AttributeError("Programs Journey {} Not Found".format(journey_datetime))
         except Exception as e:
@@ -184,6 +205,57 @@ class JourneyDbManager(BaseDbManager):
             gv.logger.error(traceback.print_exc())
         return program_list_db
 
+    def get_journey_program_alert_list(self, journey_datetime=None):
+        """Gets the programs of a journey with their alerts and warnings in three queries.
+        Data of programs is not read. Alerts and warnings of the journey are grouped by program in MongoDB, 
+        so no document holds every program or every alert of the journey.
+
+        :param journey_datetime: datetime for the journey to list program from, defaults to None
+        :type journey_datetime: datetime.datetime, optional
+        :raises AttributeError: Journey not found
+        :return: Programs as dicts, with MOS fields filled from their counters and their alerts and warnings, newest first
+        :rtype: list[dict]
+        """
+        program_list = []
+        journey_datetime = self.check_journey(journey_datetime=journey_datetime)
+        try:
+            alerts_by_program = self.get_alerts_by_program(Alert, journey_datetime)
+            warnings_by_program = self.get_alerts_by_program(Warn, journey_datetime)
+            programs_cursor = Program._get_collection().find(
+                {"channel_id": self.channel_id, "journey_datetime": journey_datetime}, {"data": 0})
+            for program_son in programs_cursor:
+                program_dict = json.loads(self.mos_calculator.fill_mos_fields(Program._from_son(program_son)).to_json())
+                program_dict.pop("data", None)
+                program_dict["alerts"] = [
+                    utils.to_extended_json(alert) for alert in alerts_by_program.get(program_son.get("program_name"), [])]
+                program_dict["warnings"] = [
+                    utils.to_extended_json(warning) for warning in warnings_by_program.get(program_son.get("program_name"), [])]
+                program_list.append(program_dict)
+        except Exception as e:
+            gv.logger.error(e)
+            gv.logger.error(traceback.print_exc())
+        return program_list
+
+    def get_alerts_by_program(self, alert_class, journey_datetime):
+        """Groups the alerts or warnings of a journey by their program, newest first
+
+        :param alert_class: Alert or Warn
+        :type alert_class: type
+        :param journey_datetime: Journey of the alerts
+        :type journey_datetime: datetime.datetime
+        :return: Alerts as pymongo documents, by program name
+        :rtype: dict
+        """
+        pipeline = [
+            {"$match": {"channel_id": self.channel_id, "journey_datetime": journey_datetime}},
+            {"$sort": {"start_datetime": -1, "_id": -1}},
+            {"$group": {"_id": "$program_name", "alerts": {"$push": "$$ROOT"}}}
+        ]
+        return {
+            group["_id"]: group["alerts"]
+            for group in alert_class._get_collection().aggregate(pipeline, allowDiskUse=True)
+        }
+
     def check_journey(self, journey_datetime=None):
         """Check with journey is provided from the parameter
         
@@ -200,7 +272,8 @@ class JourneyDbManager(BaseDbManager):
                     self.set_journey_datetime()
                 journey_datetime = self.journey_datetime
             elif journey_datetime == "previous":
-                journey_datetime = Journey.objects.order_by("-journey_datetime")[1].journey_datetime
+                journey_datetime = Journey.objects(
+                    channel_id=self.channel_id).order_by("-journey_datetime")[1].journey_datetime
             elif type(journey_datetime) == str:
                 journey_datetime = parse(journey_datetime)
                 gv.logger.info("Datetime of search: {}".format(journey_datetime))
@@ -211,7 +284,7 @@ class JourneyDbManager(BaseDbManager):
     def set_journey_datetime(self):
         """Sets journey datetime if None is provided
         """
-        current_status = StatusData.objects.order_by('-id').first()
+        current_status = self.status_cache.status
         journey_datetime = datetime.now(tzlocal())
         if (journey_datetime - datetime.now(tzlocal())).seconds > 0:
             journey_datetime -= timedelta(days=1)
@@ -243,9 +316,10 @@ class JourneyDbManager(BaseDbManager):
 
     def add_new_journey(self, current_status):
         journey = Journey(**{
+            "channel_id": self.channel_id,
             "journey_datetime": self.journey_datetime,
-            "mos": 0.0,
-            "mos_percentages": {
+            "mos_sum": 0.0,
+            "mos_counts": {
                 "mos_poor": 0,
                 "mos_regular": 0,
                 "mos_good": 0,
@@ -258,7 +332,6 @@ class JourneyDbManager(BaseDbManager):
         })
         # updates the journey datetime of the epg
         gv.api_dm.db_manager.program_manager.epg_manager.current_epg.update(journey_datetime=self.journey_datetime)
-        _ = self.db_connection.db.journey.create_index([ ("journey_datetime", -1) ])
         gv.logger.info("Inserted new journey with start {}".format(self.journey_datetime))
         # add journey to db
         journey.save()
@@ -6,32 +6,49 @@ from helper import config as cfg
 
 class MongoDbManager(db_managers.BaseDbManager):
     """
-    A class that contains the different DbManagers for handling 
+    A class that contains the different DbManagers for handling
     the multiple collections required in MongoDB
 
     :param db_connection:  DbConnection object to handle MongoDb
     :type db_connection: managers.DbConnection object, optional
+    :param status_cache: Cache of the latest probe status, shared by all the managers
+    :type status_cache: managers.status_cache.StatusCache
+    :param channel_id: Channel of the managers, defaults to None (default channel)
+    :type channel_id: str, optional
+    :param epg_manager: EPG manager shared by every channel, defaults to None (a new one is created)
+    :type epg_manager: managers.epg_manager.EpgManager, optional
     """
-    def __init__(self, db_connection):
+    def __init__(self, db_connection, status_cache, channel_id=None, epg_manager=None):
         """Constructor
         """
         try:
             db_managers.BaseDbManager.__init__(self, db_connection)
-            self.historic_manager = db_managers.HistoricDbManager(db_connection)
-            self.config_manager = db_managers.ConfigDbManager(db_connection)
-            self.journey_manager = db_managers.JourneyDbManager(db_connection, self.config_manager)
-            self.epg_manager = EpgManager(db_connection, self.config_manager,
-                                          self.journey_manager, cfg.guide_file)
+            self.channel_id = channel_id
+            self.historic_manager = db_managers.HistoricDbManager(db_connection, channel_id)
+            self.config_manager = db_managers.ConfigDbManager(db_connection, channel_id)
+            self.journey_manager = db_managers.JourneyDbManager(db_connection, self.config_manager, status_cache)
+            if epg_manager is None:
+                self.epg_manager = EpgManager(db_connection, self.config_manager,
+                                              self.journey_manager, status_cache, cfg.guide_file)
+            else:
+                # The guide is parsed again when the EPG channel of this channel changes
+                self.epg_manager = epg_manager
+                self.config_manager.add_config_listener(self.epg_manager.on_config_changed)
             self.program_manager = db_managers.ProgramDbManager(db_connection, self.config_manager,
-                                                                 self.journey_manager, self.epg_manager)
+                                                                 self.journey_manager, self.epg_manager,
+                                                                 status_cache)
             self.alert_manager = db_managers.AlertDbManager(db_connection, self.config_manager,
-                                                            self.journey_manager, self.program_manager)
+                                                            self.journey_manager, self.program_manager,
+                                                            status_cache)
             gv.logger.info("Alert DB manager set up")
             self.document_manager = db_managers.DocumentDbManager(db_connection, self.config_manager,
                                                                   self.journey_manager, self.program_manager,
-                                                                  self.alert_manager)
+                                                                  self.alert_manager, status_cache)
             self.mos_calculator = db_managers.MosCalculator(self.config_manager)
+            # Measures of every channel are rolled up by the default one
+            self.retention_manager = db_managers.RetentionDbManager(db_connection, self.mos_calculator) \
+                if channel_id is None else None
             gv.logger.info("DB managers have been set up")
         except Exception as e:
             gv.logger.error(e)
-            gv.logger.error(traceback.print_exc())
\ No newline at end of file
+            gv.logger.error(traceback.print_exc())
@@ -4,7 +4,7 @@ Created on 16 mar. 2020
 @author: victor
 '''
 import json
-from db_models import Program, Journey
+from db_models import Program, Journey, MosPercentages
 from helper import global_variables as gv
 
 INIT_MOS_CATEGORIES = {
@@ -27,91 +27,88 @@ class MosCalculator:
         """
         self.config_manager = config_manager
         
-    def calculate_average_mos_db_object(self, db_object=None, last_mos=0):
-        """Obtains the average program MOS
+    def get_mos_counts(self, mos_list=[]):
+        """Counts the samples of each MOS category in a list of MOS values
         
-        :param documents: List of measures from VideoQualityProbe
-        :type documents: list[dict]
-        :return: The average MOS
-        :rtype: float
+        :param mos_list: MOS values of measures
+        :type mos_list: list[float]
+        :return: Number of samples of each category
+        :rtype: dict
         """
-        measures_n_1 = self.get_measures_n_1(db_object)
-        measures_n = measures_n_1 + 1 
-        if measures_n_1 > 0:
-            # TOTALMOS_N = TOTALMOS_N-1 * ( n-1 / n) + MOS_N / n
-            average_mos = db_object.mos *( (measures_n_1 ) / measures_n ) + last_mos/measures_n
-        else:
-            average_mos = last_mos
-        return average_mos
-    
-    def get_measures_n_1(self, db_object):
-        measures_n_1 = 0
-        if type(db_object) == Program:
-            measures_n_1 = len(db_object.data)
-        elif type(db_object) == Journey:
-            measures_n_1 = db_object.measures
-        return measures_n_1
-    
-    def calculate_mos_categories_db_object(self, db_object=None, last_mos=0):
-        """Obtains the MOS percentages for each category 
-        from a list of measures
+        mos_counts = INIT_MOS_CATEGORIES.copy()
+        config = self.config_manager.config
+        for mos in mos_list:
+            mos_counts[self.get_category_mos_value(mos, config)] += 1
+        return mos_counts
+
+    def get_mos_counters_update(self, mos_list=[]):
+        """Obtains the atomic update that adds a batch of MOS values to the counters of a Program or Journey
         
-        :param documents: List of measures from VideoQualityProbe
-        :type documents: list[dict]
-        :return: The percentages of each MOS category grouped as a dict
+        :param mos_list: MOS values of the new measures
+        :type mos_list: list[float]
+        :return: Keyword arguments for db_object.update
         :rtype: dict
         """
-        last_mos_category = self.get_category_mos_value(last_mos)
-        measures_n_1 = self.get_measures_n_1(db_object)
-        measures_n = measures_n_1 + 1
-        if measures_n_1 > 0:
-            init_mos_category_percentages = dict(db_object.mos_percentages.to_mongo())
-            mos_samples_dict = {}
-            final_mos_dict = {}
-            for category in init_mos_category_percentages.keys():
-                # From percentages to samples
-                mos_samples_dict[category] = round( init_mos_category_percentages[category]*(measures_n_1/100)) 
-            # Add new samples
-            mos_samples_dict[last_mos_category] += 1
-            # From samples to percentages
-            for category in init_mos_category_percentages.keys():
+        mos_counters_update = {
+            "inc__measures": len(mos_list),
+            "inc__mos_sum": sum(mos_list)
+        }
+        for category, count in self.get_mos_counts(mos_list).items():
+            if count > 0:
+                mos_counters_update[f"inc__mos_counts__{category}"] = count
+        return mos_counters_update
+
+    def seed_mos_counters(self, db_object):
+        """Creates the counters of a Program or Journey stored before they existed, from its average and percentages
+        
+        :param db_object: Program or Journey to update
+        :type db_object: db_models.Program or db_models.Journey
+        """
+        if db_object.mos_counts is not None:
+            return
+        measures = self.get_measures_n_1(db_object)
+        mos_counts = INIT_MOS_CATEGORIES.copy()
+        if measures > 0 and db_object.mos_percentages is not None:
+            for category, percentage in dict(db_object.mos_percentages.to_mongo()).items():
                 # From percentages to samples
-                final_mos_dict[category] = min(100.0, (mos_samples_dict[category]*100)/measures_n )
-        else:
-            final_mos_dict = INIT_MOS_CATEGORIES.copy()
-            final_mos_dict[last_mos_category] = 100.0
-        return final_mos_dict
-    
-    def calculate_mos_categories_videoanalysis_queryset(self, videoanalysis_queryset):
-        """ """
-        length_videoanalysis_queryset = videoanalysis_queryset.count()
-        # Mos percentages = mos.count if mos value in range / length of total mos documents
-        mos_percentage_dict = {
-            
-            "mos_poor": videoanalysis_queryset.filter(
-                    mosAnalysis__mos__lt=self.config_manager.config.mos_regular
-                ).count() / length_videoanalysis_queryset,
+                mos_counts[category] = round(percentage * (measures / 100))
+        # Only the first worker seeding the counters writes them
+        type(db_object).objects(id=db_object.id, mos_counts=None).update_one(
+            set__measures=measures, set__mos_sum=(db_object.mos or 0.0) * measures, set__mos_counts=mos_counts)
 
-            "mos_regular": videoanalysis_queryset.filter(
-                    mosAnalysis__mos__lt=self.config_manager.config.mos_good,
-                    mosAnalysis__mos__gte=self.config_manager.config.mos_regular
-                ).count() / length_videoanalysis_queryset,
-            
-            "mos_good": videoanalysis_queryset.filter(
-                    mosAnalysis__mos__lt=self.config_manager.config.mos_excellent,
-                    mosAnalysis__mos__gte=self.config_manager.config.mos_good
-                ).count() / length_videoanalysis_queryset,
-            
-            "mos_excellent": videoanalysis_queryset.filter(
-                    mosAnalysis__mos__gte=self.config_manager.config.mos_excellent
-                ).count() / length_videoanalysis_queryset
-        }
-        return mos_percentage_dict
-    
+    def fill_mos_fields(self, db_object):
+        """Sets MOS average and percentages of a Program or Journey from its counters. It is not saved.
+        
+        :param db_object: Program or Journey read from db
+        :type db_object: db_models.Program or db_models.Journey
+        :return: Same object, with mos and mos_percentages updated
+        :rtype: db_models.Program or db_models.Journey
+        """
+        if db_object is None or db_object.mos_counts is None:
+            return db_object
+        measures = db_object.measures or 0
+        mos_percentages = INIT_MOS_CATEGORIES.copy()
+        db_object.mos = 0.0
+        if measures > 0:
+            db_object.mos = db_object.mos_sum / measures
+            for category, count in dict(db_object.mos_counts.to_mongo()).items():
+                mos_percentages[category] = min(100.0, (count * 100) / measures)
+        db_object.mos_percentages = MosPercentages(**mos_percentages)
+        return db_object
 
-    def get_category_mos_value(self, mos_value):
+    def get_measures_n_1(self, db_object):
+        measures_n_1 = 0
+        if type(db_object) == Program:
+            # Programs stored before ProgramDataBucket only have their embedded data
+            measures_n_1 = db_object.measures if db_object.measures else len(db_object.data)
+        elif type(db_object) == Journey:
+            measures_n_1 = db_object.measures or 0
+        return measures_n_1
+    
+    def get_category_mos_value(self, mos_value, config=None):
         category = ""
-        config = self.config_manager.config
+        if config is None:
+            config = self.config_manager.config
         if mos_value < config.mos_regular:
             category = "mos_poor"
         elif mos_value >= config.mos_regular and mos_value < config.mos_good:
@@ -121,10 +118,3 @@ class MosCalculator:
         elif mos_value >= config.mos_excellent:
             category = "mos_excellent"
         return category
-    
-    def get_initial_mos_categories(self, videoanalysis_document):
-        category = self.get_category_mos_value(videoanalysis_document.mosAnalysis.mos)
-        mos_percentage_dict = INIT_MOS_CATEGORIES.copy()
-        mos_percentage_dict[category] = 100
-        return  mos_percentage_dict
-    
\ No newline at end of file
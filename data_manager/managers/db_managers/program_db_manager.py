@@ -18,7 +18,7 @@ from dateutil.tz import tzlocal
 from managers.db_managers import BaseDbManager, MosCalculator
 from helper import global_variables as gv
 from helper import config as cfg
-from db_models import Journey, Program, StatusData
+from db_models import Journey, Program, ProgramDataBucket
 
 
 class ProgramDbManager(BaseDbManager):
@@ -31,18 +31,22 @@ class ProgramDbManager(BaseDbManager):
     :type journey_manager: data_manager.managers.db_managers.JourneyDbManager
     :param epg_manager: MongoDb handler that manages epgs
     :type journey_manager: data_manager.managers.EpgManager
+    :param status_cache: Cache of the latest probe status
+    :type status_cache: data_manager.managers.status_cache.StatusCache
     """
     
-    def __init__(self, db_connection, config_manager, journey_manager, epg_manager):
+    def __init__(self, db_connection, config_manager, journey_manager, epg_manager, status_cache):
         """Constructor
         """
         BaseDbManager.__init__(self, db_connection)
+        self.status_cache = status_cache
         self.current_program_name_lock = BoundedSemaphore(1)
         self.current_program_name = None
         self.config_manager = config_manager
         self.journey_manager = journey_manager
         self.epg_manager = epg_manager
         self.mos_calculator = MosCalculator(self.config_manager)
+        self.channel_id = config_manager.channel_id
         
 
     @property
@@ -51,7 +55,7 @@ class ProgramDbManager(BaseDbManager):
         self.current_program_name_lock.acquire()
         try:
             self.check_db()
-            current_status = StatusData.objects.order_by('-id').first()
+            current_status = self.status_cache.status
             value = current_status.current_program_name
         finally:
             self.current_program_name_lock.release()
@@ -62,11 +66,7 @@ class ProgramDbManager(BaseDbManager):
         self.current_program_name_lock.acquire()
         try:
             self.check_db()
-            current_status = StatusData.objects.order_by('-id').first()
-            if current_status is not None:
-                current_status.update(current_program_name=value)
-                current_status.reload()
-                current_status.save()
+            self.status_cache.update(current_program_name=value)
             self._current_program_name = value
         finally:
             self.current_program_name_lock.release()
@@ -79,28 +79,59 @@ class ProgramDbManager(BaseDbManager):
         :param program: Specific program to be updated with a new document
         :type program: db_models.Program
         """
-        program = self.update_program_data(videoanalysis_document, program)
-        program.reload()
-        program.save()
+        self.update_program_in_db_batch([videoanalysis_document], program)
+
+    def update_program_in_db_batch(self, videoanalysis_documents, program):
+        """Updates program data with a batch of analysis documents in a single update
+        
+        :param videoanalysis_documents: db_models.VideoAnalysis from the last quality measures, in order.
+        :type videoanalysis_documents: list[db_models.VideoAnalysis]
+        :param program: Specific program to be updated with the new documents
+        :type program: db_models.Program
+        """
+        self.update_program_data(videoanalysis_documents, program)
+        self.push_program_data(program, videoanalysis_documents)
 
-    def update_program_data(self, videoanalysis_document, program):
-        new_data = self.get_new_program_data_element(videoanalysis_document)
-        # update mos and percentages value
-        new_mos = self.mos_calculator.calculate_average_mos_db_object(
-            program, videoanalysis_document.mosAnalysis.mos)
-        new_percentages = self.mos_calculator.calculate_mos_categories_db_object(
-            program, videoanalysis_document.mosAnalysis.mos)        
-        program_data = program.data
-        program_data.append(new_data)
-        # Check if settings have changed
-        program_video_settings = self.check_program_video_settings(videoanalysis_document, program)
-        program.update(
-                mos=new_mos, mos_percentages=new_percentages,
-                data=program_data, video_settings=program_video_settings)
+    def update_program_data(self, videoanalysis_documents, program):
+        mos_list = [videoanalysis_document.mosAnalysis.mos for videoanalysis_document in videoanalysis_documents]
+        self.mos_calculator.seed_mos_counters(program)
+        program_update = self.mos_calculator.get_mos_counters_update(mos_list)
+        initial_video_settings = dict(program.video_settings)
+        program_video_settings = program.video_settings
+        for videoanalysis_document in videoanalysis_documents:
+            # Check if settings have changed
+            program_video_settings = self.check_program_video_settings(videoanalysis_document, program)
+        # Settings are only written when they change
+        if program_video_settings != initial_video_settings:
+            program_update["set__video_settings"] = program_video_settings
+        program.update(**program_update)
         return  program
 
+    def push_program_data(self, program, videoanalysis_documents):
+        """Appends the points of a batch of documents to the data buckets of the program.
+        Each bucket holds the points of cfg.program_data_bucket_minutes of ingestion, so a
+        new point is a $push to a small document instead of a rewrite of the whole program.
+        
+        :param program: Program of the documents
+        :type program: db_models.Program
+        :param videoanalysis_documents: db_models.VideoAnalysis from the last quality measures, in order.
+        :type videoanalysis_documents: list[db_models.VideoAnalysis]
+        """
+        bucket_size = cfg.program_data_bucket_minutes * 60 * 1000
+        buckets_data = OrderedDict()
+        for videoanalysis_document in videoanalysis_documents:
+            bucket_start = videoanalysis_document.inserted_at - videoanalysis_document.inserted_at % bucket_size
+            buckets_data.setdefault(bucket_start, []).append(self.get_new_program_data_element(videoanalysis_document))
+        for bucket_start, data in buckets_data.items():
+            ProgramDataBucket._get_collection().update_one(
+                {"channel_id": program.channel_id, "journey_datetime": program.journey_datetime,
+                 "program_name": program.program_name, "bucket_start": bucket_start},
+                {"$push": {"data": {"$each": data}}, "$inc": {"count": len(data)}},
+                upsert=True)
+
     def get_new_program_data_element(self, videoanalysis_document):
         new_data = {
+            "inserted_at": videoanalysis_document.inserted_at,
             "timestamp": videoanalysis_document.timestamp,
             "mos": videoanalysis_document.mosAnalysis.mos,
             "pts": videoanalysis_document.videoSettings.pts
@@ -149,25 +180,37 @@ class ProgramDbManager(BaseDbManager):
         :param document: Last db_models.VideoAnalysis as dict
         :type document: dict
         """
+        self.add_new_program_batch([document])
+
+    def add_new_program_batch(self, documents):
+        """Introduces a new document into the Program collection using a batch of analysis documents.
+        
+        :param documents: Last db_models.VideoAnalysis documents, in order
+        :type documents: list[db_models.VideoAnalysis]
+        """
         self.check_db()
         program_name = self.check_current_program_name()
-        new_program_dict = self.get_new_program_dict(document, program_name)
+        new_program_dict = self.get_new_program_dict(documents, program_name)
         new_program_dict = self.update_program_duration(new_program_dict)
-        _ = self.db_connection.db.program.create_index([ ("journey_datetime", -1), ("program_name", -1) ])
-        Program(**new_program_dict).save()
+        program = Program(**new_program_dict)
+        for document in documents[1:]:
+            program.video_settings = self.check_program_video_settings(document, program)
+        program.save()
+        self.push_program_data(program, documents)
 
-    def get_new_program_dict(self, document, program_name):
-        current_status = StatusData.objects.order_by('-id').first()
+    def get_new_program_dict(self, documents, program_name):
+        current_status = self.status_cache.status
+        mos_list = [document.mosAnalysis.mos for document in documents]
+        document = documents[0]
         return {
+            "channel_id": self.channel_id,
             "program_name": program_name,
             "journey_datetime": self.journey_manager.journey_datetime,
-            "mos": document.mosAnalysis.mos,
-            "mos_percentages": self.mos_calculator.get_initial_mos_categories(document),
+            "measures": len(mos_list),
+            "mos_sum": sum(mos_list),
+            "mos_counts": self.mos_calculator.get_mos_counts(mos_list),
             "url": current_status.url,
             "content_type": current_status.content_type if current_status is not None else "live",
-            "data": [
-                self.get_new_program_data_element(document)
-            ],
             "video_settings": {
                 "color_space": "RGB",
                 "pix_format": document.videoSettings.pix_format,
@@ -181,7 +224,7 @@ class ProgramDbManager(BaseDbManager):
         }
 
     def update_program_duration(self, new_program_dict):
-        current_epg_program = self.epg_manager.get_epg_program_by_time(datetime.now(tzlocal()))
+        current_epg_program = self.epg_manager.get_epg_program_by_time(datetime.now(tzlocal()), self.get_epg_channel())
         if current_epg_program is None: # if we don't have epg, duration is based on config
             new_program_dict.update({
                 "start_datetime": datetime.now(pytz.utc),
@@ -213,7 +256,8 @@ class ProgramDbManager(BaseDbManager):
             if program_name == "current":
                 journey_datetime = self.journey_manager.journey_datetime
             elif program_name == "previous":
-                journey_datetime = Program.objects.order_by("-start_datetime")[1].journey_datetime
+                journey_datetime = Program.objects(
+                    channel_id=self.channel_id).order_by("-start_datetime")[1].journey_datetime
         else:
             journey_datetime = self.journey_manager.check_journey(journey_datetime=journey_datetime)
         program_name = self.check_program_name(program_name=program_name)
@@ -232,7 +276,7 @@ class ProgramDbManager(BaseDbManager):
                 program_name = self.check_current_program_name()
                 self.update_current_program_name(program_name)
             elif program_name == "previous":
-                program_name = Program.objects.order_by("-start_datetime")[1].program_name
+                program_name = Program.objects(channel_id=self.channel_id).order_by("-start_datetime")[1].program_name
         except IndexError:
             return None
         return  program_name
@@ -252,7 +296,7 @@ class ProgramDbManager(BaseDbManager):
         return program_name
 
     def get_current_program_name(self):
-        current_status = StatusData.objects.order_by('-id').first()
+        current_status = self.status_cache.status
         program_name = self.get_program_name_by_content_type(current_status.content_type)
         if self.current_program_name != program_name:
             self.current_program_name = program_name
@@ -278,10 +322,16 @@ class ProgramDbManager(BaseDbManager):
 
     def get_current_epg_program(self, current_time):
         current_epg_program = None
-        if self.epg_manager.channel != "None": # Default channel defined as "None" string
-            current_epg_program = self.epg_manager.get_epg_program_by_time(current_time)
+        epg_channel = self.get_epg_channel()
+        if epg_channel != "None": # Default channel defined as "None" string
+            current_epg_program = self.epg_manager.get_epg_program_by_time(current_time, epg_channel)
         return current_epg_program
 
+    def get_epg_channel(self):
+        """Gets the channel of the EPG configured for this channel
+        """
+        return self.config_manager.config.epg_channel_name
+
     def update_journey_time_difference(self, current_time):
         time_difference = current_time - self.journey_manager.journey_datetime
         # if length of journey  > journey duration -> create new journey
@@ -326,7 +376,7 @@ class ProgramDbManager(BaseDbManager):
             else:
                 raise AttributeError("Program {} Not Found in DB Manager".format(program_name))
         except MultipleObjectsReturned:
-            latest_program = Program.objects.order_by('-id').first()
+            latest_program = Program.objects(channel_id=self.channel_id).order_by('-id').first()
             latest_program.delete()
             gv.logger.info("Multiple programs, removing corrupted data from import")
         except IndexError:
@@ -337,14 +387,15 @@ class ProgramDbManager(BaseDbManager):
     def get_program_by_name_journey(self, program_name, journey_datetime):
         program = None
         if program_name == "current":
-            program = Program.objects(program_name=self.current_program_name, journey_datetime=self.journey_manager.journey_datetime).get()
+            program = Program.objects(channel_id=self.channel_id, program_name=self.current_program_name,
+                                      journey_datetime=self.journey_manager.journey_datetime).get()
         elif program_name == "previous":
-            self.db_connection.db.program.create_index([("start_datetime", -1)])
-            program = Program.objects().order_by("-start_datetime")[1]
+            program = Program.objects(channel_id=self.channel_id).order_by("-start_datetime")[1]
         else:
             (journey_datetime, program_name) = self.check_journey_and_program(journey_datetime, program_name)
-            program = Program.objects(program_name=program_name, journey_datetime=journey_datetime).get()
-        return program
+            program = Program.objects(
+                channel_id=self.channel_id, program_name=program_name, journey_datetime=journey_datetime).get()
+        return self.mos_calculator.fill_mos_fields(program)
     
     
     def get_processed_program(self, journey_datetime=None, program_name=None):
@@ -362,8 +413,10 @@ class ProgramDbManager(BaseDbManager):
         (journey_datetime, program_name) = self.check_journey_and_program(
             journey_datetime=journey_datetime, program_name=program_name)
         try:
-            program = Program.objects(journey_datetime=journey_datetime, program_name=program_name).get()
+            program = self.mos_calculator.fill_mos_fields(
+                Program.objects(channel_id=self.channel_id, journey_datetime=journey_datetime, program_name=program_name).get())
             program_dict = json.loads(program.to_json())
+            program_dict["data"] = self.get_program_data(program)
             program_dict = gv.api_dm.db_manager.alert_manager.add_alerts_to_program(journey_datetime, program_dict) 
         except DoesNotExist as e:
             raise AttributeError("Program {} from journey {} Not Found".format(program_name, journey_datetime))
@@ -372,6 +425,76 @@ class ProgramDbManager(BaseDbManager):
             gv.logger.error(traceback.print_exc())
         return program_dict
 
-    
-    
-    
\ No newline at end of file
+    def get_program_data(self, program, init_timestamp=None, end_timestamp=None, skip=0, limit=None):
+        """Gets the points to draw the histogram of a program, in ingestion order.
+        Without a time range, buckets outside the requested page are skipped using their counts and are not read.
+        
+        :param program: Program to get data from
+        :type program: db_models.Program
+        :param init_timestamp: Minimum ingestion timestamp (ms) of the points, defaults to None
+        :type init_timestamp: int, optional
+        :param end_timestamp: Maximum ingestion timestamp (ms) of the points, defaults to None
+        :type end_timestamp: int, optional
+        :param skip: Number of points to skip, defaults to 0
+        :type skip: int, optional
+        :param limit: Maximum number of points to return, defaults to None (all)
+        :type limit: int, optional
+        :return: Points of the program
+        :rtype: list[dict]
+        """
+        buckets = self.get_program_data_buckets(program, init_timestamp, end_timestamp)
+        # Programs stored before ProgramDataBucket keep their points embedded, before the bucketed ones
+        legacy_data = list(program.data)
+        if init_timestamp is not None or end_timestamp is not None:
+            program_data = [
+                point for point in legacy_data + self.get_buckets_data(buckets)
+                if self.is_point_in_range(point, init_timestamp, end_timestamp)
+            ][skip:]
+        else:
+            bucket_skip = max(0, skip - len(legacy_data))
+            bucket_limit = None if limit is None else max(0, limit - max(0, len(legacy_data) - skip))
+            page_buckets = self.get_page_buckets(buckets, bucket_skip, bucket_limit)
+            offset = bucket_skip - page_buckets[0]["skipped"] if len(page_buckets) > 0 else 0
+            program_data = legacy_data[skip:] + self.get_buckets_data(page_buckets)[offset:]
+        return program_data[:limit] if limit is not None else program_data
+
+    def is_point_in_range(self, point, init_timestamp, end_timestamp):
+        inserted_at = point.get("inserted_at")
+        if inserted_at is None:
+            return False
+        return (init_timestamp is None or inserted_at >= init_timestamp) \
+            and (end_timestamp is None or inserted_at <= end_timestamp)
+
+    def get_program_data_buckets(self, program, init_timestamp=None, end_timestamp=None):
+        bucket_size = cfg.program_data_bucket_minutes * 60 * 1000
+        query = {
+            "channel_id": program.channel_id,
+            "journey_datetime": program.journey_datetime,
+            "program_name": program.program_name
+        }
+        if init_timestamp is not None:
+            query["bucket_start__gte"] = init_timestamp - init_timestamp % bucket_size
+        if end_timestamp is not None:
+            query["bucket_start__lte"] = end_timestamp
+        return list(ProgramDataBucket.objects(**query).order_by('bucket_start', 'id').only('id', 'count').as_pymongo())
+
+    def get_page_buckets(self, buckets, skip, limit):
+        """Selects the buckets that contain the points of a page. 
+        Each selected bucket includes the number of points skipped before it.
+        """
+        page_buckets = []
+        first_point = 0
+        for bucket in buckets:
+            last_point = first_point + bucket["count"]
+            if last_point > skip and (limit is None or first_point < skip + limit):
+                bucket["skipped"] = first_point
+                page_buckets.append(bucket)
+            first_point = last_point
+        return page_buckets
+
+    def get_buckets_data(self, buckets):
+        bucket_ids = [bucket["_id"] for bucket in buckets]
+        if len(bucket_ids) == 0:
+            return []
+        buckets_data = ProgramDataBucket.objects(id__in=bucket_ids).order_by('bucket_start', 'id').only('data').as_pymongo()
+        return [point for bucket in buckets_data for point in bucket["data"]]
@@ -0,0 +1,239 @@
+import time
+import traceback
+from datetime import datetime, timedelta
+from threading import Thread
+from pymongo import UpdateOne
+
+from helper import global_variables as gv
+from helper import config as cfg
+from db_models.video_analysis_rollup import ROLLUP_RESOLUTIONS
+from managers.db_managers import BaseDbManager
+
+# Video features averaged in the rollups
+ROLLUP_FEATURE_FIELDS = [
+    "videoSettings.spat_inf_avg", "videoSettings.temp_inf_avg", "videoSettings.blurring_avg", "videoSettings.bitrate"
+]
+# Fields whose first value in the period is kept in the rollups
+ROLLUP_FIRST_VALUE_FIELDS = [
+    "videoSettings.width", "videoSettings.height", "videoSettings.frame_rate", "videoSettings.pix_format",
+    "videoSettings.scan_type", "videoSettings.codec", "mode"
+]
+# Fields that identify a rollup
+ROLLUP_KEY_FIELDS = [
+    "channel_id", "resolution", "period_start", "journey_datetime", "videoSRC.url", "videoSRC.program_name"
+]
+
+
+class RetentionDbManager(BaseDbManager):
+    """Class that represents the handler object used to bound the storage of the measures in MongoDB.
+
+    Raw VideoAnalysis documents are removed cfg.raw_measures_retention_days after their ingestion by a TTL index.
+    Before that, a thread rolls them up in per-minute and per-hour VideoAnalysisRollup documents, with MOS min/avg/max,
+    MOS category counts and the averages of the key video features, which expire after cfg.rollup_retention_days.
+    Rollups are recomputed from the measures of whole hours, so runs from several workers give the same result.
+
+    :param db_connection: DbConnection instance to handle MongoDb connection
+    :type db_connection: data_manager.managers.DbConnection
+    :param mos_calculator: Manager in charge of handling operations with MOS in MongoDB
+    :type mos_calculator: managers.db_managers.MosCalculator
+    """
+    def __init__(self, db_connection, mos_calculator):
+        """Constructor
+        """
+        BaseDbManager.__init__(self, db_connection)
+        self.mos_calculator = mos_calculator
+        self.set_measures_ttl_index()
+        self.start_rollup_thread()
+
+    def start_rollup_thread(self):
+        """
+        Starts a thread that rolls up the new measures every cfg.rollup_interval seconds
+        """
+        gv.logger.info("Rollup thread started")
+        thread = Thread(target=self.rollup_run, args=())
+        thread.daemon = True
+        thread.start()
+
+    def rollup_run(self):
+        """Thread run method
+        """
+        while gv.api_dm is None:
+            time.sleep(1)
+        while True:
+            self.rollup_measures()
+            self.expire_legacy_measures()
+            time.sleep(cfg.rollup_interval)
+
+    def set_measures_ttl_index(self):
+        """Creates, updates or drops the TTL index of the raw measures after cfg.raw_measures_retention_days.
+        Changes of the retention also apply to the measures already stored.
+        """
+        try:
+            collection = self.db_connection.db.video_analysis
+            expire_after_seconds = int(cfg.raw_measures_retention_days * 24 * 3600)
+            ttl_index = None
+            for index in collection.list_indexes():
+                if dict(index["key"]) == {"created_at": 1}:
+                    ttl_index = index
+            if expire_after_seconds <= 0:
+                if ttl_index is not None:
+                    collection.drop_index(ttl_index["name"])
+            elif ttl_index is None:
+                _ = collection.create_index([("created_at", 1)], expireAfterSeconds=expire_after_seconds)
+            elif ttl_index.get("expireAfterSeconds") != expire_after_seconds:
+                self.db_connection.db.command("collMod", "video_analysis", index={
+                    "keyPattern": {"created_at": 1},
+                    "expireAfterSeconds": expire_after_seconds
+                })
+        except Exception as e:
+            gv.logger.error(e)
+            gv.logger.error(traceback.print_exc())
+
+    def rollup_measures(self):
+        """Rolls up the measures from the start of the last hour rolled up until cfg.rollup_delay seconds ago
+        """
+        try:
+            hour_ms = ROLLUP_RESOLUTIONS["hour"] * 1000
+            end_time = int((time.time() - cfg.rollup_delay) * 1000)
+            start_time = self.get_next_measure_time(self.get_rollup_watermark())
+            while start_time is not None and start_time < end_time:
+                # Hours are always rolled up whole
+                start_time -= start_time % hour_ms
+                chunk_end_time = min(start_time + cfg.rollup_chunk_hours * hour_ms, end_time)
+                self.rollup_period(start_time, chunk_end_time)
+                # Skips the periods without measures
+                start_time = self.get_next_measure_time(chunk_end_time)
+        except Exception as e:
+            gv.logger.error(e)
+            gv.logger.error(traceback.print_exc())
+
+    def get_rollup_watermark(self):
+        """Gets the start of the last hour rolled up, which may still be incomplete
+
+        :return: Ingestion timestamp in ms, None if nothing has been rolled up
+        :rtype: int
+        """
+        last_rollup = self.db_connection.db.video_analysis_rollup.find_one(
+            {"resolution": "hour"}, ["period_start"], sort=[("period_start", -1)])
+        return last_rollup["period_start"] if last_rollup is not None else None
+
+    def get_next_measure_time(self, start_time=None):
+        query = {} if start_time is None else {"inserted_at": {"$gte": start_time}}
+        measure = self.db_connection.db.video_analysis.find_one(query, ["inserted_at"], sort=[("inserted_at", 1)])
+        return measure["inserted_at"] if measure is not None else None
+
+    def rollup_period(self, start_time, end_time):
+        """Computes and writes the rollups of every resolution of the measures inserted in a period
+
+        :param start_time: Ingestion timestamp in ms where the period starts, aligned to hours
+        :type start_time: int
+        :param end_time: Ingestion timestamp in ms where the period ends, not included
+        :type end_time: int
+        """
+        rollups = {}
+        projection = [
+            "inserted_at", "timestamp", "channel_id", "journey_datetime", "videoSRC", "mosAnalysis.mos",
+            "videoSettings.video_second", "videoSettings.pts"
+        ] + ROLLUP_FEATURE_FIELDS + ROLLUP_FIRST_VALUE_FIELDS
+        measures = self.db_connection.db.video_analysis.find(
+            {"inserted_at": {"$gte": start_time, "$lt": end_time}}, projection).sort("inserted_at", 1)
+        for measure in measures:
+            for resolution in ROLLUP_RESOLUTIONS:
+                self.add_measure_to_rollup(rollups, resolution, measure)
+        self.write_rollups(list(rollups.values()))
+
+    def add_measure_to_rollup(self, rollups, resolution, measure):
+        period_ms = ROLLUP_RESOLUTIONS[resolution] * 1000
+        period_start = measure["inserted_at"] - measure["inserted_at"] % period_ms
+        video_src = measure.get("videoSRC") or {}
+        rollup_key = (measure.get("channel_id"), resolution, period_start, measure.get("journey_datetime"),
+                      video_src.get("url"), video_src.get("program_name"))
+        rollup = rollups.get(rollup_key)
+        if rollup is None:
+            rollup = rollups[rollup_key] = {
+                "channel_id": measure.get("channel_id"),
+                "resolution": resolution,
+                "period_start": period_start,
+                "period_datetime": datetime.utcfromtimestamp(period_start / 1000),
+                "journey_datetime": measure.get("journey_datetime"),
+                "videoSRC.url": video_src.get("url"),
+                "videoSRC.program_name": video_src.get("program_name"),
+                "videoSRC.service_name": video_src.get("service_name"),
+                "mos_list": [],
+                "feature_sums": {},
+                "feature_samples": {},
+                "timestamp": measure.get("timestamp"),
+                "video_second": self.get_measure_value(measure, "videoSettings.video_second"),
+                "pts": self.get_measure_value(measure, "videoSettings.pts"),
+                "first_values": {}
+            }
+        mos = self.get_measure_value(measure, "mosAnalysis.mos")
+        if self.is_number(mos):
+            rollup["mos_list"].append(mos)
+        for field in ROLLUP_FEATURE_FIELDS:
+            value = self.get_measure_value(measure, field)
+            if self.is_number(value):
+                feature = field.split(".")[-1]
+                rollup["feature_sums"][feature] = rollup["feature_sums"].get(feature, 0.0) + value
+                rollup["feature_samples"][feature] = rollup["feature_samples"].get(feature, 0) + 1
+        for field in ROLLUP_FIRST_VALUE_FIELDS:
+            value = self.get_measure_value(measure, field)
+            if value is not None:
+                rollup["first_values"].setdefault(field.split(".")[-1], value)
+
+    def write_rollups(self, rollups):
+        """Replaces the values of the rollups computed, with a single bulk write
+
+        :param rollups: Rollups from add_measure_to_rollup
+        :type rollups: list[dict]
+        """
+        operations = []
+        for rollup in rollups:
+            mos_list = rollup.pop("mos_list")
+            rollup.update({
+                "measures": len(mos_list),
+                "mos_sum": sum(mos_list),
+                "mos_min": min(mos_list) if len(mos_list) > 0 else None,
+                "mos_max": max(mos_list) if len(mos_list) > 0 else None,
+                "mos_counts": self.get_mos_calculator(rollup["channel_id"]).get_mos_counts(mos_list)
+            })
+            retention_days = cfg.rollup_retention_days.get(rollup["resolution"], 0)
+            rollup["expire_at"] = rollup["period_datetime"] + timedelta(days=retention_days) \
+                if retention_days > 0 else None
+            rollup_filter = {field: rollup.pop(field) for field in ROLLUP_KEY_FIELDS}
+            operations.append(UpdateOne(rollup_filter, {"$set": rollup}, upsert=True))
+        if len(operations) > 0:
+            self.db_connection.db.video_analysis_rollup.bulk_write(operations, ordered=False)
+
+    def get_mos_calculator(self, channel_id):
+        """MOS categories of the rollups use the thresholds of their channel, if it is handled by this worker
+        """
+        channel = gv.api_dm.channels.get(channel_id) if gv.api_dm is not None else None
+        return channel.db_manager.mos_calculator if channel is not None else self.mos_calculator
+
+    def expire_legacy_measures(self):
+        """Removes the measures stored without created_at, which the TTL index does not expire, once they are rolled up
+        """
+        try:
+            watermark = self.get_rollup_watermark()
+            if cfg.raw_measures_retention_days <= 0 or watermark is None:
+                return
+            expire_time = int((time.time() - cfg.raw_measures_retention_days * 24 * 3600) * 1000)
+            self.db_connection.db.video_analysis.delete_many({
+                "inserted_at": {"$lt": min(expire_time, watermark)},
+                "created_at": {"$exists": False}
+            })
+        except Exception as e:
+            gv.logger.error(e)
+            gv.logger.error(traceback.print_exc())
+
+    def get_measure_value(self, measure, field):
+        value = measure
+        for key in field.split("."):
+            if not isinstance(value, dict):
+                return None
+            value = value.get(key)
+        return value
+
+    def is_number(self, value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
@@ -1,7 +1,10 @@
-import xmltodict
+import os
 import pytz
 import time
+import hashlib
 import traceback
+from bisect import bisect_right
+from xml.etree import ElementTree
 from os.path import isfile
 from os import getpid
 from dateutil.tz import tzlocal
@@ -9,43 +12,52 @@ from datetime import datetime, timedelta
 from threading import Thread
 from mongoengine.errors import NotUniqueError
 from mongoengine import DoesNotExist
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from pyrfc3339 import generate
 
 from helper import global_variables as gv
 from helper import config as cfg
-from db_models import Epg, EpgProgram, StatusData
+from db_models import Epg, EpgProgramEntry, ProbeConfig
 
 class EpgManager:
     """
     Processor for WebGrabPlus XML
 
-        We will use xmltodict to parse the file. It contains a dict with one key and value. 
-        Therefore we go to this item and we found 4 keys: 
-            - @generator-info-name
-            - @generator-info-url
-            - channel
-            - programme
+        The file is parsed incrementally with ElementTree iterparse, so only the programmes 
+        of the EPG channels configured in any channel of the data manager are kept in memory.
+        A single EpgManager serves every channel, so the guide is parsed and indexed once. The root element contains: 
+            - channel elements, with the display-name and url of each channel
+            - programme elements
 
-        Example channel value:
-            OrderedDict([('@id', 'La 1'), ('display-name', OrderedDict([('@lang', 'es'), ('#text', 'La 1')])), ('url', 'http://www.formulatv.com')])
+        Example channel element:
+            <channel id="La 1"><display-name lang="es">La 1</display-name><url>http://www.formulatv.com</url></channel>
 
-        Example program value:
-            OrderedDict([('@start', '20200508161500 +0200'), ('@stop', '20200508163000 +0200'), ('@channel', 'La 1'), ('title', OrderedDict([('@lang', 'es'), ('#text', 'El tiempo')]))])
+        Example programme element:
+            <programme start="20200508161500 +0200" stop="20200508163000 +0200" channel="La 1"><title lang="es">El tiempo</title></programme>
+
+        Changes of the file are detected from its mtime and size, confirmed with a hash of its content,
+        so the file is only parsed when its content or the configured channel change.
     """
-    def __init__(self, db_connection, config_manager, journey_manager, guide_file=None, channel=None):
+    def __init__(self, db_connection, config_manager, journey_manager, status_cache, guide_file=None, channel=None):
         self.db_connection = db_connection
         self.config_manager = config_manager
         self.journey_manager = journey_manager
+        self.status_cache = status_cache
         self.guide_file = guide_file # Stores only the filename of our guide file
-        self.guide_data = guide_file # Using custom setter, we obtain the data from the file using xmldict
-        self.guide_data_dict = list(self.guide_data.values())[0]
+        self.guide_data = None # Using custom setter, we obtain the data of the configured channel from the file
+        self.guide_file_signature = self.get_guide_file_signature() # mtime and size of the guide file
+        self.guide_file_hash = self.get_guide_file_hash() # Hash of the content of the guide file
         self.date_parsing_string = '%Y%m%d%H%M%S %z'
         self.current_epg = None
         self.channel = "None"
         self.channels = None 
         self.programs = []
         self.guide_file_check_thread = None # Thread to check if the guide file has changed
+        self.program_index = None # Programs of the current EPG by channel, sorted by start
+        self.last_program_lookups = {} # Last program found by channel and the time until it is valid
+        self.config_manager.add_config_listener(self.on_config_changed)
         self.start_guide_file_checker_thread()
-        self.create_indexes()
         self.is_epg_generating = False
 
     @property
@@ -56,14 +68,105 @@ class EpgManager:
     def guide_data(self, guide_file):
         try:
             if guide_file is not None and isfile(guide_file):
-                with open(guide_file, encoding="utf-8") as fd:
-                    self.__guide_data = xmltodict.parse(fd.read())
+                self.__guide_data = self.parse_guide_file(guide_file)
             else: 
                 self.__guide_data = None
         except Exception as e:
             self.__guide_data = None
             gv.logger.error(e)
 
+    def parse_guide_file(self, guide_file):
+        """Parses the guide file element by element, keeping every channel but only the programmes of the configured ones
+        
+        :param guide_file: Path of the guide file
+        :type guide_file: str
+        :return: Provider, channels and programmes of the configured channels, as dicts with start, stop, channel and name
+        :rtype: dict
+        """
+        epg_channels = self.get_epg_channels()
+        guide_data = {"provider": None, "channels": [], "programs": []}
+        root = None
+        for event, element in ElementTree.iterparse(guide_file, events=("start", "end")):
+            if root is None:
+                root = element
+            if event != "end":
+                continue
+            if element.tag == "channel":
+                guide_data["channels"].append(element.findtext("display-name"))
+                if guide_data["provider"] is None:
+                    guide_data["provider"] = element.findtext("url")
+            elif element.tag == "programme":
+                if element.get("channel") in epg_channels:
+                    program_name = element.findtext("title") or ""
+                    # Adds subtitle if it appears in EPG
+                    if element.find("sub-title") is not None:
+                        program_name += " " + (element.findtext("sub-title") or "")
+                    guide_data["programs"].append({
+                        "start": element.get("start"),
+                        "stop": element.get("stop"),
+                        "channel": element.get("channel"),
+                        "program_name": program_name
+                    })
+            else:
+                continue
+            # Parsed elements are dropped from the tree
+            root.clear()
+        return guide_data
+
+    def get_guide_file_signature(self):
+        try:
+            guide_file_stat = os.stat(self.guide_file)
+            return (guide_file_stat.st_mtime, guide_file_stat.st_size)
+        except (OSError, TypeError):
+            return None
+
+    def get_guide_file_hash(self):
+        try:
+            guide_file_hash = hashlib.sha1()
+            with open(self.guide_file, "rb") as guide_file_open:
+                for chunk in iter(lambda: guide_file_open.read(1024 * 1024), b""):
+                    guide_file_hash.update(chunk)
+            return guide_file_hash.hexdigest()
+        except (OSError, TypeError):
+            return None
+
+    def has_guide_file_changed(self):
+        """Checks if the content of the guide file changed. Its content is only hashed when its mtime or size change.
+        
+        :raises FileNotFoundError: Guide file does not exist
+        :return: If the file content is different from the last parsed one
+        :rtype: bool
+        """
+        guide_file_signature = self.get_guide_file_signature()
+        if guide_file_signature is None:
+            raise FileNotFoundError(self.guide_file)
+        if guide_file_signature == self.guide_file_signature and self.guide_file_hash is not None:
+            return False
+        guide_file_hash = self.get_guide_file_hash()
+        if guide_file_hash == self.guide_file_hash:
+            # Touched but not changed
+            self.guide_file_signature = guide_file_signature
+            return False
+        return True
+
+    def get_epg_channels(self):
+        """Gets the EPG channels configured in every channel of the data manager
+
+        :return: Names of the EPG channels
+        :rtype: set
+        """
+        try:
+            return set(ProbeConfig.objects.distinct("epg_channel_name")) | {self.channel}
+        except Exception as e:
+            gv.logger.error(e)
+            return {self.channel}
+
+    def on_config_changed(self, previous_config, new_config):
+        """Config listener of every channel. A new channel needs its programmes, so the guide file is parsed again in the next check
+        """
+        if previous_config is None or previous_config.epg_channel_name != new_config.epg_channel_name:
+            self.guide_file_hash = None
+
     @property
     def channel(self):
         return self.config_manager.config.epg_channel_name
@@ -121,21 +224,104 @@ class EpgManager:
             gv.logger.error(e)
             gv.logger.error(traceback.print_exc())
 
-    def create_indexes(self):
-        # We create indexes to access programs by channels and channels faster
-        _ = self.db_connection.db.epg.create_index([("channels", -1)])
-        _ = self.db_connection.db.epg.create_index([("epg_program", -1)])
-        _ = self.db_connection.db.epg.create_index([("epg_program.channel", -1)])
-    
-    def get_epg_program_by_time(self, datetime):
-        channel_programs = self.current_epg.programs.filter(channel=self.channel)
-        for program in channel_programs:
-            program_start_datetime_tzaware = program.start_datetime.replace(tzinfo=pytz.UTC)
-            program_end_datetime_tzaware = program.end_datetime.replace(tzinfo=pytz.UTC)
-            if program_start_datetime_tzaware < datetime and program_end_datetime_tzaware > datetime:
-                return program
-        return None
+    def get_epg_program_by_time(self, datetime, channel=None):
+        """Gets the program of a channel shown at a concrete time, from the in-memory program index
+        
+        :param datetime: Timezone aware datetime
+        :type datetime: datetime.datetime
+        :param channel: Name of the EPG channel, defaults to the configured one
+        :type channel: str, optional
+        :return: Program of the EPG or None
+        :rtype: db_models.EpgProgram
+        """
+        epg_program, _ = self.get_epg_program_and_boundary(datetime, channel)
+        return epg_program
+
+    def get_epg_program_and_boundary(self, datetime, channel=None):
+        """Gets the program of a channel shown at a concrete time and the time when it changes.
+        Lookups are a bisect in the program index. Consecutive lookups of a channel before the boundary reuse the last result.
+        
+        :param datetime: Timezone aware datetime
+        :type datetime: datetime.datetime
+        :param channel: Name of the EPG channel, defaults to the configured one
+        :type channel: str, optional
+        :return: Program of the EPG or None and timestamp of the next program boundary, None if there are no more programs
+        :rtype: tuple(db_models.EpgProgram, float)
+        """
+        program_index = self.get_program_index()
+        channel = channel or self.channel
+        lookup_timestamp = datetime.timestamp()
+        last_program_lookup = self.last_program_lookups.get(channel)
+        if last_program_lookup is not None:
+            (index_epg_id, valid_from, boundary, epg_program) = last_program_lookup
+            if (index_epg_id == program_index["epg_id"]
+                    and valid_from < lookup_timestamp and (boundary is None or lookup_timestamp < boundary)):
+                return epg_program, boundary
+        (start_timestamps, channel_programs) = program_index["channels"].get(channel, ([], []))
+        position = bisect_right(start_timestamps, lookup_timestamp) - 1
+        epg_program = None
+        valid_from = lookup_timestamp
+        # Next program start, if there is no program at that time
+        boundary = start_timestamps[position + 1] if position + 1 < len(start_timestamps) else None
+        if position >= 0:
+            (start_timestamp, end_timestamp, program) = channel_programs[position]
+            if start_timestamp < lookup_timestamp < end_timestamp:
+                epg_program = program
+                valid_from = start_timestamp
+                boundary = end_timestamp
+        self.last_program_lookups[channel] = (program_index["epg_id"], valid_from, boundary, epg_program)
+        return epg_program, boundary
+
+    def get_program_index(self):
+        if self.program_index is None:
+            self.refresh_program_index()
+        return self.program_index
 
+    def refresh_program_index(self):
+        """Rebuilds the program index if there is a newer EPG in db, saved by this or another worker
+        """
+        try:
+            last_epg = Epg.objects.only('id').order_by('-id').first()
+            last_epg_id = last_epg.id if last_epg is not None else None
+            if self.program_index is None or self.program_index["epg_id"] != last_epg_id:
+                self.build_program_index(Epg.objects(id=last_epg_id).first() if last_epg_id is not None else None)
+        except Exception as e:
+            gv.logger.error(e)
+            gv.logger.error(traceback.print_exc())
+            if self.program_index is None:
+                self.build_program_index(None)
+
+    def build_program_index(self, epg):
+        """Builds the program index of an EPG: for each channel, programs sorted by their start timestamp.
+        Programs are read from epg_program, from a day ago on, unless the EPG was saved with embedded programs.
+        
+        :param epg: EPG saved in db, or None to clear the index
+        :type epg: db_models.Epg
+        """
+        channels = {}
+        if epg is not None:
+            programs = epg.programs
+            if len(programs) == 0:
+                programs = EpgProgramEntry.objects(end_datetime__gte=datetime.now(pytz.utc) - timedelta(days=1))
+            for program in programs:
+                channels.setdefault(program.channel, []).append((
+                    self.get_utc_timestamp(program.start_datetime),
+                    self.get_utc_timestamp(program.end_datetime),
+                    program
+                ))
+        for channel, channel_programs in channels.items():
+            channel_programs.sort(key=lambda channel_program: channel_program[0])
+            channels[channel] = ([channel_program[0] for channel_program in channel_programs], channel_programs)
+        # Replaced at once, lookups always see a complete index
+        self.program_index = {"epg_id": epg.id if epg is not None else None, "channels": channels}
+        self.last_program_lookups = {}
+        gv.logger.info("EPG program index built with {} channels".format(len(channels)))
+
+    def get_utc_timestamp(self, epg_datetime):
+        # Datetimes read from db are naive UTC
+        if epg_datetime.tzinfo is None:
+            epg_datetime = epg_datetime.replace(tzinfo=pytz.UTC)
+        return epg_datetime.timestamp()
 
     def start_guide_file_checker_thread(self):
         """
@@ -166,69 +352,71 @@ class EpgManager:
             self.process_new_epg()
         else:
             self.check_and_update_current_epg()
+        self.refresh_program_index()
         gv.logger.info("Sleeping for 30 seconds...")
         time.sleep(30)
 
     def check_and_update_current_epg(self):
-        with open(self.guide_file,  'r+', encoding="utf-8") as guide_file_open:
-            new_guide_data = xmltodict.parse(guide_file_open.read())
-            if new_guide_data != self.guide_data and self.is_epg_old():
-                self.check_guide_changed(new_guide_data)
-            else:
-                gv.logger.info("Guide file has not changed")
+        if self.has_guide_file_changed() and self.is_epg_old():
+            self.check_guide_changed()
+        else:
+            gv.logger.info("Guide file has not changed")
 
     def is_epg_old(self):
-        current_status = StatusData.objects.order_by('-id').first()
         if self.is_epg_generating:
             return False
+        current_status = self.status_cache.refresh()
         if current_status is None:
             self.is_epg_generating = True
             return True
         if not current_status.is_epg_generating:
             self.is_epg_generating = True
-            current_status.update(
-                is_epg_generating = True
-            )
-            current_status.reload()
+            self.status_cache.update(is_epg_generating=True)
             return True
         return False
 
-    def check_guide_changed(self, new_guide_data):
-        """ Checks after X seconds if the file has changed to know 
+    def check_guide_changed(self):
+        """ Checks after X seconds if the mtime and size of the file have changed to know 
             if the file is at generating process """
-        seconds_after_guide_data = None
-        while (seconds_after_guide_data != new_guide_data):
+        guide_file_signature = None
+        seconds_after_guide_file_signature = self.get_guide_file_signature()
+        while (seconds_after_guide_file_signature != guide_file_signature):
             gv.logger.warning("Guide is on generating process")
-            with open(self.guide_file, encoding="utf-8") as seconds_after_guide_file_open:
-                new_guide_data = seconds_after_guide_data
-                seconds_after_guide_data = xmltodict.parse(
-                    seconds_after_guide_file_open.read())
-            seconds_after_guide_file_open.close()
+            guide_file_signature = seconds_after_guide_file_signature
             time.sleep(10) # Sleeps X seconds to let the generating process work
+            seconds_after_guide_file_signature = self.get_guide_file_signature()
         gv.logger.info("Guide file generated")
-        self.guide_data = self.guide_file # if it is different updates the attribute
-        self.guide_data_dict = list(self.guide_data.values())[0]
+        self.update_guide_data()
         self.process_new_epg()
 
+    def update_guide_data(self):
+        """Parses the guide file, storing the signature and hash of the parsed content
+        """
+        guide_file_signature = self.get_guide_file_signature()
+        guide_file_hash = self.get_guide_file_hash()
+        self.guide_data = self.guide_file
+        self.guide_file_signature = guide_file_signature
+        self.guide_file_hash = guide_file_hash
+
     def process_new_epg(self):
+        if self.guide_data is None:
+            self.update_guide_data()
         if self.guide_data is not None:   
             gv.logger.info("Saving new EPG to MongoDB")
             self.save_epg_mongo()
 
     def save_epg_mongo(self):
         try:
-            
             epg = self.create_new_epg()
-            if (epg.programs.count() != len(self.guide_data_dict["programme"])):
-                gv.logger.warn("Different EPG in XML than in DB object, skipping EPG object ...")
-                return
             time.sleep(getpid()/100)
             last_epg = Epg.objects.order_by('-id').first()
             if last_epg is not None:
                 is_epg_duplicated = self.check_epg_duplicate_in_db(epg, last_epg)
                 if is_epg_duplicated:
                     return
+            self.sync_epg_programs()
             epg.save()
+            self.build_program_index(epg)
             self.update_epg_generation_status()
         except NotUniqueError as e:
             gv.logger.warn("EPG already saved, skipping ...")
@@ -238,34 +426,107 @@ class EpgManager:
             gv.logger.error(traceback.print_exc())
 
     def create_new_epg(self):
+        """Creates the EPG of the guide file. Its programs are stored in epg_program by sync_epg_programs
+        """
         epg = Epg(**{
             "journey_datetime": self.journey_manager.get_config_journey_datetime(),
-            "provider": self.guide_data_dict["channel"][0]["url"],
+            "provider": self.guide_data["provider"],
             "channels": self.get_guide_data_channels(),
             "programs": [],
             "created_at": datetime.now(pytz.utc)
         })
+        return epg
 
-        updated_epg = self.save_programs_to_epg(epg)
-        return updated_epg
-
-    
-    def save_programs_to_epg(self, epg):
-        for program in self.guide_data_dict["programme"]:
-            start_datetime = datetime.strptime(program["@start"], self.date_parsing_string)
-            end_datetime = datetime.strptime(program["@stop"], self.date_parsing_string)
-            program_name = program["title"]["#text"]
-            # Adds subtitle if it appears in EPG
-            if "sub-title" in program.keys():
-                program_name += " " + program["sub-title"]["#text"]
-            epg_program = EpgProgram(**{
-                "program_name": program_name,
-                "channel": program["@channel"],
+    def sync_epg_programs(self):
+        """Applies the programmes of the guide file to epg_program as a diff: new or renamed programs are upserted,
+        programs of the same channels and time span that are not in the guide anymore are removed, 
+        and unchanged ones are not written.
+        
+        :return: Number of upserted and removed programs
+        :rtype: tuple(int, int)
+        """
+        guide_programs = {}
+        for program in self.guide_data["programs"]:
+            start_datetime = datetime.strptime(program["start"], self.date_parsing_string)
+            end_datetime = datetime.strptime(program["stop"], self.date_parsing_string)
+            key = (program["channel"], self.get_utc_timestamp(start_datetime), self.get_utc_timestamp(end_datetime))
+            guide_programs[key] = {
+                "program_name": program["program_name"],
+                "channel": program["channel"],
                 "start_datetime": start_datetime,
                 "end_datetime": end_datetime
-            })
-            epg.programs.append(epg_program)
-        return epg
+            }
+        if len(guide_programs) == 0:
+            return (0, 0)
+        epg_program_collection = EpgProgramEntry._get_collection()
+        stored_programs = epg_program_collection.find({
+            "channel": {"$in": list(set(key[0] for key in guide_programs))},
+            "start_datetime": {"$gte": min(program["start_datetime"] for program in guide_programs.values())},
+            "end_datetime": {"$lte": max(program["end_datetime"] for program in guide_programs.values())}
+        }, {"channel": 1, "start_datetime": 1, "end_datetime": 1, "program_name": 1})
+        operations = []
+        removed_programs = 0
+        for stored_program in stored_programs:
+            key = (stored_program["channel"], 
+                self.get_utc_timestamp(stored_program["start_datetime"]),
+                self.get_utc_timestamp(stored_program["end_datetime"]))
+            guide_program = guide_programs.get(key)
+            if guide_program is None:
+                operations.append(DeleteOne({"_id": stored_program["_id"]}))
+                removed_programs += 1
+            elif guide_program["program_name"] == stored_program.get("program_name"):
+                del guide_programs[key]
+        updated_at = datetime.now(pytz.utc)
+        for guide_program in guide_programs.values():
+            operations.append(UpdateOne({
+                "channel": guide_program["channel"],
+                "start_datetime": guide_program["start_datetime"],
+                "end_datetime": guide_program["end_datetime"]
+            }, {"$set": {
+                "program_name": guide_program["program_name"],
+                "duration": int((guide_program["end_datetime"] - guide_program["start_datetime"]).total_seconds() // 60),
+                "updated_at": updated_at
+            }}, upsert=True))
+        if len(operations) > 0:
+            try:
+                epg_program_collection.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                # Other worker upserted the same programs
+                gv.logger.warn("EPG programs already saved: {}".format(e.details.get("writeErrors", [])[:1]))
+        gv.logger.info("EPG programs updated: {} upserted, {} removed".format(len(guide_programs), removed_programs))
+        return (len(guide_programs), removed_programs)
+
+    def get_now_next_programs(self, channel=None):
+        """Gets the program shown now in a channel and the following one, with indexed range queries on epg_program
+        
+        :param channel: Name of the channel, defaults to the configured one
+        :type channel: str, optional
+        :return: Channel and now/next programs, None if there is no program
+        :rtype: dict
+        """
+        channel = channel or self.channel
+        now = datetime.now(pytz.utc)
+        now_program = EpgProgramEntry.objects(
+            channel=channel, start_datetime__lte=now, end_datetime__gt=now).order_by('-start_datetime').first()
+        next_start_datetime = now_program.end_datetime if now_program is not None else now
+        next_program = EpgProgramEntry.objects(
+            channel=channel, start_datetime__gte=next_start_datetime).order_by('start_datetime').first()
+        return {
+            "channel": channel,
+            "now": self.get_epg_program_dict(now_program),
+            "next": self.get_epg_program_dict(next_program)
+        }
+
+    def get_epg_program_dict(self, epg_program):
+        if epg_program is None:
+            return None
+        return {
+            "program_name": epg_program.program_name,
+            "channel": epg_program.channel,
+            "start_datetime": generate(epg_program.start_datetime.replace(tzinfo=pytz.utc), utc=True),
+            "end_datetime": generate(epg_program.end_datetime.replace(tzinfo=pytz.utc), utc=True),
+            "duration": epg_program.duration
+        }
 
     def check_epg_duplicate_in_db(self, epg,  last_epg):
         last_journey_datetime_tz_located = last_epg.journey_datetime.replace(tzinfo=pytz.utc).astimezone(pytz.utc)
@@ -279,19 +540,15 @@ class EpgManager:
     
     def update_epg_generation_status(self):
         self.is_epg_generating = False
-        current_status = StatusData.objects.order_by('-id').first()
-        if current_status is not None:
-            current_status.update(
-                is_epg_generating = False
-            )
-            current_status.reload()
-            current_status.save()
+        self.status_cache.update(is_epg_generating=False)
 
     def get_guide_data_channels(self):
         try:
             channels = []
+            if self.guide_data is None:
+                self.update_guide_data()
             if self.guide_data is not None:
-                channels = [channel["display-name"]["#text"] for channel in self.guide_data_dict["channel"]]
+                channels = self.guide_data["channels"]
             return channels
         except Exception as e:
             gv.logger.error(e)
@@ -0,0 +1,165 @@
+import os
+import time
+import json
+import hashlib
+import traceback
+from threading import Thread
+from pyrfc3339 import parse
+from gevent.lock import BoundedSemaphore
+
+from helper import global_variables as gv
+from helper import config as cfg
+from helper.channel_scope import get_channel_id
+
+# Keys of the search data that do not change the content of the exported file
+EXPORT_CACHE_IGNORED_KEYS = ["stream", "max_points", "resolution", "downsampling", "tier"]
+
+
+class ExportCache:
+    """Cache of the files exported from historic searches, under static/csv and static/json.
+
+    Files are named after the search and a hash of the normalised search data plus a watermark of its data,
+    so repeated exports of unchanged data are served from disk. A janitor thread evicts the least recently used files
+    when they are older than cfg.export_cache_max_age or the cache is bigger than cfg.export_cache_max_size_mb.
+    """
+
+    def __init__(self):
+        """Constructor
+        """
+        self.thread = None
+        self.eviction_lock = BoundedSemaphore(1)
+
+    def start(self):
+        """
+        Starts a thread that calls run method
+        """
+        gv.logger.info("Export cache janitor thread started")
+        thread = Thread(target=self.run, args=())
+        thread.daemon = True
+        self.thread = thread
+        thread.start()
+
+    def run(self):
+        """Thread run method
+        """
+        while gv.api_dm is None:
+            time.sleep(1)
+        while True:
+            self.evict()
+            time.sleep(cfg.export_cache_janitor_interval)
+
+    def get_cache_key(self, search_data, filetype, watermark):
+        """Hashes a search of the current channel and the state of its data
+
+        :param search_data: Data of the search
+        :type search_data: dict
+        :param filetype: Type of file, csv or json
+        :type filetype: str
+        :param watermark: State of the data of the search, e.g. number of documents and last inserted_at
+        :type watermark: dict
+        :return: Hex digest identifying the content of the file
+        :rtype: str
+        """
+        # Same search over different channels gives different files
+        normalised_search = {"type": filetype, "watermark": watermark, "channel_id": get_channel_id()}
+        for key, value in search_data.items():
+            if key in EXPORT_CACHE_IGNORED_KEYS or key == "type" or value in [None, ""]:
+                continue
+            if key.endswith("datetime"):
+                # Same instant in any timezone or RFC3339 variant
+                value = parse(value).timestamp()
+            normalised_search[key] = value
+        serialised_search = json.dumps(normalised_search, sort_keys=True, default=str)
+        return hashlib.sha1(serialised_search.encode("utf-8")).hexdigest()
+
+    def get_cached_filename(self, base_filename, cache_key):
+        """Adds the cache key to a search filename
+
+        :param base_filename: Filename of the search, with extension
+        :type base_filename: str
+        :param cache_key: Key from get_cache_key
+        :type cache_key: str
+        :return: Filename of the cache entry
+        :rtype: str
+        """
+        filename_stem, extension = os.path.splitext(base_filename)
+        return f"{filename_stem}-{cache_key[:16]}{extension}"
+
+    def get(self, server_filename):
+        """Checks if a file is cached, marking it as recently used
+
+        :param server_filename: Path of the cache entry
+        :type server_filename: str
+        :return: If the file exists
+        :rtype: bool
+        """
+        try:
+            # mtime is the last use of the file for the LRU eviction
+            os.utime(server_filename)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def put(self, server_filename, write_file):
+        """Writes a cache entry. The file is written in a temporary path and then renamed,
+        so a file is never served while it is being generated.
+
+        :param server_filename: Path of the cache entry
+        :type server_filename: str
+        :param write_file: Function that writes the file in the path received
+        :type write_file: function
+        """
+        temporary_filename = f"{server_filename}.{os.getpid()}.tmp"
+        try:
+            write_file(temporary_filename)
+            os.replace(temporary_filename, server_filename)
+        finally:
+            if os.path.exists(temporary_filename):
+                os.remove(temporary_filename)
+
+    def evict(self):
+        """Removes old cache entries and then the least recently used ones until the cache fits its maximum size
+        """
+        self.eviction_lock.acquire()
+        try:
+            now = time.time()
+            entries = []
+            for file_path in self.get_cache_paths():
+                try:
+                    file_stat = os.stat(file_path)
+                except FileNotFoundError:
+                    continue
+                if file_stat.st_mtime < now - cfg.export_cache_max_age:
+                    self.remove_entry(file_path)
+                # Temporary files are still being written
+                elif not file_path.endswith(".tmp"):
+                    entries.append((file_stat.st_mtime, file_stat.st_size, file_path))
+            cache_size = sum(size for _, size, _ in entries)
+            max_cache_size = cfg.export_cache_max_size_mb * 1024 * 1024
+            for _, size, file_path in sorted(entries):
+                if cache_size <= max_cache_size:
+                    break
+                self.remove_entry(file_path)
+                cache_size -= size
+        except Exception as e:
+            gv.logger.error(e)
+            gv.logger.error(traceback.print_exc())
+        finally:
+            self.eviction_lock.release()
+
+    def get_cache_paths(self):
+        for extension in cfg.historic_filetypes_allowed:
+            base_path = f"{cfg.data_manager_path}/static/{extension}"
+            if not os.path.isdir(base_path):
+                continue
+            for filename in os.listdir(base_path):
+                file_path = os.path.join(base_path, filename)
+                if os.path.isfile(file_path) and (filename.endswith(f".{extension}") or filename.endswith(".tmp")):
+                    yield file_path
+
+    def remove_entry(self, file_path):
+        try:
+            os.remove(file_path)
+            gv.logger.info("Removed export cache file {}".format(file_path))
+        except FileNotFoundError:
+            pass
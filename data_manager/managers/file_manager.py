@@ -1,4 +1,4 @@
-import json
+from io import StringIO
 from pathlib import Path
 from csv import DictWriter
 from bson import json_util
@@ -6,40 +6,62 @@ from mongoengine import DoesNotExist, fields
 from datetime import datetime
 from pyrfc3339 import parse
 from dateutil.tz import tzlocal
-from collections import OrderedDict
 import pytz
 import os
 import time
 
 from helper import global_variables as gv
 from helper import config as cfg
-from db_models import VideoAnalysis, StatusData
+from db_models import VideoAnalysis
+from db_models.video_analysis import unpack_video_statistics
 
 
 class FileManager:
     """This class represent the object that handles files for VideoMOS system
     """
 
-    def __init__(self, documents=[], alert_events={}, search_data={}, filetype=""):
+    def __init__(self, documents=[], alert_events={}, search_data={}, filetype="", export_cache=None):
         self.documents = documents
         self.alert_events = alert_events
         self.search_data = search_data
         self.filetype = filetype    
+        self.export_cache = export_cache
 
     def generate_search_file(self):
-        """Writes a file in JSON or CSV format containing a list of measures
+        """Writes a file in JSON or CSV format containing a list of measures.
+        With an export cache, the file is only generated if the same search was not exported with the same data.
         """
         server_filename = ""
         base_filename = ""
         folder_file = self.get_folder_file()
         base_path = f"{cfg.data_manager_path}/static/{folder_file}"
         base_filename = self.create_filename_from_search_data()
+        if self.export_cache is None:
+            self.generate_new_file(f'{base_path}/{base_filename}')
+            return base_filename
+        cache_key = self.export_cache.get_cache_key(self.search_data, self.filetype, self.get_data_watermark())
+        base_filename = self.export_cache.get_cached_filename(base_filename, cache_key)
         server_filename = f'{base_path}/{base_filename}'
-        if self.is_file_new(server_filename):
-            gv.logger.info("Generating new file")
-            self.generate_new_file(server_filename)
+        if self.export_cache.get(server_filename):
+            gv.logger.info("Search file found in export cache")
+        else:
+            self.export_cache.put(server_filename, self.generate_new_file)
+            self.export_cache.evict()
         return base_filename
 
+    def get_data_watermark(self):
+        """Obtains the state of the data of the search. It changes when documents or alerts are added or removed
+        
+        :return: Number of documents, last inserted_at and number of alert events
+        :rtype: dict
+        """
+        last_document = self.documents.order_by("-inserted_at").only("inserted_at").as_pymongo().first()
+        return {
+            "documents": self.documents.count(),
+            "last_inserted_at": last_document.get("inserted_at") if last_document is not None else None,
+            "alert_events": sum(len(alert_events) for alert_events in self.alert_events.values())
+        }
+
     def get_folder_file(self):
         """ """
         folder_file = ""
@@ -112,105 +134,134 @@ class FileManager:
         datetime_dict["end_datetime"] = datetime.fromtimestamp(end_timestamp).strftime("%Hh_%Mm")
         return datetime_dict
 
-    def is_file_new(self, server_filename):
-        """[summary]
-        """
-        if self.search_data.get("init_datetime") is not None:
-            return True
-        return self.is_journey_search_file_new(server_filename)
-
-    def is_journey_search_file_new(self,  server_filename):
-        current_status = StatusData.objects.order_by('-id').first()
-        if current_status is None:
-            return True
-        is_program_name_empty = self.search_data.get("program_name") in [None, ""]
-        is_file_new = not os.path.exists(server_filename)
-        current_journey = current_status.journey_datetime.replace(tzinfo=pytz.UTC)
-        is_current_journey = current_journey == parse(self.search_data.get("journey_datetime"))
-        return is_program_name_empty or is_file_new or is_current_journey
-
     def generate_new_file(self, server_filename):
         """ """
         gv.logger.info("Generating new search file ...")
+        encoding = "utf-8-sig" if self.filetype == "csv" else None
+        with open(server_filename, "w", encoding=encoding) as output_file:
+            for chunk in self.generate_file_chunks():
+                output_file.write(chunk)
+
+    def stream_search_file(self):
+        """Streams the search file in chunks, without writing it to disk
+        
+        :return: Filename and generator of the file content
+        :rtype: tuple(str, generator)
+        """
+        base_filename = self.create_filename_from_search_data()
+        # Same BOM that utf-8-sig writes in CSV files
+        prefix = "\ufeff" if self.filetype == "csv" else ""
+        def generate_chunks():
+            yield prefix
+            for chunk in self.generate_file_chunks():
+                yield chunk
+        return base_filename, generate_chunks()
+
+    def generate_file_chunks(self):
+        """Generates the content of the search file in chunks of cfg.export_chunk_documents documents.
+        Documents are read from a raw cursor, so memory does not depend on the number of documents.
+        """
+        self.alert_events_by_document = self.get_alert_events_by_document()
         if self.filetype == "csv":
-            self.generate_csv_file(server_filename)
+            return self.generate_csv_chunks()
         elif self.filetype == "json":
-            with open(server_filename, "w") as output_file:
-                output_file.write(self.documents.to_json())
+            return self.generate_json_chunks()
+        return iter([])
+
+    def get_raw_documents(self):
+        """Raw pymongo documents of the search, with only VideoAnalysis fields and the statistics unpacked
+        """
+        raw_documents = self.documents.only(*VideoAnalysis._fields.keys()).as_pymongo().batch_size(cfg.export_chunk_documents)
+        for document in raw_documents:
+            if isinstance(document.get("videoSettings"), dict):
+                unpack_video_statistics(document["videoSettings"])
+            yield document
 
-    def generate_csv_file(self, server_filename):
-        """Creates the CSV file correspondent to the list of documents provided
+    def generate_json_chunks(self):
+        """Generates the JSON array of documents, as mongoengine to_json does
         """
-        with open(server_filename,'w',encoding='utf-8-sig') as output_file:
-            csv_writer = None
-            for index, document in enumerate(self.documents):
-                csv_row_dict = self.get_new_csv_row(document)
-                if index == 0:
-                    csv_writer = DictWriter(output_file, fieldnames=list(csv_row_dict.keys()))
-                    csv_writer.writeheader()
-                csv_writer.writerow(csv_row_dict)
+        chunk = ["["]
+        for index, document in enumerate(self.get_raw_documents()):
+            if index > 0:
+                chunk.append(",")
+            chunk.append(json_util.dumps(document))
+            if (index + 1) % cfg.export_chunk_documents == 0:
+                yield "".join(chunk)
+                chunk = []
+        chunk.append("]")
+        yield "".join(chunk)
+
+    def generate_csv_chunks(self):
+        """Generates the CSV file correspondent to the list of documents provided, header included
+        """
+        output_buffer = StringIO()
+        csv_writer = DictWriter(output_buffer, fieldnames=self.get_csv_fieldnames(), extrasaction="ignore")
+        csv_writer.writeheader()
+        for index, document in enumerate(self.get_raw_documents()):
+            csv_writer.writerow(self.get_new_csv_row(document))
+            if (index + 1) % cfg.export_chunk_documents == 0:
+                yield output_buffer.getvalue()
+                output_buffer.seek(0)
+                output_buffer.truncate(0)
+        yield output_buffer.getvalue()
+
+    def get_csv_fieldnames(self):
+        """Columns of the CSV file: simple fields, fields of embedded documents and alerts"""
+        fieldnames = []
+        embedded_fieldnames = []
+        for field_name, field in VideoAnalysis._fields.items():
+            if type(field) is fields.EmbeddedDocumentField:
+                sub_field_prefix = self.get_subfield_prefix(field_name)
+                embedded_fieldnames += [
+                    f"{sub_field_prefix}{sub_field_name}" for sub_field_name in field.document_type._fields.keys()
+                    if sub_field_name not in ["stats", "stats_version"]
+                ]
+            else:
+                fieldnames.append(field_name)
+        # Embedded fields named as a simple one share its column, as in the rows
+        return list(dict.fromkeys(fieldnames + embedded_fieldnames + ["alerts"]))
 
     def get_new_csv_row(self, document):
         """Completes the CSV row info from alerts and document stats"""
-        alerts_document = self.check_document_alert_events(document)
         csv_row_dict = self.get_csv_row_from_document_fields(document)
-        csv_row_dict.update({
-            "alerts": alerts_document
-        })
+        csv_row_dict["alerts"] = self.alert_events_by_document.get(str(document["_id"]), [])
         return csv_row_dict
 
-    def check_document_alert_events(self, document):
-        """[summary]        """
-        document_alert_events = []
-        for event_category in self.alert_events.keys():
-            document_alert_events += self.check_category_events_in_document(document, event_category)
-        return document_alert_events
-
-    def check_category_events_in_document(self, document, event_category):
-        """[summary]        """
-        document_alert_events = []
-        try:
+    def get_alert_events_by_document(self):
+        """Indexes the alert events by the id of their document, to look them up once per row
+        
+        :return: Alert events of each document, as category_singular_category
+        :rtype: dict
+        """
+        alert_events_by_document = {}
+        for event_category, alert_events in self.alert_events.items():
             # event_category comes in plural, we have to made it singular to append it to csv
             event_category_singular = event_category[:-1]
-            for alert_event in self.alert_events[event_category]:
-                # Check if document that has alert is our current document
-                if alert_event["video_analysis"]["$oid"] == str(document.id):
-                    document_alert_events.append(f"{event_category_singular}_{alert_event['category']}")
-            return document_alert_events
-        except Exception:
-            return document_alert_events
-    
-    def get_csv_row_from_document_fields(self, document):
-        """ """
-        csv_row_dict = OrderedDict()
-        document_fields = set(VideoAnalysis._fields.keys())
-        embedded_document_fields = set([k for k,v in VideoAnalysis._fields.items() if type(v) is fields.EmbeddedDocumentField])  
-        simple_document_fields = document_fields.difference(embedded_document_fields)
-        for field in simple_document_fields:
-            csv_row_dict = self.update_csv_row_with_field(document, field, csv_row_dict)
-        for field in embedded_document_fields:
-            csv_row_dict = self.update_csv_row_with_embedded_document_field(document, field, csv_row_dict)
-        return csv_row_dict
+            for alert_event in alert_events:
+                try:
+                    document_id = alert_event["video_analysis"]["$oid"]
+                except (KeyError, TypeError):
+                    continue
+                alert_events_by_document.setdefault(document_id, []).append(
+                    f"{event_category_singular}_{alert_event['category']}")
+        return alert_events_by_document
 
-    def update_csv_row_with_field(self, document, field, csv_row_dict):
-        """ """
-        row_data = ""
-        if field == "id":
-            row_data = str(document.id)
-        elif field == "journey_datetime":
-            row_data = document[field].replace(tzinfo=pytz.UTC).astimezone(tzlocal())
-        else:
-            row_data = document[field]
-        csv_row_dict.update({field: row_data})
-        return csv_row_dict
-
-    def update_csv_row_with_embedded_document_field(self, document, field, csv_row_dict):
-        """ """
-        document_as_dict = json.loads(document.to_json())
-        sub_field_prefix = self.get_subfield_prefix(field)
-        for sub_field_name, sub_field_value in document_as_dict[field].items():
-            csv_row_dict.update({
-                f"{sub_field_prefix}{sub_field_name}": sub_field_value})
+    def get_csv_row_from_document_fields(self, document):
+        """Flattens a raw document in a single pass"""
+        csv_row_dict = {}
+        for field_name, field in VideoAnalysis._fields.items():
+            value = document.get(field.db_field)
+            if type(field) is fields.EmbeddedDocumentField:
+                if isinstance(value, dict):
+                    sub_field_prefix = self.get_subfield_prefix(field_name)
+                    for sub_field_name, sub_field_value in value.items():
+                        csv_row_dict[f"{sub_field_prefix}{sub_field_name}"] = sub_field_value
+            elif field_name == "id":
+                csv_row_dict[field_name] = str(value)
+            elif field_name == "journey_datetime" and value is not None:
+                csv_row_dict[field_name] = value.replace(tzinfo=pytz.UTC).astimezone(tzlocal())
+            else:
+                csv_row_dict[field_name] = value
         return csv_row_dict
 
     def get_subfield_prefix(self, field):
@@ -226,6 +277,6 @@ class file_utils:
             base_path = f"{cfg.data_manager_path}/static/{extension}"
             for filename in os.listdir(base_path):
                 file_path = os.path.join(base_path, filename)
-                if os.stat(file_path).st_mtime < now - 7 * 86400: # Older than a week
+                if os.stat(file_path).st_mtime < now - cfg.export_cache_max_age:
                     if os.path.isfile(file_path) and extension in filename:
-                        os.remove()
\ No newline at end of file
+                        os.remove(file_path)
\ No newline at end of file
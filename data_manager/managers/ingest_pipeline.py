@@ -0,0 +1,370 @@
+import time
+import traceback
+import uuid
+from os import getpid
+from queue import Queue, Empty, Full
+from threading import Thread
+from bson.objectid import ObjectId
+from gevent.lock import BoundedSemaphore
+from mongoengine.queryset.visitor import Q
+
+from helper import global_variables as gv
+from helper import config as cfg
+from helper.channel_scope import set_channel_id
+from db_models import IngestJob, VideoAnalysis
+
+# PID and token of this worker process. Workers of a restarted container reuse PIDs, tokens are never reused
+worker_token = (None, None)
+
+
+def get_worker_token():
+    """Token of this worker process, created the first time it is used in the process
+
+    :return: Random token
+    :rtype: str
+    """
+    global worker_token
+    if worker_token[0] != getpid():
+        worker_token = (getpid(), uuid.uuid4().hex)
+    return worker_token[1]
+
+
+class PipelineStage:
+    """A stage of the ingest pipeline: a bounded queue consumed by a pool of worker threads.
+    The result of the handler is put on the queue of the next stage, blocking while it is full,
+    so a slow stage applies back-pressure to the previous ones instead of growing memory.
+
+    :param name: Name of the stage
+    :type name: str
+    :param handler: Function that processes a list of items taken from the queue and returns the item for the next stage
+    :type handler: function
+    :param next_stage: Stage that receives the output of this one, defaults to None
+    :type next_stage: managers.ingest_pipeline.PipelineStage, optional
+    :param workers: Number of worker threads, defaults to 1
+    :type workers: int, optional
+    :param batch_size: Maximum number of queued items processed together, defaults to 1
+    :type batch_size: int, optional
+    :param maxsize: Maximum number of items waiting in the queue, defaults to cfg.ingest_queue_size
+    :type maxsize: int, optional
+    :param channel_id: Channel of the measures processed by the workers, defaults to None (default channel)
+    :type channel_id: str, optional
+    :param error_handler: Function called with the items whose handler raised an exception, defaults to None
+    :type error_handler: function, optional
+    """
+
+    def __init__(self, name, handler, next_stage=None, workers=1, batch_size=1, maxsize=cfg.ingest_queue_size,
+                 channel_id=None, error_handler=None):
+        """Constructor
+        """
+        self.name = name
+        self.channel_id = channel_id
+        self.handler = handler
+        self.error_handler = error_handler
+        self.next_stage = next_stage
+        self.workers = workers
+        self.batch_size = batch_size
+        self.queue = Queue(maxsize=maxsize)
+        self.threads = []
+        self.stats_lock = BoundedSemaphore(1)
+        self.processed = 0
+        self.errors = 0
+        self.latency_avg = 0.0
+        self.latency_max = 0.0
+        self.wait_avg = 0.0
+
+    def start(self):
+        """
+        Starts the worker threads of the stage
+        """
+        for _ in range(self.workers):
+            thread = Thread(target=self.run, args=())
+            thread.daemon = True
+            self.threads.append(thread)
+            thread.start()
+
+    def put(self, item, block=True):
+        """Queues an item in the stage
+
+        :param item: Item to process
+        :type item: dict
+        :param block: Waits for a free slot if the queue is full, defaults to True
+        :type block: bool, optional
+        :raises queue.Full: The queue is full and block is False
+        """
+        item["queued_at"] = time.time()
+        self.queue.put(item, block=block)
+
+    def run(self):
+        """Thread run method
+        """
+        while gv.api_dm is None:
+            time.sleep(1)
+        set_channel_id(self.channel_id)
+        while True:
+            items = self.get_items()
+            start_time = time.time()
+            try:
+                output = self.handler(items)
+                if self.next_stage is not None and output is not None:
+                    self.next_stage.put(output)
+                self.update_stats(items, start_time)
+            except Exception as e:
+                self.errors += 1
+                gv.logger.error(e)
+                gv.logger.error(traceback.print_exc())
+                self.handle_error(items)
+            finally:
+                for _ in items:
+                    self.queue.task_done()
+
+    def handle_error(self, items):
+        if self.error_handler is None:
+            return
+        try:
+            self.error_handler(items)
+        except Exception as e:
+            gv.logger.error(e)
+            gv.logger.error(traceback.print_exc())
+
+    def get_items(self):
+        """Waits for an item and takes the ones already queued behind it, up to batch_size
+
+        :return: Items to process together
+        :rtype: list[dict]
+        """
+        items = [self.queue.get()]
+        while len(items) < self.batch_size:
+            try:
+                items.append(self.queue.get_nowait())
+            except Empty:
+                break
+        return items
+
+    def update_stats(self, items, start_time):
+        latency = time.time() - start_time
+        self.stats_lock.acquire()
+        try:
+            # Exponential moving averages, recent batches weight more
+            if self.processed == 0:
+                self.latency_avg = latency
+            else:
+                self.latency_avg = 0.9 * self.latency_avg + 0.1 * latency
+            self.latency_max = max(self.latency_max, latency)
+            for item in items:
+                self.wait_avg = 0.9 * self.wait_avg + 0.1 * (start_time - item["queued_at"])
+            self.processed += len(items)
+        finally:
+            self.stats_lock.release()
+
+    def get_stats(self):
+        """Gets the current state of the stage
+
+        :return: Queue depth, workers and latencies (ms) of the stage
+        :rtype: dict
+        """
+        return {
+            "depth": self.queue.qsize(),
+            "maxsize": self.queue.maxsize,
+            "workers": self.workers,
+            "processed": self.processed,
+            "errors": self.errors,
+            "latency_avg_ms": round(self.latency_avg * 1000, 3),
+            "latency_max_ms": round(self.latency_max * 1000, 3),
+            "wait_avg_ms": round(self.wait_avg * 1000, 3)
+        }
+
+
+class IngestPipeline:
+    """Asynchronous pipeline for the measures sent by the probe: accept -> predict -> persist -> aggregate -> alert.
+
+    The HTTP request only runs the accept step: document ids are assigned, the measures are journaled in MongoDB
+    and queued for prediction. Each following stage has its own bounded queue and workers.
+    Persist, aggregate and alert stages use a single worker so measures keep their order.
+    Journaled measures are owned by the worker process that accepted them for a lease. Measures of a worker 
+    that stopped are queued again by any worker once the lease expires, and measures that failed to be predicted 
+    or persisted are released and retried after a backoff.
+    Each channel has its own pipeline, so the measures of a slow channel do not delay the other ones.
+
+    :param document_manager: DbManager in charge of handling VideoAnalysis documents in MongoDB
+    :type document_manager: managers.db_managers.DocumentDbManager
+    :param videoqualitypred_manager: Manager in charge of handling requests to the Video Quality Analysis AI Module
+    :type videoqualitypred_manager: managers.VideoQualityPredManager
+    """
+
+    def __init__(self, document_manager, videoqualitypred_manager):
+        """Constructor
+        """
+        self.document_manager = document_manager
+        self.videoqualitypred_manager = videoqualitypred_manager
+        self.channel_id = document_manager.channel_id
+        self.alert_stage = PipelineStage("alert", self.alert_documents, channel_id=self.channel_id)
+        self.aggregate_stage = PipelineStage("aggregate", self.aggregate_documents, self.alert_stage,
+                                             channel_id=self.channel_id)
+        self.persist_stage = PipelineStage("persist", self.persist_documents, self.aggregate_stage,
+                                           channel_id=self.channel_id, error_handler=self.release_jobs)
+        self.predict_stage = PipelineStage(
+            "predict", self.predict_measures, self.persist_stage,
+            workers=cfg.ingest_predict_workers, batch_size=cfg.ingest_predict_batch_size, channel_id=self.channel_id,
+            error_handler=self.release_jobs)
+        self.stages = [self.predict_stage, self.persist_stage, self.aggregate_stage, self.alert_stage]
+
+    def start(self):
+        """
+        Starts the workers of every stage and the recovery of the journal
+        """
+        gv.logger.info("Ingest pipeline started")
+        for stage in self.stages:
+            stage.start()
+        if cfg.ingest_journal_enabled:
+            thread = Thread(target=self.recover_journal, args=())
+            thread.daemon = True
+            thread.start()
+
+    def accept(self, measures, headers):
+        """Accepts measures from the probe. Returns as soon as they are queued.
+
+        :param measures: Measures from the probe, with the confidence interval already added
+        :type measures: list[dict]
+        :param headers: Headers at the request
+        :type headers: dict
+        :raises queue.Full: The pipeline can not accept more measures
+        :return: Ids assigned to the documents of the measures
+        :rtype: list[str]
+        """
+        if self.predict_stage.queue.full():
+            raise Full()
+        job = {
+            "measures": measures,
+            "document_ids": [str(ObjectId()) for _ in measures],
+            "headers": dict(headers),
+            "job_id": None
+        }
+        if cfg.ingest_journal_enabled:
+            accepted_at = time.time()
+            ingest_job = IngestJob(
+                channel_id=self.channel_id, measures=measures, document_ids=job["document_ids"], headers=job["headers"],
+                worker_pid=getpid(), owner=get_worker_token(), leased_at=accepted_at, accepted_at=accepted_at).save()
+            job["job_id"] = ingest_job.id
+        try:
+            self.predict_stage.put(job, block=False)
+        except Full:
+            if job["job_id"] is not None:
+                IngestJob.objects(id=job["job_id"]).delete()
+            raise
+        return job["document_ids"]
+
+    def predict_measures(self, jobs):
+        measures = [measure for job in jobs for measure in job["measures"]]
+        predictions = []
+        if len(measures) > 0:
+            predictions = self.videoqualitypred_manager.post_api_mos_analyzer_batch(measures, jobs[0]["headers"])
+        documents = []
+        index = 0
+        for job in jobs:
+            for measure, document_id in zip(job["measures"], job["document_ids"]):
+                if predictions[index] is not None:
+                    document = self.videoqualitypred_manager.prepare_data_to_db(
+                        data_content_input=measure,
+                        data_content_output=predictions[index],
+                        headers=job["headers"]
+                    )
+                    document["id"] = document_id
+                    documents.append(document)
+                index += 1
+        return {"documents": documents, "job_ids": [job["job_id"] for job in jobs if job["job_id"] is not None]}
+
+    def persist_documents(self, items):
+        documents = [document for item in items for document in item["documents"]]
+        videoanalysis_db_documents = []
+        if len(documents) > 0:
+            videoanalysis_db_documents = self.document_manager.persist_video_analysis_documents(documents)
+        job_ids = [job_id for item in items for job_id in item["job_ids"]]
+        if len(job_ids) > 0:
+            IngestJob.objects(id__in=job_ids).delete()
+        if len(videoanalysis_db_documents) == 0:
+            return None
+        return {"documents": videoanalysis_db_documents}
+
+    def aggregate_documents(self, items):
+        videoanalysis_db_documents = [document for item in items for document in item["documents"]]
+        self.document_manager.aggregate_video_analysis_documents(videoanalysis_db_documents)
+        return {"documents": videoanalysis_db_documents}
+
+    def alert_documents(self, items):
+        videoanalysis_db_documents = [document for item in items for document in item["documents"]]
+        self.document_manager.find_alerts_warnings_documents(videoanalysis_db_documents)
+
+    def recover_journal(self):
+        """Thread run method. Periodically queues again the journaled measures of the channel 
+        that no running worker is processing
+        """
+        while gv.api_dm is None:
+            time.sleep(1)
+        set_channel_id(self.channel_id)
+        while True:
+            try:
+                self.recover_jobs()
+            except Exception as e:
+                gv.logger.error(e)
+                gv.logger.error(traceback.print_exc())
+            time.sleep(cfg.ingest_journal_recover_interval)
+
+    def recover_jobs(self):
+        """Claims and queues the journaled measures released after a failure, once their retry time has passed, 
+        and the ones whose lease expired, as the worker that owned them stopped
+        """
+        now = time.time()
+        released = Q(owner=None) & (Q(retry_at=None) | Q(retry_at__lte=now))
+        expired = Q(owner__ne=None) & Q(leased_at__lt=now - cfg.ingest_job_lease_seconds)
+        for ingest_job in IngestJob.objects(Q(channel_id=self.channel_id) & (released | expired)).order_by('id'):
+            # Only one worker can claim each job
+            claimed = IngestJob.objects(
+                id=ingest_job.id, owner=ingest_job.owner, leased_at=ingest_job.leased_at).update_one(
+                    set__owner=get_worker_token(), set__leased_at=time.time(), set__worker_pid=getpid())
+            if claimed == 0:
+                continue
+            self.predict_stage.put(self.get_pending_job(ingest_job))
+            gv.logger.info("Recovered ingest job {}".format(ingest_job.id))
+
+    def release_jobs(self, items):
+        """Gives up the journaled measures of a batch that failed, so any worker retries them after a backoff
+
+        :param items: Items of the failed batch, jobs of the predict stage or predicted documents of the persist stage
+        :type items: list[dict]
+        """
+        job_ids = [item["job_id"] for item in items if item.get("job_id") is not None]
+        job_ids += [job_id for item in items for job_id in item.get("job_ids", [])]
+        if len(job_ids) == 0:
+            return
+        for ingest_job in IngestJob.objects(id__in=job_ids, owner=get_worker_token()).only("id", "attempts"):
+            retry_seconds = min(cfg.ingest_job_retry_seconds * 2 ** ingest_job.attempts, cfg.ingest_job_lease_seconds)
+            IngestJob.objects(id=ingest_job.id, owner=get_worker_token()).update_one(
+                unset__owner=True, set__retry_at=time.time() + retry_seconds, inc__attempts=1)
+            gv.logger.warning("Ingest job {} released, retried in {} s".format(ingest_job.id, retry_seconds))
+
+    def get_pending_job(self, ingest_job):
+        """Builds a pipeline job with the measures of a journaled job that were not inserted before the worker stopped
+        """
+        inserted_ids = set(str(document_id) for document_id in VideoAnalysis.objects(
+            id__in=ingest_job.document_ids).distinct('id'))
+        pending = [
+            (measure, document_id) for measure, document_id in zip(ingest_job.measures, ingest_job.document_ids)
+            if document_id not in inserted_ids
+        ]
+        return {
+            "measures": [measure for measure, _ in pending],
+            "document_ids": [document_id for _, document_id in pending],
+            "headers": ingest_job.headers,
+            "job_id": ingest_job.id
+        }
+
+    def get_stats(self):
+        """Gets queue depth and latency of every stage
+
+        :return: Stats of each stage by name
+        :rtype: dict
+        """
+        stats = {stage.name: stage.get_stats() for stage in self.stages}
+        if cfg.ingest_journal_enabled:
+            stats["journal"] = {"pending": IngestJob.objects(channel_id=self.channel_id).count()}
+        return stats
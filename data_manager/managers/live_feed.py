@@ -0,0 +1,178 @@
+import json
+import time
+import traceback
+from queue import Queue, Empty, Full
+from threading import Thread
+from gevent.lock import BoundedSemaphore
+from pymongo import CursorType, ReturnDocument
+
+from helper import global_variables as gv
+from helper import config as cfg
+from helper.channel_scope import get_channel_id
+from db_models import LiveEvent, LiveEventCounter
+
+
+class LiveFeed:
+    """Push feed of new measures, probe status changes and alerts for the dashboards, sent as server-sent events.
+
+    Events are published in the LiveEvent capped collection by the worker that produces them.
+    Each worker tails that collection with a single cursor and fans every event out to the queues of its clients,
+    so the number of viewers does not change the load on MongoDB.
+    Events are numbered with a sequence shared by every worker, which is their id for the clients, as ObjectIds
+    are not increasing across processes. Clients reconnecting with Last-Event-ID receive the events they missed 
+    that are still in the collection.
+    Events belong to the channel in scope when they are published, and clients only receive the ones of their channel.
+    """
+
+    def __init__(self):
+        """Constructor
+        """
+        self.thread = None
+        self.clients = []
+        self.clients_lock = BoundedSemaphore(1)
+
+    def start(self):
+        """
+        Starts a thread that calls run method
+        """
+        gv.logger.info("Live feed thread started")
+        thread = Thread(target=self.run, args=())
+        thread.daemon = True
+        self.thread = thread
+        thread.start()
+
+    def run(self):
+        """Thread run method. Tails the LiveEvent collection and sends each event to the clients of this worker
+        """
+        while gv.api_dm is None:
+            time.sleep(1)
+        last_event = LiveEvent.objects(seq__ne=None).order_by("-seq").only("seq").first()
+        last_seq = last_event.seq if last_event is not None else 0
+        while True:
+            try:
+                # Tailed in natural order, so events are received even if they are inserted after a higher sequence
+                cursor = LiveEvent._get_collection().find(
+                    {"seq": {"$gt": last_seq}}, cursor_type=CursorType.TAILABLE_AWAIT)
+                while cursor.alive:
+                    for live_event in cursor:
+                        last_seq = max(last_seq, live_event["seq"])
+                        self.dispatch(live_event.get("channel_id"), self.get_message(live_event))
+            except Exception as e:
+                gv.logger.error(e)
+                gv.logger.error(traceback.print_exc())
+            # Cursors die when the collection is empty
+            time.sleep(1)
+
+    def publish(self, event, data):
+        """Publishes an event for the clients of every worker
+
+        :param event: Type of event: measure, status, alert or warning
+        :type event: str
+        :param data: Content of the event, serializable as JSON
+        :type data: dict
+        """
+        self.publish_many(event, [data])
+
+    def publish_many(self, event, data_list):
+        """Publishes several events of the same type with a single insert
+        """
+        try:
+            if len(data_list) > 0:
+                channel_id = get_channel_id()
+                first_seq = self.reserve_sequence(len(data_list))
+                LiveEvent.objects.insert([
+                    LiveEvent(seq=first_seq + index, channel_id=channel_id, event=event,
+                              data=json.dumps(data, default=str), created_at=time.time())
+                    for index, data in enumerate(data_list)
+                ], load_bulk=False)
+        except Exception as e:
+            gv.logger.error(e)
+            gv.logger.error(traceback.print_exc())
+
+    def reserve_sequence(self, count):
+        """Reserves consecutive sequence numbers for new events with a single $inc, shared by every worker
+
+        :param count: Number of events
+        :type count: int
+        :return: First sequence number reserved
+        :rtype: int
+        """
+        counter = LiveEventCounter._get_collection().find_one_and_update(
+            {"_id": "live_event"}, {"$inc": {"seq": count}}, upsert=True, return_document=ReturnDocument.AFTER)
+        return counter["seq"] - count + 1
+
+    def get_message(self, live_event):
+        """Formats an event as a server-sent event. It is done once for all the clients
+        """
+        return (live_event["seq"], "id: {}\nevent: {}\ndata: {}\n\n".format(
+            live_event["seq"], live_event["event"], live_event["data"]))
+
+    def dispatch(self, channel_id, message):
+        self.clients_lock.acquire()
+        try:
+            for client in list(self.clients):
+                if client.channel_id != channel_id:
+                    continue
+                try:
+                    client.put_nowait(message)
+                except Full:
+                    # Too slow. It is disconnected and replays the missed events when it reconnects
+                    self.clients.remove(client)
+                    client.closed = True
+        finally:
+            self.clients_lock.release()
+
+    def subscribe(self, last_event_id=None, channel_id=None):
+        """Gets the stream of server-sent events of a new client
+
+        :param last_event_id: Id (sequence number) of the last event received before reconnecting, defaults to None
+        :type last_event_id: str, optional
+        :param channel_id: Channel of the events, defaults to None (default channel)
+        :type channel_id: str, optional
+        :return: Generator of server-sent event messages
+        :rtype: generator
+        """
+        client = Queue(maxsize=cfg.live_feed_client_queue_size)
+        client.closed = False
+        client.channel_id = channel_id
+        # Registered before reading the missed events, so no event is lost in between
+        self.clients_lock.acquire()
+        try:
+            self.clients.append(client)
+        finally:
+            self.clients_lock.release()
+        return self.generate_messages(client, last_event_id)
+
+    def generate_messages(self, client, last_event_id):
+        try:
+            # Tells the browser to wait a bit before reconnecting
+            yield "retry: 3000\n\n"
+            # Ids of older versions are not sequence numbers, so they are not replayed
+            last_seq = int(last_event_id) if last_event_id not in [None, ""] and last_event_id.isdigit() else None
+            if last_seq is not None:
+                for live_event in LiveEvent._get_collection().find(
+                        {"channel_id": client.channel_id, "seq": {"$gt": last_seq}}).sort("seq", 1):
+                    (last_seq, message) = self.get_message(live_event)
+                    yield message
+            while not client.closed:
+                try:
+                    (event_seq, message) = client.get(timeout=cfg.live_feed_heartbeat)
+                except Empty:
+                    # Keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                # Already sent while replaying
+                if last_seq is not None and event_seq <= last_seq:
+                    continue
+                last_seq = None
+                yield message
+        finally:
+            self.unsubscribe(client)
+
+    def unsubscribe(self, client):
+        self.clients_lock.acquire()
+        try:
+            if client in self.clients:
+                self.clients.remove(client)
+        finally:
+            self.clients_lock.release()
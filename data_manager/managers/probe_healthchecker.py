@@ -1,21 +1,33 @@
-import psutil
 import time
-from mongoengine import connect
 from threading import Thread
 from helper import global_variables as gv
 from helper import config as cfg
-from db_models import StatusData
+from helper.channel_scope import set_channel_id
+from managers.db_connection import get_db_client
 
 
 class ProbeHealthChecker:
-    """[summary]
+    """Fallback for the probes whose supervisor is gone.
+    Probes launched by a worker are restarted by its ProbeSupervisor as soon as they exit. This thread only restarts
+    a probe launched by another worker if it stays dead for cfg.probe_orphan_timeout seconds.
+
+    :param status_cache: Cache of the latest probe status
+    :type status_cache: managers.status_cache.StatusCache
+    :param probe_supervisor: Owner of the probe processes launched by this worker
+    :type probe_supervisor: managers.probe_supervisor.ProbeSupervisor
     """
 
-    def __init__(self):
+    def __init__(self, status_cache, probe_supervisor):
         """Constructor
         """
         self.thread = None
-        connect(cfg.db_name, host=cfg.host, port=int(cfg.db_port))
+        self.status_cache = status_cache
+        self.probe_supervisor = probe_supervisor
+        # PID of the probe found dead, and when
+        self.dead_probe_pid = None
+        self.dead_probe_since = None
+        # Documents use the client shared by every manager
+        get_db_client()
         
     def start(self):
         """
@@ -32,18 +44,23 @@ class ProbeHealthChecker:
         """
         while gv.api_dm is None:
             time.sleep(1)
+        set_channel_id(self.status_cache.channel_id)
         while True:
             # Only checks health if 
             self.check_probe_health()
             time.sleep(cfg.healthcheck_interval)
 
     def check_probe_health(self):
-        current_status = StatusData.objects.order_by('-id').first()
+        current_status = self.status_cache.status
         if gv.api_dm.probe_status not in ["stopped", "idle"] and current_status.content_type != "playlist":
-            if(psutil.pid_exists(current_status.probe_pid)):
+            probe_pid = current_status.probe_pid
+            if self.probe_supervisor.owns(probe_pid) or self.probe_supervisor.is_alive(probe_pid):
                 return
-            else:
-                # If VideoQP has been killed, restarts it
+            if self.dead_probe_pid != probe_pid:
+                self.dead_probe_pid = probe_pid
+                self.dead_probe_since = time.time()
+            elif time.time() - self.dead_probe_since > cfg.probe_orphan_timeout:
+                # If VideoQP has been killed and nobody restarted it, restarts it
                 gv.logger.warning("Something went wrong ... restarting the probe")
                 gv.api_dm.probe_router.set_probe_router_attributes()
                 gv.api_dm.probe_router.launch_probe_by_url()
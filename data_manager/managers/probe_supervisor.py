@@ -0,0 +1,256 @@
+import os
+import signal
+import subprocess
+import time
+import traceback
+import psutil
+from threading import Thread
+from gevent.lock import BoundedSemaphore
+
+from helper import config as cfg
+from helper import global_variables as gv
+from helper.channel_scope import set_channel_id
+
+
+class SupervisedProcess:
+    """Popen handle of a process launched by the ProbeSupervisor, with its restart policy and backoff state
+
+    :param name: Key of the process in the supervisor
+    :type name: str
+    :param command: Command of the process as a list
+    :type command: list
+    :param restart_policy: "always", "on-failure" or "never"
+    :type restart_policy: str
+    """
+
+    def __init__(self, name, command, restart_policy):
+        """Constructor
+        """
+        self.name = name
+        self.command = command
+        self.restart_policy = restart_policy
+        self.process = None
+        self.started_at = None
+        self.failures = 0
+        self.restarts = 0
+        # Set when the process is stopped on purpose, so it is not restarted
+        self.stopping = False
+        # Set when the process is killed to be restarted, whatever its policy is
+        self.restart_requested = False
+
+    @property
+    def pid(self):
+        return self.process.pid if self.process is not None else None
+
+    def is_alive(self):
+        # returncode is set by the watcher thread as soon as the process is reaped
+        return self.process is not None and self.process.returncode is None
+
+
+class ProbeSupervisor:
+    """Owns the processes of the probes launched by this worker.
+
+    Each process has a watcher thread blocked on waitpid, which returns as soon as the kernel sends SIGCHLD
+    (gevent's child watcher when subprocess is patched), so exits are known without polling and without scanning
+    the process table. Live probes are restarted with the same command according to their policy, right away the
+    first time and then with an exponential backoff while they keep failing.
+    Probes launched by another worker are identified by the PID stored in their status.
+
+    :param status_cache: Cache of the latest probe status
+    :type status_cache: managers.status_cache.StatusCache
+    """
+
+    def __init__(self, status_cache):
+        """Constructor
+        """
+        self.status_cache = status_cache
+        self.processes = {}
+        self.processes_lock = BoundedSemaphore(1)
+
+    def launch(self, name, command, restart_policy="never"):
+        """Launches a process and watches it. A process already launched with the same name is stopped before.
+        Each process leads its own session, so its children are signalled with it.
+
+        :param name: Key of the process
+        :type name: str
+        :param command: Command to run as a list
+        :type command: list
+        :param restart_policy: "always", "on-failure" or "never", defaults to "never"
+        :type restart_policy: str, optional
+        :return: Process launched
+        :rtype: subprocess.Popen
+        """
+        previous = self.processes.get(name)
+        if previous is not None and previous.is_alive():
+            self.stop(previous.pid)
+        supervised_process = SupervisedProcess(name, command, restart_policy)
+        self.start_process(supervised_process)
+        self.processes_lock.acquire()
+        try:
+            self.processes[name] = supervised_process
+        finally:
+            self.processes_lock.release()
+        return supervised_process.process
+
+    def start_process(self, supervised_process):
+        supervised_process.process = subprocess.Popen(supervised_process.command, start_new_session=True)
+        supervised_process.started_at = time.time()
+        thread = Thread(target=self.watch, args=(supervised_process, supervised_process.process))
+        thread.daemon = True
+        thread.start()
+
+    def watch(self, supervised_process, process):
+        """Watcher thread method. Waits for the process to exit and restarts it if it has to.
+
+        :param supervised_process: Handle of the process
+        :type supervised_process: SupervisedProcess
+        :param process: Process launched, the handle gets a new one on each restart
+        :type process: subprocess.Popen
+        """
+        returncode = process.wait()
+        set_channel_id(self.status_cache.channel_id)
+        try:
+            uptime = time.time() - supervised_process.started_at
+            gv.logger.warning("Process {} ({}) exited with code {} after {:.1f} s".format(
+                supervised_process.name, process.pid, returncode, uptime))
+            if not self.has_to_restart(supervised_process, returncode):
+                return
+            delay = self.get_restart_delay(supervised_process, uptime)
+            if delay > 0:
+                gv.logger.warning("Restarting {} in {} s".format(supervised_process.name, delay))
+                time.sleep(delay)
+                # May have been stopped or launched again meanwhile
+                if self.processes.get(supervised_process.name) is not supervised_process or \
+                        not self.has_to_restart(supervised_process, returncode):
+                    return
+            supervised_process.restart_requested = False
+            supervised_process.restarts += 1
+            self.start_process(supervised_process)
+            self.status_cache.update(probe_pid=supervised_process.pid)
+            gv.logger.warning("Process {} restarted with PID {}".format(supervised_process.name, supervised_process.pid))
+        except Exception as e:
+            gv.logger.error(e)
+            gv.logger.error(traceback.print_exc())
+
+    def has_to_restart(self, supervised_process, returncode):
+        if supervised_process.stopping:
+            return False
+        if not supervised_process.restart_requested:
+            if supervised_process.restart_policy == "never":
+                return False
+            if supervised_process.restart_policy == "on-failure" and returncode == 0:
+                return False
+        # Another worker may have stopped it, or launched a new one
+        current_status = self.status_cache.refresh()
+        return current_status is not None and current_status.probe_pid == supervised_process.pid and \
+            current_status.probe_status not in ["stopped", "killed"]
+
+    def get_restart_delay(self, supervised_process, uptime):
+        """Gets the seconds to wait before restarting a process.
+        0 if it was running steadily or if the restart was requested, doubled on each consecutive failure otherwise.
+
+        :param supervised_process: Handle of the process
+        :type supervised_process: SupervisedProcess
+        :param uptime: Seconds the process was running
+        :type uptime: float
+        :return: Seconds to wait
+        :rtype: float
+        """
+        if supervised_process.restart_requested:
+            return 0
+        if uptime >= cfg.probe_restart_reset_seconds:
+            supervised_process.failures = 0
+        supervised_process.failures += 1
+        if supervised_process.failures == 1:
+            return 0
+        return min(cfg.probe_restart_backoff * 2 ** (supervised_process.failures - 2), cfg.probe_restart_max_backoff)
+
+    def get_process(self, pid):
+        for supervised_process in list(self.processes.values()):
+            if supervised_process.pid == pid:
+                return supervised_process
+        return None
+
+    def owns(self, pid):
+        """Checks if a process was launched by this worker
+
+        :param pid: PID of the process
+        :type pid: int
+        :return: True if it was launched by this supervisor, else False
+        :rtype: boolean
+        """
+        return pid is not None and self.get_process(pid) is not None
+
+    def is_alive(self, pid):
+        """Checks if a probe is running without scanning the process table.
+        Processes of this worker are checked on their handle, other ones by PID and name, in case the PID was reused.
+
+        :param pid: PID of the probe
+        :type pid: int
+        :return: True if it is running, else False
+        :rtype: boolean
+        """
+        if pid is None:
+            return False
+        supervised_process = self.get_process(pid)
+        if supervised_process is not None:
+            return supervised_process.is_alive()
+        try:
+            process = psutil.Process(pid)
+            return process.status() != psutil.STATUS_ZOMBIE and cfg.process_name in process.name().lower()
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            return False
+
+    def stop(self, pid):
+        """Stops a probe with SIGTERM, and SIGKILL if it does not exit in cfg.probe_stop_timeout seconds.
+        Probes launched by this worker are not restarted after it.
+
+        :param pid: PID of the probe
+        :type pid: int
+        """
+        supervised_process = self.get_process(pid)
+        if supervised_process is not None:
+            supervised_process.stopping = True
+        self.signal_process(pid, signal.SIGTERM)
+        if not self.wait_process(pid, cfg.probe_stop_timeout):
+            gv.logger.warning("Process {} did not stop in {} s, killing it".format(pid, cfg.probe_stop_timeout))
+            self.signal_process(pid, signal.SIGKILL)
+            self.wait_process(pid, cfg.probe_stop_timeout)
+
+    def restart(self, pid):
+        """Kills a probe to restart it right away with the same command.
+        Probes launched by another worker are restarted by that worker, if their policy allows it.
+
+        :param pid: PID of the probe
+        :type pid: int
+        """
+        supervised_process = self.get_process(pid)
+        if supervised_process is not None:
+            supervised_process.restart_requested = True
+        self.signal_process(pid, signal.SIGKILL)
+
+    def signal_process(self, pid, signal_number):
+        if not self.is_alive(pid):
+            return
+        try:
+            # Probes lead their session, so their children get the signal too
+            os.killpg(pid, signal_number)
+        except (ProcessLookupError, PermissionError):
+            # Probe launched before having its own session
+            try:
+                os.kill(pid, signal_number)
+            except ProcessLookupError:
+                pass
+
+    def wait_process(self, pid, timeout):
+        supervised_process = self.get_process(pid)
+        try:
+            if supervised_process is not None:
+                supervised_process.process.wait(timeout)
+            elif self.is_alive(pid):
+                psutil.Process(pid).wait(timeout)
+        except (subprocess.TimeoutExpired, psutil.TimeoutExpired):
+            return False
+        except psutil.NoSuchProcess:
+            pass
+        return True
@@ -0,0 +1,195 @@
+import time
+import traceback
+import psutil
+from collections import deque
+from threading import Thread
+from gevent.lock import BoundedSemaphore
+
+from helper import config as cfg
+from helper import global_variables as gv
+from helper.channel_scope import set_channel_id
+
+MB_BYTES = 1048576
+# Resources sampled from the probe process
+RESOURCE_FIELDS = ["rss_mb", "cpu_percent", "open_files"]
+
+
+class ResourceMonitor:
+    """Background sampler of the resources used by the probe: memory (RSS), CPU and open files.
+
+    Samples are taken every cfg.resource_sample_interval seconds, out of the ingest path, and the last
+    cfg.resource_history_size are kept in memory with the trend (growth per minute) of each resource, which for
+    the memory is the leak rate. Memory breaches use hysteresis: a breach starts when RSS goes over
+    cfg.rss_threshold_mb and only ends when it goes below cfg.resource_release_ratio of it. A live probe is restarted
+    when a breach lasts cfg.resource_breach_seconds, by the worker that launched it, so single peaks do not restart it.
+
+    :param status_cache: Cache of the latest probe status
+    :type status_cache: managers.status_cache.StatusCache
+    :param probe_supervisor: Owner of the probe processes launched by this worker
+    :type probe_supervisor: managers.probe_supervisor.ProbeSupervisor
+    """
+
+    def __init__(self, status_cache, probe_supervisor):
+        """Constructor
+        """
+        self.thread = None
+        self.status_cache = status_cache
+        self.probe_supervisor = probe_supervisor
+        self.samples = deque(maxlen=cfg.resource_history_size)
+        self.samples_lock = BoundedSemaphore(1)
+        self.process = None
+        self.breach_since = None
+        self.restarts = 0
+
+    def start(self):
+        """
+        Starts a thread that calls run method
+        """
+        gv.logger.info("Resource monitor thread started")
+        thread = Thread(target=self.run, args=())
+        thread.daemon = True
+        self.thread = thread
+        thread.start()
+
+    def run(self):
+        """Thread run method
+        """
+        while gv.api_dm is None:
+            time.sleep(1)
+        set_channel_id(self.status_cache.channel_id)
+        while True:
+            try:
+                sample = self.sample_probe()
+                if sample is not None:
+                    self.check_memory_breach(sample)
+            except Exception as e:
+                gv.logger.error(e)
+                gv.logger.error(traceback.print_exc())
+            time.sleep(cfg.resource_sample_interval)
+
+    def sample_probe(self):
+        """Samples the resources of the current probe and adds them to the series
+
+        :return: Sample taken, None if there is no probe running
+        :rtype: dict
+        """
+        current_status = self.status_cache.status
+        if current_status is None or current_status.probe_pid is None or \
+                not self.probe_supervisor.is_alive(current_status.probe_pid):
+            self.process = None
+            self.breach_since = None
+            return None
+        if self.process is None or self.process.pid != current_status.probe_pid:
+            # New probe, its series starts again
+            self.process = psutil.Process(current_status.probe_pid)
+            self.process.cpu_percent(None)
+            self.breach_since = None
+            self.samples_lock.acquire()
+            try:
+                self.samples.clear()
+            finally:
+                self.samples_lock.release()
+        try:
+            with self.process.oneshot():
+                sample = {
+                    "time": time.time(),
+                    "pid": self.process.pid,
+                    "rss_mb": float(self.process.memory_info().rss) / MB_BYTES,
+                    "cpu_percent": self.process.cpu_percent(None),
+                    "open_files": self.process.num_fds()
+                }
+        except (psutil.NoSuchProcess, psutil.ZombieProcess):
+            self.process = None
+            return None
+        self.samples_lock.acquire()
+        try:
+            self.samples.append(sample)
+        finally:
+            self.samples_lock.release()
+        return sample
+
+    def check_memory_breach(self, sample):
+        """Restarts the live probe if its memory has been over cfg.rss_threshold_mb for cfg.resource_breach_seconds
+
+        :param sample: Last sample of the probe
+        :type sample: dict
+        """
+        if self.breach_since is None:
+            if sample["rss_mb"] > cfg.rss_threshold_mb:
+                self.breach_since = sample["time"]
+                gv.logger.warning("Videomos probe exceeded memory limitation: {:.0f} MB, growing {:.1f} MB/min".format(
+                    sample["rss_mb"], self.get_trend("rss_mb")))
+            return
+        if sample["rss_mb"] < cfg.rss_threshold_mb * cfg.resource_release_ratio:
+            gv.logger.warning("Videomos probe memory back to {:.0f} MB".format(sample["rss_mb"]))
+            self.breach_since = None
+            return
+        breach_seconds = sample["time"] - self.breach_since
+        # Another worker restarts the probes it launched, this one only takes over if it does not
+        if not self.probe_supervisor.owns(sample["pid"]):
+            breach_seconds -= cfg.probe_orphan_timeout
+        current_status = self.status_cache.status
+        if breach_seconds >= cfg.resource_breach_seconds and current_status.content_type == "live":
+            gv.logger.warning("Videomos probe over memory limitation for {:.0f} s, restarting it".format(
+                sample["time"] - self.breach_since))
+            self.breach_since = None
+            self.restarts += 1
+            self.probe_supervisor.restart(sample["pid"])
+
+    def get_trend(self, field, samples=None):
+        """Gets the growth per minute of a resource in the last cfg.resource_trend_seconds, by least squares
+
+        :param field: Resource of the samples: rss_mb, cpu_percent or open_files
+        :type field: str
+        :param samples: Samples to use, defaults to the series of the current probe
+        :type samples: list[dict], optional
+        :return: Growth per minute, 0 if there are not enough samples
+        :rtype: float
+        """
+        if samples is None:
+            samples = self.get_samples()
+        if len(samples) == 0:
+            return 0.0
+        samples = [sample for sample in samples if sample["time"] >= samples[-1]["time"] - cfg.resource_trend_seconds]
+        if len(samples) < 2:
+            return 0.0
+        mean_time = sum(sample["time"] for sample in samples) / len(samples)
+        mean_value = sum(sample[field] for sample in samples) / len(samples)
+        covariance = sum((sample["time"] - mean_time) * (sample[field] - mean_value) for sample in samples)
+        variance = sum((sample["time"] - mean_time) ** 2 for sample in samples)
+        return covariance / variance * 60 if variance > 0 else 0.0
+
+    def get_samples(self):
+        self.samples_lock.acquire()
+        try:
+            samples = list(self.samples)
+        finally:
+            self.samples_lock.release()
+        return samples
+
+    def get_stats(self, seconds=None):
+        """Gets the series of samples of the current probe, with the trends and the memory breach
+
+        :param seconds: Only the samples of the last seconds, defaults to every sample kept
+        :type seconds: float, optional
+        :return: Samples, trends per minute, breach and restarts
+        :rtype: dict
+        """
+        samples = self.get_samples()
+        trends = {field: self.get_trend(field, samples) for field in RESOURCE_FIELDS}
+        if seconds is not None and len(samples) > 0:
+            samples = [sample for sample in samples if sample["time"] >= samples[-1]["time"] - seconds]
+        minutes_to_threshold = None
+        if len(samples) > 0 and trends["rss_mb"] > 0 and self.breach_since is None:
+            minutes_to_threshold = (cfg.rss_threshold_mb - samples[-1]["rss_mb"]) / trends["rss_mb"]
+        return {
+            "pid": samples[-1]["pid"] if len(samples) > 0 else None,
+            "interval": cfg.resource_sample_interval,
+            "samples": samples,
+            "trends": trends,
+            "rss_threshold_mb": cfg.rss_threshold_mb,
+            "rss_release_mb": cfg.rss_threshold_mb * cfg.resource_release_ratio,
+            "minutes_to_threshold": minutes_to_threshold,
+            "breach_since": self.breach_since,
+            "restarts": self.restarts
+        }
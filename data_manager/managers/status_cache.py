@@ -0,0 +1,105 @@
+import time
+import pytz
+from datetime import datetime
+from gevent.lock import BoundedSemaphore
+
+from helper import config as cfg
+from db_models import StatusData
+
+
+class StatusCache:
+    """In-process cache of the latest StatusData document.
+
+    Every measure ingested reads the current status several times (journey, program, alerts, probe status...).
+    This object keeps the latest StatusData in memory so those reads become attribute lookups.
+    Writes are applied to MongoDB and to the cached object at the same time (write-through).
+    The cached object is reloaded after ``ttl`` seconds, so changes made by other workers are seen quickly.
+
+    :param ttl: Seconds before the cached status is reloaded from MongoDB, defaults to cfg.status_cache_ttl
+    :type ttl: float, optional
+    :param channel_id: Channel of the probe, defaults to None (default channel)
+    :type channel_id: str, optional
+    """
+
+    def __init__(self, ttl=cfg.status_cache_ttl, channel_id=None):
+        """Constructor
+        """
+        self.ttl = ttl
+        self.channel_id = channel_id
+        self.status_lock = BoundedSemaphore(1)
+        self._status = None
+        self._loaded_at = None
+
+    @property
+    def status(self):
+        """Latest StatusData getter. Loads it from MongoDB if the cached one has expired.
+
+        :return: Latest status of the probe, None if there is no status in DB
+        :rtype: db_models.StatusData
+        """
+        self.status_lock.acquire()
+        try:
+            if self.is_expired():
+                self.load_status()
+            value = self._status
+        finally:
+            self.status_lock.release()
+        return value
+
+    def is_expired(self):
+        if self._loaded_at is None:
+            return True
+        return (time.time() - self._loaded_at) > self.ttl
+
+    def load_status(self):
+        self._status = StatusData.objects(channel_id=self.channel_id).order_by('-id').first()
+        self._loaded_at = time.time()
+
+    def refresh(self):
+        """Forces a reload of the latest status from MongoDB
+
+        :return: Latest status of the probe, None if there is no status in DB
+        :rtype: db_models.StatusData
+        """
+        self.invalidate()
+        return self.status
+
+    def invalidate(self):
+        """Drops the cached status. Must be called whenever a new StatusData document is saved.
+        """
+        self.status_lock.acquire()
+        try:
+            self._status = None
+            self._loaded_at = None
+        finally:
+            self.status_lock.release()
+
+    def update(self, **fields):
+        """Updates the latest status both in MongoDB and in the cached object
+
+        :return: True if there was a status to update, else False
+        :rtype: boolean
+        """
+        current_status = self.status
+        if current_status is None:
+            return False
+        self.status_lock.acquire()
+        try:
+            current_status.update(**fields)
+            for field, value in fields.items():
+                setattr(current_status, field, self.to_db_value(value))
+            current_status._clear_changed_fields()
+        finally:
+            self.status_lock.release()
+        return True
+
+    @staticmethod
+    def to_db_value(value):
+        """Mimics the value MongoDB returns for a field, so cached and reloaded values compare the same.
+        Datetimes are stored as naive UTC with millisecond precision.
+        """
+        if isinstance(value, datetime):
+            if value.tzinfo is not None:
+                value = value.astimezone(pytz.utc).replace(tzinfo=None)
+            value = value.replace(microsecond=(value.microsecond // 1000) * 1000)
+        return value
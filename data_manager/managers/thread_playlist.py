@@ -2,32 +2,14 @@ from threading import Thread, Lock, Event
 import time
 import psutil
 import pytz
-import subprocess
 from datetime import datetime
 from os import getenv
-from mongoengine import connect
 from helper import global_variables as gv
 from helper import config as cfg
+from helper.channel_scope import set_channel_id
+from managers.db_connection import get_db_client
 from db_models import StatusData
 
-class SubprocessWait( object ):
-    """Special subprocess class that waits until is finished when executed
-        
-    :param command_text_list: Command to run as a list 
-    :type command_text_list: List of strings
-    """
-    def __init__( self, command_text_list ):
-        """Constructor
-        """
-        self.command_text_list = command_text_list
-    
-    def execute(self):
-        """Runs the command defined on initialization and wait until it is finished.
-        """
-        self.process = subprocess.Popen(self.command_text_list)
-        self.process.wait()
-
-
 class PlaylistPlayer:
     """
     This class represents a Playlist mode custom handler.
@@ -37,19 +19,26 @@ class PlaylistPlayer:
     :type playlist: list, optional
     :param mode: VideoQualityProbe mode to use in playlist analysis, defaults to "complete"
     :type mode: str, optional
+    :param status_cache: Cache of the latest probe status, defaults to None
+    :type status_cache: managers.status_cache.StatusCache, optional
+    :param probe_supervisor: Owner of the probe processes launched by this worker, defaults to None
+    :type probe_supervisor: managers.probe_supervisor.ProbeSupervisor, optional
     """
 
-    def __init__(self, playlist=[], mode="complete"):
+    def __init__(self, playlist=[], mode="complete", status_cache=None, probe_supervisor=None):
         """Constructor
         """
         self.playlist = playlist
         self.mode = mode
+        self.status_cache = status_cache
+        self.probe_supervisor = probe_supervisor
         self.index = 0
         self.video_command = ""
         self.thread = None
         self.journey_datetime_lock = Lock()
         self.journey_datetime = None
-        connect(cfg.db_name, host=cfg.host, port=int(cfg.db_port))
+        # Documents use the client shared by every manager
+        get_db_client()
 
     @property
     def journey_datetime(self):
@@ -103,6 +92,7 @@ class PlaylistPlayer:
         Waits for each process to be finished before processing next video.
         Stores data in MongoDB.
         """
+        set_channel_id(self.status_cache.channel_id)
         for index, playlist_line in enumerate(self.playlist):
             gv.logger.info("New video")
             self.index = index
@@ -111,8 +101,12 @@ class PlaylistPlayer:
             if gv.api_dm.probe_status == "killed":
                 gv.logger.info("Exiting playlist")
                 break
-            self.launch_video_process()
+            returncode = self.launch_video_process()
             gv.logger.info("Finished video")
+            # Stopped by a signal
+            if returncode < 0:
+                gv.logger.info("Exiting playlist")
+                break
         self.finish_playlist()
 
     def launch_video_process(self):
@@ -126,17 +120,20 @@ class PlaylistPlayer:
             "-s", cfg.probe_measure_seconds,
             "-u", "http://localhost:{}".format(getenv("API_PORT"))
             ]
-        subprocess_wait = SubprocessWait(command_text)
-        self.update_status()
-        subprocess_wait.execute()
+        process = self.probe_supervisor.launch("probe", command_text, restart_policy=cfg.probe_restart_policy["playlist"])
+        self.update_status(process.pid)
+        returncode = process.wait()
         gv.logger.info(f"Finished video {self.video_command[0]} ({self.index+1}/{len(self.playlist)})")
+        return returncode
 
-    def update_status(self):
+    def update_status(self, probe_pid):
         # Journey datetime set by first video
         if self.index == 0:
             self.journey_datetime = datetime.utcnow().replace(microsecond=0)
         status_data = StatusData(**{
+            "channel_id": self.status_cache.channel_id,
             "url": self.video_command[0],
+            "probe_pid": probe_pid,
             "start_datetime": datetime.utcnow(),
             "mode": self.mode,
             "probe_status": "idle",
@@ -146,14 +143,12 @@ class PlaylistPlayer:
             "content_type": "playlist"
         })
         status_data.save()
-        status_data.reload()
+        self.status_cache.invalidate()
 
     def finish_playlist(self):
         # Set status to stopped
-        last_status = StatusData.objects.order_by('-id').first()
-        last_status.update(probe_status="stopped")
-        last_status.save()
-        last_status.reload()
+        self.status_cache.refresh()
+        self.status_cache.update(probe_status="stopped")
         gv.logger.info("Playlist has finished")
         self.index = 0
         self.video_command = ""
\ No newline at end of file
@@ -42,6 +42,39 @@ class VideoQualityPredManager:
             gv.logger.error(e)
         return response
 
+    def post_api_mos_analyzer_batch(self, bodies, headers):
+        """
+        Sends a batch of measures to Video Quality Analysis module and obtains their predictions.
+        Falls back to one request per measure if the batch endpoint is not available.
+        
+        :param bodies: Measures from the probe
+        :type bodies: list[str] or list[dict]
+        :return: Prediction of each measure, in the same order. None for measures without prediction
+        :rtype: list[dict]
+        """
+        predictions = None
+        try:
+            api_endpoint = f"http://{cfg.ai_host}:{cfg.ai_port}/VideoQA/predict/{cfg.predict_strategy}/batch"
+            data = [ast.literal_eval(body) if isinstance(body, str) else body for body in bodies]
+            response = requests.post(url=api_endpoint, data=json.dumps(data), headers=headers)
+            if response.status_code == 200:
+                predictions = response.json()
+                if len(predictions) != len(bodies):
+                    gv.logger.warning("Batch prediction size mismatch, predicting measures one by one")
+                    predictions = None
+        except Exception as e:
+            gv.logger.error(e)
+        if predictions is None:
+            predictions = [self.get_single_prediction(body, headers) for body in bodies]
+        return predictions
+
+    def get_single_prediction(self, body, headers):
+        prediction = None
+        response = self.post_api_mos_analyzer(body, headers)
+        if response is not None and response.status_code == 200:
+            prediction = response.text
+        return prediction
+
     def prepare_data_to_db(self, data_content_input, data_content_output, headers=None):
         """
         Preprocesses documents from Video Quality Probe to be inserted into the database
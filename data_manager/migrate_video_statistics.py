@@ -0,0 +1,69 @@
+import argparse
+import time
+from pymongo import UpdateOne
+
+from helper import config as cfg
+from helper import global_variables as gv
+from helper.custom_log import init_logger
+from managers.db_connection import get_db_client
+from db_models.video_analysis import VIDEO_STATISTICS_LAYOUTS, VIDEO_STATISTICS_VERSION, \
+    pack_video_statistics, unpack_video_statistics
+
+
+def migrate(collection, compact, batch_size):
+    """Rewrites the VideoSettings statistics of the stored measures in the compact or the named layout.
+    Documents already in the requested layout are skipped, so it can be stopped and run again.
+
+    :param collection: video_analysis collection
+    :type collection: pymongo.collection.Collection
+    :param compact: Packs the statistics if True, unpacks them if False
+    :type compact: bool
+    :param batch_size: Documents rewritten by each bulk write
+    :type batch_size: int
+    :return: Number of documents rewritten
+    :rtype: int
+    """
+    statistic_fields = [f"videoSettings.{statistic}" for statistic in VIDEO_STATISTICS_LAYOUTS[VIDEO_STATISTICS_VERSION]]
+    query = {"videoSettings.stats": {"$exists": not compact}, "videoSettings": {"$type": "object"}}
+    projection = ["videoSettings.stats", "videoSettings.stats_version"] + statistic_fields
+    migrated = 0
+    operations = []
+    for document in collection.find(query, projection).batch_size(batch_size):
+        video_settings = document["videoSettings"]
+        if compact:
+            pack_video_statistics(video_settings)
+            update = {
+                "$set": {
+                    "videoSettings.stats": video_settings["stats"],
+                    "videoSettings.stats_version": video_settings["stats_version"]
+                },
+                "$unset": {field: "" for field in statistic_fields}
+            }
+        else:
+            unpack_video_statistics(video_settings)
+            update = {"$unset": {"videoSettings.stats": "", "videoSettings.stats_version": ""}}
+            if len(video_settings) > 0:
+                update["$set"] = {f"videoSettings.{statistic}": value for statistic, value in video_settings.items()}
+        operations.append(UpdateOne({"_id": document["_id"]}, update))
+        if len(operations) >= batch_size:
+            migrated += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+            print(f"{migrated} documents migrated")
+    if len(operations) > 0:
+        migrated += collection.bulk_write(operations, ordered=False).modified_count
+    return migrated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrates the VideoSettings statistics of the stored measures")
+    layout = parser.add_mutually_exclusive_group(required=True)
+    layout.add_argument("--compact", action="store_true", help="Packs the statistics in a binary vector")
+    layout.add_argument("--expand", action="store_true", help="Restores the statistics as named fields")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Documents rewritten by each bulk write")
+    args = parser.parse_args()
+
+    gv.logger = init_logger(__name__, log_level=cfg.log_level)
+    video_analysis_collection = get_db_client()[cfg.db_name].video_analysis
+    start_time = time.time()
+    migrated_documents = migrate(video_analysis_collection, args.compact, args.batch_size)
+    print(f"{migrated_documents} documents migrated in {time.time() - start_time:.2f} s")
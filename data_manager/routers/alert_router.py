@@ -21,20 +21,29 @@ class AlertRouter:
         """
         self.alert_manager = alert_manager
     
-    def get_alert_warning_list(self, journey_datetime=None, program_name=None):
+    def get_alert_warning_list(self, journey_datetime=None, program_name=None, limit=None, cursor=None):
         """Gets the list of alerts and warnings from a specific journey datetime and program name
         
         :param journey_datetime: Datetime of journey, defaults to None
         :type journey_datetime: datetime.datetime, optional
         :param program_name: Name of program, defaults to None
         :type program_name: str, optional
+        :param limit: Maximum number of alerts and of warnings per page, defaults to None
+        :type limit: int, optional
+        :param cursor: Cursor of the page, from next_cursor of the previous one, defaults to None
+        :type cursor: str, optional
+        :raises ValueError: Malformed cursor
         :return: lists of alerts and warnings as a dict
         :rtype: dict
         """
         alert_dict = {}
 
         try:
-            alert_dict = self.alert_manager.get_alert_warning_list(journey_datetime=journey_datetime, program_name=str(program_name))
+            alert_dict = self.alert_manager.get_alert_warning_list(
+                journey_datetime=journey_datetime, program_name=str(program_name), limit=limit, cursor=cursor)
+        except ValueError:
+            # Returned as a bad request
+            raise
         except Exception as e:
             gv.logger.error(e)
         return alert_dict
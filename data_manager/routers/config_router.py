@@ -9,6 +9,7 @@ import json
 from helper import global_variables as gv
 from helper import config as cfg
 from helper import utils
+from db_models import ProbeConfig
 
 class ConfigRouter:
     """A class that represents the router in charge of handling DataManager API Probe/config Blueprint methods
@@ -57,6 +58,10 @@ class ConfigRouter:
             config_data = config_json
         else:
             raise Exception(f"Config json input has invalid data type {type(config_json)}. Must be JSON (str) or dict")
+        config_keys = {key.lower(): key for key in config_data.keys()}
+        self.config_manager.check_source_channel(
+            config_data.get(config_keys.get("url"), ProbeConfig.url.default),
+            config_data.get(config_keys.get("program_number")))
         self.config_manager.put_config(config_data)
     
 
@@ -6,11 +6,11 @@ Created on 17 mar. 2020
 import traceback
 import time
 import json
+from queue import Full
 
 from helper import config as cfg
 from helper import global_variables as gv
 from helper import utils
-from managers.memory_emergency_manager import MemoryEmergencyManager
 
 
 class DocumentRouter:
@@ -20,16 +20,21 @@ class DocumentRouter:
     :type document_manager: managers.db_managers.DocumentDbManager
     :param videoqualitypred_manager: Manager in charge of handling requests to the Video Quality Analysis AI Module
     :type videoqualitypred_manager: managers.VideoQualityPredManager
+    :param ingest_pipeline: Asynchronous pipeline that processes the measures when cfg.ingest_pipeline_enabled
+    :type ingest_pipeline: managers.ingest_pipeline.IngestPipeline
+    :param live_feed: Push feed of measures, status changes and alerts
+    :type live_feed: managers.live_feed.LiveFeed
     """
     
-    def __init__(self, document_manager, videoqualitypred_manager):
+    def __init__(self, document_manager, videoqualitypred_manager, ingest_pipeline, live_feed):
         """Constructor
         
         """
         self.document_manager = document_manager
         self.videoqualitypred_manager = videoqualitypred_manager
+        self.ingest_pipeline = ingest_pipeline
+        self.live_feed = live_feed
         self.input_document = None
-        self.memory_emergency_manager = MemoryEmergencyManager()
         
         
     def bulk_document_to_db(self, input_document, headers):
@@ -46,6 +51,8 @@ class DocumentRouter:
         :rtype: dict
         """
         task = cfg.bulk_data_task
+        if cfg.ingest_pipeline_enabled:
+            return self.accept_documents([json.loads(input_document)], headers, task)
         document = None
         status = 200
         try:
@@ -67,7 +74,6 @@ class DocumentRouter:
                 status = 404
             gv.api_dm.last_document_time = time.time()
             response = utils.build_output(task=task, status=status, message=cfg.success_msg, output={"document ID": str(doc_id)})
-            MemoryEmergencyManager.check_memory_status()
         except Exception as e:
             status = 500
             gv.logger.error(e)
@@ -75,10 +81,118 @@ class DocumentRouter:
             response = utils.build_output(task=task, status=500, message=str(e), output={})
         return response, status
 
+    def batch_documents_to_db(self, input_documents, headers):
+        """Insert a batch of documents from VideoQualityProbe into the database.
+        Predictions are requested to VideoQA in a single call and the documents are written with a single insert.
+        
+        API Endpoint: '/videoAnalysis/documents/batch', methods=['POST']
+
+        :param input_documents: Documents from the request, in the order they were measured
+        :type input_documents: list[dict]
+        :param headers: Headers at the request
+        :type headers: dict
+        :return: Response of the method
+        :rtype: dict
+        """
+        task = cfg.batch_data_task
+        status = 200
+        try:
+            if len(input_documents) > cfg.max_batch_documents:
+                status = 413
+                message = f"Batch exceeds the maximum of {cfg.max_batch_documents} documents"
+                return utils.build_output(task=task, status=status, message=message, output={}), status
+            if cfg.ingest_pipeline_enabled:
+                return self.accept_documents(input_documents, headers, task)
+            input_documents = [self.get_document_with_confidence_interval(document) for document in input_documents]
+            predictions = self.videoqualitypred_manager.post_api_mos_analyzer_batch(input_documents, headers)
+            documents = [
+                self.videoqualitypred_manager.prepare_data_to_db(
+                    data_content_input=input_document,
+                    data_content_output=prediction,
+                    headers=headers
+                )
+                for input_document, prediction in zip(input_documents, predictions) if prediction is not None
+            ]
+            # Write to MongoDB
+            doc_ids = []
+            if len(documents) > 0:
+                doc_ids = self.document_manager.insert_video_analysis_documents(documents=documents)
+                if gv.api_dm.probe_status in ["stopped", "idle", "error"]:
+                    gv.api_dm.probe_status = "running"
+                gv.api_dm.last_document_time = time.time()
+            if len(doc_ids) == 0:
+                status = 404
+            response = utils.build_output(task=task, status=status, message=cfg.success_msg, output={
+                "document IDs": doc_ids, "rejected": len(input_documents) - len(doc_ids)})
+        except Exception as e:
+            status = 500
+            gv.logger.error(e)
+            gv.logger.error(traceback.print_exc())
+            response = utils.build_output(task=task, status=500, message=str(e), output={})
+        return response, status
+
+    def accept_documents(self, input_documents, headers, task):
+        """Queues documents from VideoQualityProbe in the ingest pipeline and returns without waiting for them
+
+        :param input_documents: Documents from the request, in the order they were measured
+        :type input_documents: list[dict]
+        :param headers: Headers at the request
+        :type headers: dict
+        :param task: Task reported in the response
+        :type task: str
+        :return: Response of the method, 503 if the pipeline is full
+        :rtype: dict
+        """
+        status = 200
+        try:
+            input_documents = [self.get_document_with_confidence_interval(document) for document in input_documents]
+            doc_ids = self.ingest_pipeline.accept(input_documents, headers)
+            if gv.api_dm.probe_status in ["stopped", "idle", "error"]:
+                gv.api_dm.probe_status = "running"
+            gv.api_dm.last_document_time = time.time()
+            output = {"document IDs": doc_ids}
+            if task == cfg.bulk_data_task:
+                output = {"document ID": doc_ids[0]}
+            response = utils.build_output(task=task, status=status, message=cfg.success_msg, output=output)
+        except Full:
+            status = 503
+            gv.logger.warning("Ingest pipeline is full, rejecting documents")
+            response = utils.build_output(task=task, status=status, message="Ingest pipeline is full", output={})
+        except Exception as e:
+            status = 500
+            gv.logger.error(e)
+            gv.logger.error(traceback.print_exc())
+            response = utils.build_output(task=task, status=500, message=str(e), output={})
+        return response, status
+
+    def get_ingest_stats(self):
+        """Gets queue depth and latency of each stage of the ingest pipeline
+
+        API Endpoint: '/videoAnalysis/documents/pipeline', methods=['GET']
+
+        :return: Stats of each stage
+        :rtype: dict
+        """
+        return self.ingest_pipeline.get_stats()
+
+    def get_live_feed(self, last_event_id=None):
+        """Gets the stream of new measures, status changes and alerts as server-sent events
+
+        API Endpoint: '/videoAnalysis/documents/live', methods=['GET']
+
+        :param last_event_id: Id of the last event received, from Last-Event-ID header, defaults to None
+        :type last_event_id: str, optional
+        :return: Generator of server-sent event messages
+        :rtype: generator
+        """
+        return self.live_feed.subscribe(last_event_id, self.document_manager.channel_id)
+
     def add_confidence_interval(self):
-        input_document_dict = json.loads(self.input_document)
+        self.input_document = json.dumps(self.get_document_with_confidence_interval(json.loads(self.input_document)))
+
+    def get_document_with_confidence_interval(self, input_document_dict):
         input_document_dict.update({"confidence_intervals": cfg.confidence_percentage})
-        self.input_document = json.dumps(input_document_dict)
+        return input_document_dict
     
     def get_document_by_id(self, id):
         """Gets a document (measure) from the DB
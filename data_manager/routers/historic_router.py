@@ -4,12 +4,26 @@ Created on 17 mar. 2020
 @author: victor
 '''
 import traceback
-from itertools import starmap
 from pyrfc3339 import parse
 from helper import global_variables as gv
 from helper import config as cfg
 from helper import utils
 from managers import FileManager
+from managers.db_managers.mos_calculator import INIT_MOS_CATEGORIES
+
+# Fields of the historic summary taken from the first document of the search
+HISTORIC_FIRST_VALUE_FIELDS = [
+    "videoSettings.width", "videoSettings.height", "videoSettings.frame_rate", "videoSettings.pix_format",
+    "videoSettings.scan_type", "videoSettings.codec", "videoSRC.url", "mode"
+]
+# Fields of the historic summary averaged over the search
+HISTORIC_AVERAGE_FIELDS = [
+    "mosAnalysis.mos", "videoSettings.spat_inf_avg", "videoSettings.temp_inf_avg", "videoSettings.bitrate"
+]
+# Fields of each point of the historic graph
+HISTORIC_GRAPH_FIELDS = ["timestamp", "videoSettings.video_second", "mosAnalysis.mos", "videoSettings.pts", "inserted_at"]
+# Downsampling modes of the historic graph
+HISTORIC_GRAPH_DOWNSAMPLING = ["bucket", "lttb"]
 
 class HistoricRouter:
     """A class that represents the router in charge of handling DataManager API Historic Blueprint methods
@@ -22,17 +36,19 @@ class HistoricRouter:
     :type alert_db_manager: managers.db_managers.ConfigDbManager
     :param mos_calculator: Manager in charge of handling operations with MOS in MongoDB
     :type mos_calculator: managers.db_managers.MosCalculator
+    :param export_cache: Cache of the files exported from searches, defaults to None
+    :type export_cache: managers.export_cache.ExportCache, optional
     """
     
-    def __init__(self, historic_db_manager, journey_db_manager, alert_db_manager, mos_calculator):
+    def __init__(self, historic_db_manager, journey_db_manager, alert_db_manager, mos_calculator, export_cache=None):
         """Constructor
         """
         self.historic_db_manager = historic_db_manager
         self.journey_db_manager = journey_db_manager
         self.alert_db_manager = alert_db_manager
         self.mos_calculator = mos_calculator
+        self.export_cache = export_cache
         self.file_manager = FileManager()
-        self.search_data = {}
 
     def get_historic_search(self, search_data):
         """Gets the historic data from a specific search using provided data
@@ -51,16 +67,15 @@ class HistoricRouter:
         try:
             alert_list = []
             response = {}
-            self.search_data = search_data
             if search_data.get("init_datetime") is not None:
                 init_datetime = parse(search_data.get("init_datetime"))
                 end_datetime = parse(search_data.get("end_datetime"))
-                videoanalysis_queryset = self.historic_db_manager.search(
+                videoanalysis_queryset, raw_search_query, search_tier = self.historic_db_manager.search(
                     search_type="time", search_data=search_data)
                 alert_list = self.alert_db_manager.get_alert_warning_list_by_datetime(
                     init_datetime=init_datetime, end_datetime=end_datetime)
             elif search_data.get("journey_datetime") is not None:
-                videoanalysis_queryset = self.historic_db_manager.search(
+                videoanalysis_queryset, raw_search_query, search_tier = self.historic_db_manager.search(
                     search_type="journey", search_data=search_data)
                 # If includes program for searching or doesn't
                 if search_data.get("program_name") is not None:
@@ -72,7 +87,8 @@ class HistoricRouter:
                     alert_list = self.alert_db_manager.get_alert_warning_list(
                         journey_datetime=parse(search_data.get("journey_datetime"))
                     )
-            response = self.get_historic_videoanalysis_data(videoanalysis_queryset, alert_list)
+            response = self.get_historic_videoanalysis_data(videoanalysis_queryset, alert_list,
+                                                            search_data, raw_search_query, search_tier)
         except Exception as e:
             gv.logger.error(e)
             gv.logger.error(traceback.print_exc())
@@ -94,104 +110,357 @@ class HistoricRouter:
         :return: Url to get the file resultant from search
         :rtype: str
         """
-        documents = None
         file_url = ""
-        alert_list = []
         try:
-            self.search_data = search_data
-            # Datetime interval search
-            if search_data.get("init_datetime") is not None:
-                init_datetime = parse(search_data.get("init_datetime"))
-                end_datetime = parse(search_data.get("end_datetime"))
-                documents = self.historic_db_manager.search(
-                    search_type="time", search_data=search_data)
-                alert_list = self.alert_db_manager.get_alert_warning_list_by_datetime(
-                    init_datetime=init_datetime, end_datetime=end_datetime)
-            # Journey search
-            elif search_data.get("journey_datetime") is not None:
-                documents = self.historic_db_manager.search(
-                    search_type="journey", search_data=search_data)
-                alert_list = self.alert_db_manager.get_alert_warning_list(
-                    journey_datetime=parse(search_data.get("journey_datetime")) )
-            filetype = search_data.get("type").lower()
-            self.file_manager = FileManager(documents, alert_list, search_data, filetype)
-            for cfg_type in cfg.historic_filetypes_allowed:
-                if filetype == cfg_type:
-                    file_url = self.file_manager.generate_search_file()
-                    break
-            if file_url == "":
-                raise AttributeError(f"File extension {filetype} is not valid for this method. Try json or csv")
+            self.file_manager = self.get_search_file_manager(search_data)
+            file_url = self.file_manager.generate_search_file()
         except Exception as e:
             gv.logger.error(e)
             gv.logger.error(traceback.print_exc())
         server_file_url = f"files/{file_url}"
         return server_file_url
 
+    def get_historic_search_stream(self, search_data):
+        """Streams the file of a historic search by using the specified data, in chunks, without storing it in server.
+
+        API Endpoint: '/videoAnalysis/search/url', methods=['POST'], with "stream" in search_data
+        
+        :param search_data: Data to perform search, same as get_historic_search_url
+        :type search_data: dict
+        :raises AttributeError: File extension is not valid
+        :return: Filename, mimetype and generator of the file content
+        :rtype: tuple(str, str, generator)
+        """
+        file_manager = self.get_search_file_manager(search_data)
+        filename, file_chunks = file_manager.stream_search_file()
+        mimetype = "text/csv" if file_manager.filetype == "csv" else "application/json"
+        return filename, mimetype, file_chunks
+
+    def get_search_file_manager(self, search_data):
+        """Performs the search and returns the FileManager that writes its file
+        
+        :param search_data: Data to perform search
+        :type search_data: dict
+        :raises AttributeError: File extension is not valid
+        :return: FileManager with the documents and alerts of the search
+        :rtype: managers.FileManager
+        """
+        documents = None
+        alert_list = []
+        filetype = str(search_data.get("type")).lower()
+        if filetype not in cfg.historic_filetypes_allowed:
+            raise AttributeError(f"File extension {filetype} is not valid for this method. Try json or csv")
+        # Datetime interval search
+        if search_data.get("init_datetime") is not None:
+            init_datetime = parse(search_data.get("init_datetime"))
+            end_datetime = parse(search_data.get("end_datetime"))
+            # Files have every measure
+            documents, _, _ = self.historic_db_manager.search(
+                search_type="time", search_data=search_data, use_rollups=False)
+            alert_list = self.alert_db_manager.get_alert_warning_list_by_datetime(
+                init_datetime=init_datetime, end_datetime=end_datetime)
+        # Journey search
+        elif search_data.get("journey_datetime") is not None:
+            documents, _, _ = self.historic_db_manager.search(
+                search_type="journey", search_data=search_data, use_rollups=False)
+            alert_list = self.alert_db_manager.get_alert_warning_list(
+                journey_datetime=parse(search_data.get("journey_datetime")) )
+        return FileManager(documents, alert_list or {}, search_data, filetype, self.export_cache)
+
 
-    def get_historic_videoanalysis_data(self, videoanalysis_queryset, alert_list):
-        """Gets the historic data format from the videoanalysis_queryset obtained by a search process
+    def get_historic_videoanalysis_data(self, videoanalysis_queryset, alert_list, search_data, raw_search_query,
+                                        search_tier):
+        """Gets the historic data format from the videoanalysis_queryset obtained by a search process.
+        Summary and graph data are obtained together in a single pass over the documents of the search.
         
-        :param videoanalysis_queryset: List of videoanalysis_queryset from search process
+        :param videoanalysis_queryset: List of videoanalysis_queryset from search process, 
+        of rollups if the search tier is not raw
         :type videoanalysis_queryset: list[dict]
         :param alert_list: List of alerts from search process
         :type alert_list: list[dict]
+        :param search_data: Data of the search
+        :type search_data: dict
+        :param raw_search_query: Query of the search over the measures, as returned by the search
+        :type raw_search_query: dict
+        :param search_tier: Tier of the search, as returned by the search
+        :type search_tier: str
         :return: Historic data from search process
         :rtype: dict
         """
+        historic_data = {}
         try:
-            if videoanalysis_queryset.count() == 0:
+            graph_options = self.get_graph_options(search_data)
+            if search_tier == "raw":
+                summary = self.get_historic_summary(videoanalysis_queryset, graph_options)
+            else:
+                summary = self.get_historic_rollup_summary(videoanalysis_queryset, graph_options)
+            if summary["count"] == 0:
                 raise AttributeError("No documents in search")
-            width = videoanalysis_queryset.distinct("videoSettings.width")[0]
-            height = videoanalysis_queryset.distinct("videoSettings.height")[0]
-            frame_rate = videoanalysis_queryset.distinct("videoSettings.frame_rate")[0]
-            historic_data = {}
+            first_values = summary["first_values"]
             historic_data["color_space"] = "RGB"
-            historic_data["pixel_format"] = videoanalysis_queryset.distinct("videoSettings.pix_format")[0]
-            historic_data["scan_type"] = videoanalysis_queryset.distinct("videoSettings.scan_type")[0]
-            historic_data["video_codec"] = videoanalysis_queryset.distinct("videoSettings.codec")[0]
-            historic_data["resolution"] = f"{width} x {height} {frame_rate}"
-            historic_data["url"] = videoanalysis_queryset.distinct("videoSRC.url")[0]
-            historic_data["analysis_mode"] = videoanalysis_queryset.distinct("mode")[0]
-            historic_data["mos"] = videoanalysis_queryset.average("mosAnalysis.mos")
-            historic_data["mos_percentages"] = self.mos_calculator.calculate_mos_categories_videoanalysis_queryset(videoanalysis_queryset)
-            historic_data["spat_inf_avg"] = videoanalysis_queryset.average('videoSettings.spat_inf_avg')
-            historic_data["temp_inf_avg"] = videoanalysis_queryset.average('videoSettings.temp_inf_avg')
-            historic_data["bitrate"] = videoanalysis_queryset.average("videoSettings.bitrate")
+            historic_data["pixel_format"] = first_values.get("videoSettings.pix_format")
+            historic_data["scan_type"] = first_values.get("videoSettings.scan_type")
+            historic_data["video_codec"] = first_values.get("videoSettings.codec")
+            historic_data["resolution"] = "{} x {} {}".format(
+                first_values.get("videoSettings.width"),
+                first_values.get("videoSettings.height"),
+                first_values.get("videoSettings.frame_rate"))
+            historic_data["url"] = first_values.get("videoSRC.url")
+            historic_data["analysis_mode"] = first_values.get("mode")
+            historic_data["tier"] = search_tier
+            historic_data["mos"] = summary["averages"]["mosAnalysis.mos"]
+            historic_data["mos_percentages"] = {
+                category: count / summary["count"] for category, count in summary["mos_counts"].items()
+            }
+            historic_data["spat_inf_avg"] = summary["averages"]["videoSettings.spat_inf_avg"]
+            historic_data["temp_inf_avg"] = summary["averages"]["videoSettings.temp_inf_avg"]
+            historic_data["bitrate"] = summary["averages"]["videoSettings.bitrate"]
             historic_data["warnings"] = alert_list["warnings"]
             historic_data["warning_number"] = len(alert_list["warnings"])
             historic_data["alerts"] = alert_list["alerts"]
             historic_data["alert_number"] = len(alert_list["alerts"])
-            historic_data["graph_data"] = self.get_historic_graph_data(videoanalysis_queryset)
+            historic_data["graph_data"] = self.get_historic_graph_data(
+                summary, search_data, raw_search_query, search_tier)
         except Exception as e:
             gv.logger.error(e)
             gv.logger.error(traceback.print_exc())
         return historic_data
+
+    def get_historic_summary(self, videoanalysis_queryset, graph_options):
+        """Reduces the documents of a search in a single query, reading only the fields used by the historic.
+        Graph points are only kept while they fit in the graph, unless they are downsampled with LTTB.
+        
+        :param videoanalysis_queryset: Documents of the search, sorted by insertion
+        :type videoanalysis_queryset: mongoengine.QuerySet
+        :param graph_options: Graph options of the search, from get_graph_options
+        :type graph_options: dict
+        :return: Number of documents, first value and average of the summary fields, 
+        MOS category counts, time range and graph points of the search (None if they have to be bucketed)
+        :rtype: dict
+        """
+        summary = {
+            "count": 0,
+            "first_values": {},
+            "averages": {},
+            "mos_counts": {},
+            "time_range": {},
+            "graph_options": graph_options,
+            "graph_points": []
+        }
+        if graph_options["downsampling"] == "bucket" and graph_options["resolution"] is not None:
+            summary["graph_points"] = None
+        sums = {field: 0.0 for field in HISTORIC_AVERAGE_FIELDS}
+        sample_numbers = {field: 0 for field in HISTORIC_AVERAGE_FIELDS}
+        mos_list = []
+        fields = HISTORIC_FIRST_VALUE_FIELDS + HISTORIC_AVERAGE_FIELDS + HISTORIC_GRAPH_FIELDS
+        for document in videoanalysis_queryset.only(*fields).as_pymongo():
+            summary["count"] += 1
+            for field in HISTORIC_FIRST_VALUE_FIELDS:
+                if field not in summary["first_values"]:
+                    value = self.get_document_value(document, field)
+                    if value is not None:
+                        summary["first_values"][field] = value
+            for field in HISTORIC_AVERAGE_FIELDS:
+                value = self.get_document_value(document, field)
+                # Same as $avg, non numeric values are ignored
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    sums[field] += value
+                    sample_numbers[field] += 1
+            mos = self.get_document_value(document, "mosAnalysis.mos")
+            if isinstance(mos, (int, float)):
+                mos_list.append(mos)
+            for field in ["inserted_at", "videoSettings.video_second"]:
+                self.update_time_range(summary["time_range"], field, self.get_document_value(document, field))
+            if summary["graph_points"] is not None:
+                summary["graph_points"].append(tuple(self.get_document_value(document, field) for field in HISTORIC_GRAPH_FIELDS))
+                # Points are bucketed in db once they do not fit in the graph
+                if graph_options["downsampling"] == "bucket" and 0 < graph_options["max_points"] < summary["count"]:
+                    summary["graph_points"] = None
+        for field in HISTORIC_AVERAGE_FIELDS:
+            summary["averages"][field] = sums[field] / sample_numbers[field] if sample_numbers[field] > 0 else None
+        summary["mos_counts"] = self.mos_calculator.get_mos_counts(mos_list)
+        return summary
+
+    def get_historic_rollup_summary(self, rollup_queryset, graph_options):
+        """Same as get_historic_summary for the searches served from rollups. 
+        Averages are weighted by the measures of each rollup, and each rollup is a graph point with their average MOS.
+        
+        :param rollup_queryset: Rollups of the search, sorted by period
+        :type rollup_queryset: mongoengine.QuerySet
+        :param graph_options: Graph options of the search, from get_graph_options
+        :type graph_options: dict
+        :return: Summary of the search, as get_historic_summary
+        :rtype: dict
+        """
+        summary = {
+            "count": 0,
+            "first_values": {},
+            "averages": {},
+            "mos_counts": dict(INIT_MOS_CATEGORIES),
+            "time_range": {},
+            "graph_options": graph_options,
+            "graph_points": []
+        }
+        if graph_options["downsampling"] == "bucket" and graph_options["resolution"] is not None:
+            summary["graph_points"] = None
+        sums = {field: 0.0 for field in HISTORIC_AVERAGE_FIELDS}
+        sample_numbers = {field: 0 for field in HISTORIC_AVERAGE_FIELDS}
+        for rollup in rollup_queryset.as_pymongo():
+            summary["count"] += rollup.get("measures", 0)
+            for field in HISTORIC_FIRST_VALUE_FIELDS:
+                value = rollup.get("videoSRC", {}).get("url") if field == "videoSRC.url" \
+                    else rollup.get("first_values", {}).get(field.split(".")[-1])
+                if field not in summary["first_values"] and value is not None:
+                    summary["first_values"][field] = value
+            sums["mosAnalysis.mos"] += rollup.get("mos_sum", 0.0)
+            sample_numbers["mosAnalysis.mos"] += rollup.get("measures", 0)
+            for field in HISTORIC_AVERAGE_FIELDS:
+                feature = field.split(".")[-1]
+                if feature in rollup.get("feature_samples", {}):
+                    sums[field] += rollup["feature_sums"][feature]
+                    sample_numbers[field] += rollup["feature_samples"][feature]
+            for category, count in (rollup.get("mos_counts") or {}).items():
+                summary["mos_counts"][category] = summary["mos_counts"].get(category, 0) + count
+            self.update_time_range(summary["time_range"], "inserted_at", rollup.get("period_start"))
+            self.update_time_range(summary["time_range"], "videoSettings.video_second", rollup.get("video_second"))
+            if summary["graph_points"] is not None and rollup.get("measures", 0) > 0:
+                point_values = {
+                    "timestamp": rollup.get("timestamp"),
+                    "videoSettings.video_second": rollup.get("video_second"),
+                    "mosAnalysis.mos": rollup["mos_sum"] / rollup["measures"],
+                    "videoSettings.pts": rollup.get("pts"),
+                    "inserted_at": rollup.get("period_start")
+                }
+                summary["graph_points"].append(tuple(point_values[field] for field in HISTORIC_GRAPH_FIELDS))
+                if graph_options["downsampling"] == "bucket" and 0 < graph_options["max_points"] < len(summary["graph_points"]):
+                    summary["graph_points"] = None
+        for field in HISTORIC_AVERAGE_FIELDS:
+            summary["averages"][field] = sums[field] / sample_numbers[field] if sample_numbers[field] > 0 else None
+        return summary
+
+    def get_graph_options(self, search_data):
+        """Reads the graph options of the search: "max_points", "resolution" (seconds) and "downsampling"
+        
+        :param search_data: Data of the search
+        :type search_data: dict
+        :raises ValueError: Downsampling mode is not valid
+        :return: Graph options, with defaults from config
+        :rtype: dict
+        """
+        resolution = search_data.get("resolution")
+        graph_options = {
+            "max_points": int(search_data.get("max_points", cfg.historic_graph_max_points)),
+            "resolution": float(resolution) if resolution not in [None, ""] else None,
+            "downsampling": search_data.get("downsampling", cfg.historic_graph_downsampling)
+        }
+        if graph_options["downsampling"] not in HISTORIC_GRAPH_DOWNSAMPLING:
+            raise ValueError("Downsampling {} is not valid. Try {}".format(
+                graph_options["downsampling"], " or ".join(HISTORIC_GRAPH_DOWNSAMPLING)))
+        return graph_options
+
+    def update_time_range(self, time_range, field, value):
+        if not isinstance(value, (int, float)):
+            return
+        field_range = time_range.setdefault(field, [value, value])
+        field_range[0] = min(field_range[0], value)
+        field_range[1] = max(field_range[1], value)
+
+    def get_document_value(self, document, field):
+        value = document
+        for key in field.split("."):
+            if not isinstance(value, dict):
+                return None
+            value = value.get(key)
+        return value
     
-    def get_historic_graph_data(self, videoanalysis_queryset):
-        """Obtains the graph data required to draw the histogram
+    def get_historic_graph_data(self, summary, search_data, raw_search_query, search_tier):
+        """Obtains the graph data required to draw the histogram.
+        Searches with more points than the max_points option are downsampled, 
+        in MOS min/avg/max time buckets or with LTTB depending on the downsampling option.
         
-        :param videoanalysis_queryset: videoanalysis_queryset to generate the graph data. db_models.VideoAnalysisDocument as dict
-        :type videoanalysis_queryset: dict
+        :param summary: Summary of the search, from get_historic_summary
+        :type summary: dict
+        :param search_data: Data of the search
+        :type search_data: dict
+        :param raw_search_query: Query of the search over the measures, to bucket its points
+        :type raw_search_query: dict
+        :param search_tier: Tier of the search
+        :type search_tier: str
         :raises Exception: Any possible unhandled exception
-        :return: Historic graph data from videoanalysis_queryset. List of dict with mos, pts and timestamp as keys
+        :return: Historic graph data from videoanalysis_queryset. List of dict with mos, pts and timestamp as keys.
+        Buckets also include mos_min, mos_max and the number of measures
         :rtype: List of dicts
         """
-        historic_graph_data = []
-        if videoanalysis_queryset.count() == 0:
+        if summary["count"] == 0:
             raise AttributeError("No data in that period of time")
         # GRAPH DATA AS IN PROGRAM
-        time_field = self.get_time_field(videoanalysis_queryset) 
-        graph_data_tuple_list = videoanalysis_queryset.scalar(time_field, "mosAnalysis__mos", "videoSettings__pts")
-        historic_graph_data = list(starmap(self.historic_graph_formatting, graph_data_tuple_list))
-        return historic_graph_data
-
-    def get_time_field(self, videoanalysis_queryset):
-        url = videoanalysis_queryset.distinct("videoSRC.url")[0]
-        content_type = self.get_content_type_by_url(url)
+        time_field = self.get_time_field(summary["first_values"].get("videoSRC.url"), search_data)
+        if summary["graph_points"] is None:
+            return self.get_historic_graph_buckets(summary, time_field, raw_search_query, search_tier)
+        time_field_index = HISTORIC_GRAPH_FIELDS.index(time_field)
+        mos_index = HISTORIC_GRAPH_FIELDS.index("mosAnalysis.mos")
+        pts_index = HISTORIC_GRAPH_FIELDS.index("videoSettings.pts")
+        graph_points = summary["graph_points"]
+        max_points = summary["graph_options"]["max_points"]
+        if 0 < max_points < len(graph_points):
+            graph_points = self.get_lttb_graph_points(graph_points, max_points, time_field)
+        return [
+            self.historic_graph_formatting(point[time_field_index], point[mos_index], point[pts_index])
+            for point in graph_points
+        ]
+
+    def get_historic_graph_buckets(self, summary, time_field, raw_search_query, search_tier):
+        """Gets the graph data grouped in time buckets by MongoDB. 
+        Bucket size is the resolution of the search, enlarged if needed to fit max_points.
+        
+        :param summary: Summary of the search, from get_historic_summary
+        :type summary: dict
+        :param time_field: Time field of the graph
+        :type time_field: str
+        :param raw_search_query: Query of the search over the measures
+        :type raw_search_query: dict
+        :param search_tier: Tier of the search
+        :type search_tier: str
+        :return: One point per bucket, with mos_min and mos_max
+        :rtype: list[dict]
+        """
+        # Timestamps are strings, live buckets use the ingestion timestamp (ms)
+        bucket_field = "videoSettings.video_second" if time_field == "videoSettings.video_second" else "inserted_at"
+        units_per_second = 1 if bucket_field == "videoSettings.video_second" else 1000
+        init_time, end_time = summary["time_range"].get(bucket_field, [0, 0])
+        graph_options = summary["graph_options"]
+        resolution = graph_options["resolution"] * units_per_second if graph_options["resolution"] is not None else None
+        bucket_size = utils.get_graph_bucket_size(init_time, end_time, resolution, graph_options["max_points"])
+        graph_buckets = []
+        for bucket in self.historic_db_manager.get_graph_buckets(
+                raw_search_query, search_tier, bucket_field, init_time, bucket_size):
+            time_value = bucket["video_second"] if time_field == "videoSettings.video_second" else bucket["timestamp"]
+            graph_bucket = self.historic_graph_formatting(time_value, bucket["mos"], bucket["pts"])
+            graph_bucket.update({
+                "mos_min": bucket["mos_min"],
+                "mos_max": bucket["mos_max"],
+                "measures": bucket["measures"]
+            })
+            graph_buckets.append(graph_bucket)
+        return graph_buckets
+
+    def get_lttb_graph_points(self, graph_points, max_points, time_field):
+        # Timestamps are strings, live points are placed by their ingestion timestamp
+        x_field = "videoSettings.video_second" if time_field == "videoSettings.video_second" else "inserted_at"
+        x_index = HISTORIC_GRAPH_FIELDS.index(x_field)
+        y_index = HISTORIC_GRAPH_FIELDS.index("mosAnalysis.mos")
+        numeric_points = [
+            point for point in graph_points
+            if isinstance(point[x_index], (int, float)) and isinstance(point[y_index], (int, float))
+        ]
+        return utils.downsample_lttb(numeric_points, max_points, x_index, y_index)
+
+    def get_time_field(self, url, search_data):
+        content_type = self.get_content_type_by_url(url or "")
         time_field = "timestamp"
         # Only for vod/playlist programs we use videoSecond, elsewhere timestamp
-        if  content_type != "live" and "program_name" in self.search_data:
-            time_field = "videoSettings__video_second"
+        if  content_type != "live" and "program_name" in search_data:
+            time_field = "videoSettings.video_second"
         return time_field
 
     def get_content_type_by_url(self, url):
@@ -6,7 +6,6 @@ Created on 17 mar. 2020
 
 from helper import global_variables as gv
 from helper import utils
-import json
 import traceback
 
 class JourneyRouter:
@@ -99,10 +98,7 @@ class JourneyRouter:
         program_list = []
 
         try:
-            program_list = json.loads(self.journey_manager.get_journey_program_list(journey_datetime=journey_datetime).to_json())
-            for program in program_list:
-                alert_list = gv.api_dm.alert_router.get_alert_warning_list(journey_datetime=journey_datetime, program_name=program["program_name"])
-                program.update(alert_list)
+            program_list = self.journey_manager.get_journey_program_alert_list(journey_datetime=journey_datetime)
         except AttributeError:
             raise AttributeError("Journey {} Not Found".format(journey_datetime))
         except Exception as e:
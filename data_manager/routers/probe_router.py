@@ -4,16 +4,13 @@ Created on 17 mar. 2020
 @author: victor
 '''
 import traceback
-import subprocess
 import json
-import signal
 import psutil
 import pytz
 import time 
-import signal
 from dateutil.tz import tzlocal
 
-from os import kill, getenv
+from os import getenv
 from datetime import datetime
 
 from helper import config as cfg
@@ -22,7 +19,6 @@ from db_models import StatusData
 
 from managers.thread_playlist import PlaylistPlayer
 from helper import utils
-from managers.memory_emergency_manager import MemoryEmergencyManager
 
 
 class ProbeRouter:
@@ -30,12 +26,21 @@ class ProbeRouter:
         
     :param config_manager: DbManager in charge of handling ProbeConfig documents in MongoDB
     :type config_manager: managers.db_managers.ConfigDbManager
+    :param status_cache: Cache of the latest probe status
+    :type status_cache: managers.status_cache.StatusCache
+    :param probe_supervisor: Owner of the probe processes launched by this worker
+    :type probe_supervisor: managers.probe_supervisor.ProbeSupervisor
+    :param resource_monitor: Background sampler of the resources used by the probe
+    :type resource_monitor: managers.resource_monitor.ResourceMonitor
     """
     
-    def __init__(self, config_manager):
+    def __init__(self, config_manager, status_cache, probe_supervisor, resource_monitor):
         """Constructor
         """
         self.config_manager = config_manager
+        self.status_cache = status_cache
+        self.probe_supervisor = probe_supervisor
+        self.resource_monitor = resource_monitor
         self.journey_datetime = None # Datetime object
         self.content_type = ""
         self.current_status = None # StatusData object
@@ -46,12 +51,14 @@ class ProbeRouter:
         API Endpoint: '/videoAnalysis/probe/launch', methods=['POST']
     
         """
+        # Config may have been changed by another worker
+        self.config_manager.refresh_config()
         self.set_probe_router_attributes()
         self.launch_probe_by_url()
         
     def set_probe_router_attributes(self):
         self.journey_datetime = datetime.now(pytz.UTC).replace(microsecond=0)
-        self.current_status = StatusData.objects.order_by('-id').first()
+        self.current_status = self.status_cache.refresh()
         self.content_type = "vod" if cfg.upload_path in self.config_manager.config.url else "live"
         # If previous execution was live, then insert in previous journey
         if self.current_status is not None:
@@ -62,20 +69,13 @@ class ProbeRouter:
     def check_probe_running(self):
         """
         """
-        process_name = ""
         if self.current_status.content_type != "playlist":
-            if psutil.pid_exists(self.current_status.probe_pid):
-                gv.logger.info(json.loads(self.current_status.to_json()))
-                process_name = psutil.Process(self.current_status.probe_pid).name()
             # If there is a probe already, kills it
-            if gv.api_dm.probe_status != "stopped" and process_name == "videoqualityprobe":
-                if psutil.pid_exists(self.current_status.probe_pid):
-                    gv.logger.warning("Current probe has been killed")
-                    kill(self.current_status.probe_pid, signal.SIGKILL)
-                    gv.api_dm.probe_status = "stopped"
-                    time.sleep(1)
-                else:
-                    pass
+            if gv.api_dm.probe_status != "stopped" and self.probe_supervisor.is_alive(self.current_status.probe_pid):
+                gv.logger.info(json.loads(self.current_status.to_json()))
+                gv.logger.warning("Current probe has been killed")
+                gv.api_dm.probe_status = "stopped"
+                self.probe_supervisor.stop(self.current_status.probe_pid)
     
     def launch_probe_by_url(self):
         if self.config_manager.config.url.endswith(cfg.playlist_extension):
@@ -87,6 +87,7 @@ class ProbeRouter:
         process = self.launch_command_probe()
         status_data = self.get_new_probe_status(process.pid)
         status_data.save()
+        self.status_cache.invalidate()
         gv.logger.info("Launched probe with info: {}".format(
             json.loads(status_data.to_json()))
         )
@@ -94,6 +95,7 @@ class ProbeRouter:
 
     def get_new_probe_status(self, probe_pid):
         status_data_dict = {
+            "channel_id": self.status_cache.channel_id,
             "url": self.config_manager.config.url,
             "probe_pid": probe_pid,
             "start_datetime": datetime.now(pytz.UTC),
@@ -116,7 +118,7 @@ class ProbeRouter:
         return status_data_dict
     
     def launch_command_probe(self):
-        self.current_status = StatusData.objects.order_by('-id').first()
+        self.current_status = self.status_cache.status
         command = [
             "{}/videoqualityprobe_{}/Release/videoqualityprobe".format(
                 cfg.base_project_path, self.content_type),
@@ -132,17 +134,17 @@ class ProbeRouter:
         if self.is_probe_running():
             gv.logger.warning("Previous probe killed")
             self.kill_probe_process()
-        process = subprocess.Popen(command)
+        process = self.probe_supervisor.launch(
+            "probe", command, restart_policy=cfg.probe_restart_policy[self.content_type]
+        )
         return process
 
     def is_probe_running(self):
-        for proc in psutil.process_iter():
-            if cfg.process_name in proc.name().lower():
-                return True    
-        return False
+        current_status = self.status_cache.status
+        return current_status is not None and self.probe_supervisor.is_alive(current_status.probe_pid)
 
     def restart_probe(self):
-        current_status = StatusData.objects.order_by('-id').first()
+        current_status = self.status_cache.refresh()
         if (current_status.probe_status != "idle"):
             gv.logger.warning("Videoqualityprobe has been killed by an unknown external process")
             gv.logger.warning("Trying to restart it using the current configuration")
@@ -159,7 +161,8 @@ class ProbeRouter:
                 playlist = f.readlines()
             playlist = [x.strip() for x in playlist] 
             self.playlist_player = PlaylistPlayer(
-                playlist=playlist, mode=str(config.mode)
+                playlist=playlist, mode=str(config.mode), status_cache=self.status_cache,
+                probe_supervisor=self.probe_supervisor
             )
             self.playlist_player.start()
         else:
@@ -176,26 +179,36 @@ class ProbeRouter:
         self.kill_probe_process()
     
     def kill_probe_process(self):
-        self.current_status = StatusData.objects.order_by('-id').first()
+        self.current_status = self.status_cache.refresh()
         if self.current_status is None:
             raise AttributeError("PID of Videoqualityprobe process not idenfied. Probe has not been started yet.")
         else:
             # Added an special status (killed) to kill playlist process
-            if self.current_status.content_type == "playlist":
-                gv.api_dm.probe_status = "killed"
-            MemoryEmergencyManager.kill_process_by_name("videoqualityprobe")
-            time.sleep(0.5)
+            # Status is set before stopping the probe, so it is not restarted by its supervisor
+            gv.api_dm.probe_status = "killed" if self.current_status.content_type == "playlist" else "stopped"
+            self.probe_supervisor.stop(self.current_status.probe_pid)
             gv.api_dm.probe_status = "stopped"
             gv.logger.info("Probe has been stop either by user or due to no more content")
     
+    def get_probe_resources(self, seconds=None):
+        """Gets the memory, CPU and open files sampled from the current probe, with their trends
+        API Endpoint: '/videoAnalysis/probe/resources', methods=['GET']
+
+        :param seconds: Only the samples of the last seconds, defaults to every sample kept
+        :type seconds: float, optional
+        :return: Samples, trends per minute and memory breach
+        :rtype: dict
+        """
+        return self.resource_monitor.get_stats(seconds)
+
     def kill_playlist_process(self):
-        self.current_status = StatusData.objects.order_by('-id').first()
+        self.current_status = self.status_cache.refresh()
         if self.current_status is None:
             raise AttributeError("PID of Videoqualityprobe process not idenfied. Probe has not been started yet.")
         else:
             gv.api_dm.probe_status = "stopped"
             # Kill process
-            kill(self.current_status.probe_pid, signal.SIGTERM)
+            self.probe_supervisor.stop(self.current_status.probe_pid)
             gv.logger.warning("Playlist probe has been stopped")
 
     
\ No newline at end of file
@@ -61,4 +61,40 @@ class ProgramRouter:
             raise AttributeError("Program {} Not Found".format(program_name))
         except Exception as e:
             gv.logger.error(f"{type(e)} - {e}")
-        return program
\ No newline at end of file
+        return program
+
+    def get_program_data(self, program_name="current", init_timestamp=None, end_timestamp=None, skip=0, limit=None):
+        """Gets a page of the data points of a program from the current journey
+        
+        :param program_name: Name of program to obtain, defaults to "current"
+        :type program_name: str, optional
+        :param init_timestamp: Minimum ingestion timestamp (ms) of the points, defaults to None
+        :type init_timestamp: int, optional
+        :param end_timestamp: Maximum ingestion timestamp (ms) of the points, defaults to None
+        :type end_timestamp: int, optional
+        :param skip: Number of points to skip, defaults to 0
+        :type skip: int, optional
+        :param limit: Maximum number of points to return, defaults to None (all)
+        :type limit: int, optional
+        :raises AttributeError: Program not found
+        :return: Points of the program and total number of measures of the program
+        :rtype: tuple
+        """
+        program = self.get_program(program_name=program_name)
+        if program in [None, {}]:
+            raise AttributeError("Program {} not found".format(program_name))
+        program_data = self.program_manager.get_program_data(
+            program, init_timestamp=init_timestamp, end_timestamp=end_timestamp, skip=skip, limit=limit)
+        return program_data, self.program_manager.mos_calculator.get_measures_n_1(program)
+
+    def get_epg_now_next(self, channel=None):
+        """Gets the EPG program shown now in a channel and the following one
+
+        API Endpoint: '/videoAnalysis/probe/epg/now', methods=['GET']
+        
+        :param channel: Name of the channel, defaults to None (EPG channel configured in the current channel)
+        :type channel: str, optional
+        :return: Channel and now/next programs
+        :rtype: dict
+        """
+        return self.program_manager.epg_manager.get_now_next_programs(channel or self.program_manager.get_epg_channel())
@@ -17,6 +17,8 @@ class AlertNumberSchema(Schema):
     """
     alerts = fields.Integer(description="Number of alerts", default=0)
     warnings = fields.Integer(description="Number of warnings", default=0)
+    alert_categories = fields.Dict(description="Number of alerts by category")
+    warning_categories = fields.Dict(description="Number of warnings by category")
 
 
 class AlertSchema(ModelSchema):
@@ -47,4 +49,5 @@ class AlertListSchema(Schema):
     """
     alerts = fields.Nested(AlertSchema, many=True)
     warnings = fields.Nested(WarningSchema, many=True)
+    next_cursor = fields.String(description="Cursor of the next page, only with limit. Null in the last page", allow_none=True)
 
@@ -0,0 +1,13 @@
+from marshmallow import Schema, fields
+
+class EpgProgramSchema(Schema):
+    program_name = fields.String(description="Name of program")
+    channel = fields.String(description="Channel where this program is shown")
+    start_datetime = fields.DateTime(description="Start time of program")
+    end_datetime = fields.DateTime(description="End time of program")
+    duration = fields.Integer(description="Duration of program, in minutes")
+
+class EpgNowNextSchema(Schema):
+    channel = fields.String(description="Channel of the programs")
+    now = fields.Nested(EpgProgramSchema, allow_none=True, description="Program shown now")
+    next = fields.Nested(EpgProgramSchema, allow_none=True, description="Following program")
@@ -12,4 +12,5 @@ class ProgramSchema(ModelSchema):
 class ProgramDataSchema(Schema):
     mos = fields.Float(description="MOS value", default=1.0)
     pts = fields.Integer(description="PTS value", default=0)
-    timestamp = fields.String(description="Timestamp of measure")
\ No newline at end of file
+    timestamp = fields.String(description="Timestamp of measure")
+    inserted_at = fields.Integer(description="Ingestion timestamp of measure, in ms")
\ No newline at end of file
@@ -5,6 +5,11 @@ class SearchJourneySchema(Schema):
     program_name = fields.String(description="Program name to search")
     url = fields.String(description="URL to search")
     type = fields.String(description="Type of file (CSV/JSON)")
+    stream = fields.Boolean(description="Returns the file in chunks instead of its url")
+    max_points = fields.Integer(description="Maximum number of graph points. Larger searches are downsampled, 0 returns every point")
+    resolution = fields.Float(description="Seconds of each graph bucket")
+    downsampling = fields.String(description="Downsampling of the graph: bucket (min/avg/max MOS per time bucket) or lttb")
+    tier = fields.String(description="Data of the graph and summary: raw, minute or hour rollups. Chosen from the range and graph options by default")
     
 class SearchDatetimeSchema(Schema):
     start_datetime = fields.DateTime(required=True, description="Start datetime to search")
@@ -12,4 +17,9 @@ class SearchDatetimeSchema(Schema):
     program_name = fields.String(description="Program name to search")
     url = fields.String(description="URL to search")
     type = fields.String(description="Type of file (CSV/JSON)")
+    stream = fields.Boolean(description="Returns the file in chunks instead of its url")
+    max_points = fields.Integer(description="Maximum number of graph points. Larger searches are downsampled, 0 returns every point")
+    resolution = fields.Float(description="Seconds of each graph bucket")
+    downsampling = fields.String(description="Downsampling of the graph: bucket (min/avg/max MOS per time bucket) or lttb")
+    tier = fields.String(description="Data of the graph and summary: raw, minute or hour rollups. Chosen from the range and graph options by default")
     
\ No newline at end of file
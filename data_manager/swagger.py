@@ -9,7 +9,7 @@ from pathlib import Path
 from helper import config as cfg
 
 # Reference your schemas definitions
-from schemas import video_data, mos, program, alert, journey, message, config, search, anomaly
+from schemas import video_data, mos, program, alert, journey, message, config, search, anomaly, epg
 
 # Now, reference your routes.
 import init_service
@@ -94,6 +94,9 @@ spec.components.schema("MosPercentagesSchema", schema=mos.MosPercentagesSchema)
 # Programs
 spec.components.schema("ProgramSchema", schema=program.ProgramSchema)
 
+# EPG
+spec.components.schema("EpgNowNextSchema", schema=epg.EpgNowNextSchema)
+
 # Alerts
 spec.components.schema("AlertListSchema", schema=alert.AlertListSchema)
 spec.components.schema("AlertNumberSchema", schema=alert.AlertNumberSchema)
@@ -129,9 +132,14 @@ with init_service.app.test_request_context():
     spec.path(view=views.probe.api_get_status_videoqualityprobe)
     spec.path(view=views.probe.api_get_config_videoqualityprobe)
     spec.path(view=views.probe.api_put_config_videoqualityprobe)
+    spec.path(view=views.probe.api_get_epg_now_next)
+    spec.path(view=views.probe.api_get_channels)
     # documents
     spec.path(view=views.documents.api_post_bulk_document)
+    spec.path(view=views.documents.api_post_batch_documents)
+    spec.path(view=views.documents.api_get_ingest_stats)
     spec.path(view=views.documents.api_get_last_document)
+    spec.path(view=views.documents.api_get_live_feed)
     # journey
     spec.path(view=views.journeys.api_get_journey_mos)
     spec.path(view=views.journeys.api_get_journeys_date_list)
@@ -5,7 +5,7 @@ Created on 18 mar. 2020
 '''
 import traceback
 import json
-from flask import Blueprint, abort, request
+from flask import Blueprint, Response, abort, request, stream_with_context
 
 from helper import global_variables as gv
 from helper import config as cfg
@@ -52,6 +52,9 @@ def api_post_bulk_document():
             405: 
                 description: Invalid input
                 schema: ErrorResponse
+            503: 
+                description: Ingest pipeline is full, the document must be sent again later
+                schema: ErrorResponse
             default:
                 description: Unexpected server response
                 content:
@@ -62,9 +65,12 @@ def api_post_bulk_document():
     """
     status = 200
     try:
-        input_document = json.dumps(request.get_json(force=True))
+        input_data = request.get_json(force=True)
+        # Probes do not send their channel, it is the one configured with their source
+        gv.api_dm.scope_measures([input_data])
+        input_document = json.dumps(input_data)
         headers = request.headers
-        output = gv.api_dm.document_router.bulk_document_to_db(
+        output, status = gv.api_dm.document_router.bulk_document_to_db(
             input_document=input_document,
             headers=headers)
         response = json.dumps(output)
@@ -78,6 +84,129 @@ def api_post_bulk_document():
     return response, status
 
 
+@documents.route('/batch', methods=['POST'])
+def api_post_batch_documents():
+    """
+    Bulk a batch of documents into database
+    ---
+    post: 
+        tags: 
+            - documents
+        summary: Add a batch of new documents to the database
+        description: Add several documents from probe to MongoDB in a single request
+        operationId: batch_documents
+        parameters: 
+            - name: api_key
+              in: header
+              required: false
+              schema:
+                type: string
+            - name: mode
+              in: header
+              description: Working mode
+              required: true
+              schema:
+                type: string
+        requestBody:
+            description: Documents from probe, in the order they were measured
+            required: true
+            content:
+                application/json:
+                    schema:
+                        type: array
+                        items: VideoAnalysisSchema
+        responses: 
+            200:
+                description: successful operation
+                content:
+                    application/json:
+                        schema: ApiResponse
+            400: 
+                description: Body is not a list of documents
+                schema: ErrorResponse
+            413: 
+                description: Too many documents in the batch
+                schema: ErrorResponse
+            503: 
+                description: Ingest pipeline is full, the documents must be sent again later
+                schema: ErrorResponse
+            default:
+                description: Unexpected server response
+                content:
+                    application/json: 
+                        schema: ErrorResponse
+        security: 
+            -   api_key: 
+    """
+    status = 200
+    try:
+        input_documents = request.get_json(force=True)
+        if not isinstance(input_documents, list):
+            status = 400
+            output = utils.build_output(task=cfg.batch_data_task, status=status,
+                                            message="Body must be a list of documents", output={})
+        else:
+            gv.api_dm.scope_measures(input_documents)
+            output, status = gv.api_dm.document_router.batch_documents_to_db(
+                input_documents=input_documents,
+                headers=request.headers)
+        response = json.dumps(output)
+    except Exception as e:
+        gv.logger.error(e)
+        gv.logger.error(traceback.print_exc())
+        status=500
+        output = utils.build_output(task=cfg.batch_data_task, status=500,
+                                        message=str(e), output={})
+        response = json.dumps(output)
+    return response, status
+
+
+@documents.route('/pipeline', methods=['GET'])
+def api_get_ingest_stats():
+    """
+    Gets stats of the ingest pipeline
+    ---
+    get:
+        tags: 
+            -  documents
+        summary:  Gets ingest pipeline stats
+        description:  Gets queue depth and latency of each stage of the ingest pipeline
+        operationId: get_ingest_stats
+        parameters: 
+            - name: api_key
+              in: header
+              required: false
+              schema:
+                type: string
+        responses: 
+            200:
+                description: Stats of each stage
+                content:
+                    application/json:
+                        schema: ApiResponse
+            default:
+                description: Unexpected server response
+                content:
+                    application/json: 
+                        schema: ErrorResponse
+        security: 
+            -  api_key: 
+    """
+    status = 200
+    try:
+        stats = gv.api_dm.document_router.get_ingest_stats()
+        output = utils.build_output(task=cfg.get_ingest_stats_task, status=status,
+                                        message=cfg.success_msg, output=stats)
+        response = json.dumps(output)
+    except Exception as e:
+        gv.logger.error(e)
+        status=500
+        output = utils.build_output(task=cfg.get_ingest_stats_task, status=500,
+                                        message=str(e), output={})
+        response = json.dumps(output)
+    return response, status
+
+
 @documents.route('/last', methods=['GET'])
 def api_get_last_document():
     """
@@ -125,4 +254,58 @@ def api_get_last_document():
         output = utils.build_output(task=cfg.get_last_document_task, status=500,
                                         message=str(e), output={})
         response = json.dumps(output)
-    return response, status
\ No newline at end of file
+    return response, status
+
+@documents.route('/live', methods=['GET'])
+def api_get_live_feed():
+    """
+    Gets a live feed of measures, probe status changes and alerts
+    ---
+    get:
+        tags: 
+            -  documents
+        summary:  Gets live feed
+        description:  Server-sent events stream, replacing the polling of last document and probe status.
+            Events are measure (same content as last document), status (same content as probe status), alert and warning.
+            Reconnections with Last-Event-ID header receive the events missed.
+        operationId: get_live_feed
+        parameters: 
+            - name: api_key
+              in: header
+              required: false
+              schema:
+                type: string
+            - name: Last-Event-ID
+              in: header
+              required: false
+              schema:
+                type: string
+        responses: 
+            200:
+                description: Stream of events
+                content:
+                    text/event-stream:
+                        schema:
+                            type: string
+            default:
+                description: Unexpected server response
+                content:
+                    application/json: 
+                        schema: ErrorResponse
+        security: 
+            -  api_key: 
+    """
+    status = 200
+    try:
+        live_events = gv.api_dm.document_router.get_live_feed(request.headers.get("Last-Event-ID"))
+        response = Response(stream_with_context(live_events), mimetype="text/event-stream")
+        response.headers["Cache-Control"] = "no-cache"
+        # Disables buffering of nginx proxies
+        response.headers["X-Accel-Buffering"] = "no"
+    except Exception as e:
+        gv.logger.error(e)
+        status=500
+        output = utils.build_output(task=cfg.get_live_feed_task, status=500,
+                                        message=str(e), output={})
+        response = json.dumps(output)
+    return response, status
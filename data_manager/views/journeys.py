@@ -1,7 +1,8 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from helper import global_variables as gv
 from helper import config as cfg
 from helper import utils
+from helper.cache import cached_response, get_journey_scope, get_program_scope
 import json
 import traceback
 
@@ -65,6 +66,7 @@ def api_get_journeys_date_list():
     return response, status
 
 @journeys.route('/<journey_datetime>/mos', methods=['GET'])
+@cached_response(lambda journey_datetime: [get_journey_scope(journey_datetime)])
 def api_get_journey_mos(journey_datetime):
     """
     Get mos value of specific journey
@@ -131,6 +133,7 @@ def api_get_journey_mos(journey_datetime):
     return response, status
 
 @journeys.route('/<journey_datetime>/mos-percentages', methods=['GET'])
+@cached_response(lambda journey_datetime: [get_journey_scope(journey_datetime)])
 def api_get_journey_mos_percetages(journey_datetime):
     """
     Get mos categories of specific journey
@@ -196,6 +199,7 @@ def api_get_journey_mos_percetages(journey_datetime):
     return response, status
 
 @journeys.route('/<journey_datetime>/alert-number', methods=['GET'])
+@cached_response(lambda journey_datetime: [get_journey_scope(journey_datetime)])
 def api_get_journey_alert_number(journey_datetime):
     """
     Gets number of alerts/warnings in journey
@@ -255,6 +259,7 @@ def api_get_journey_alert_number(journey_datetime):
     return response, status
 
 @journeys.route('/<journey_datetime>/alert-list', methods=['GET'])
+@cached_response(lambda journey_datetime: [get_journey_scope(journey_datetime)])
 def api_get_journey_alert_list(journey_datetime):
     """
     Gets alerts/warnings details in journey
@@ -275,12 +280,29 @@ def api_get_journey_alert_list(journey_datetime):
                           example: current
                           enum: [current, previous]
                         - type: date-time
+            - name: limit
+              in: query
+              required: false
+              description: Maximum number of alerts and of warnings to return. All of them if not provided
+              schema:
+                type: integer
+            - name: cursor
+              in: query
+              required: false
+              description: next_cursor of the previous page
+              schema:
+                type: string
         responses: 
             200:
                 description: List of alerts and warnings
                 content:
                     application/json:
                         schema: AlertListSchema
+            400: 
+                description: Invalid cursor
+                content:
+                    application/json:
+                        schema: ErrorResponse
             404: 
                 description: Journey not found
                 content:
@@ -296,9 +318,16 @@ def api_get_journey_alert_list(journey_datetime):
     """
     status = 200
     try:
-        alert_list = gv.api_dm.alert_router.get_alert_warning_list(journey_datetime=journey_datetime)
+        alert_list = gv.api_dm.alert_router.get_alert_warning_list(journey_datetime=journey_datetime,
+            limit=request.args.get("limit", type=int), cursor=request.args.get("cursor"))
         # Response
         response = jsonify(alert_list)
+    except ValueError as e:
+        status = 400
+        gv.logger.error(e)
+        output = utils.build_output(task=cfg.get_journey_data, status=status,
+                                        message=str(e), output={})
+        response = json.dumps(output)
     except AttributeError as e:
         status = 404
         gv.logger.error(e)
@@ -316,6 +345,7 @@ def api_get_journey_alert_list(journey_datetime):
 
 
 @journeys.route('/<journey_datetime>/program-list', methods=['GET'])
+@cached_response(lambda journey_datetime: [get_journey_scope(journey_datetime)])
 def api_get_journey_program_list(journey_datetime):
     """
     Gets data of all programs in journey
@@ -324,7 +354,7 @@ def api_get_journey_program_list(journey_datetime):
         tags: 
             - journeys
         summary: Gets data of all programs in journey
-        description: Gets data of all programs in journey
+        description: Gets all programs in journey with their alerts and warnings. Points of programs are not included, see program data
         operationId: get_journey_program_list
         parameters: 
             - name: journey_datetime
@@ -377,6 +407,7 @@ def api_get_journey_program_list(journey_datetime):
     return response, status
 
 @journeys.route('/<journey_datetime>/program-name-list', methods=['GET'])
+@cached_response(lambda journey_datetime: [get_journey_scope(journey_datetime)])
 def api_get_journey_program_name_list(journey_datetime):
     """
     Gets names of all programs in journey
@@ -443,6 +474,7 @@ def api_get_journey_program_name_list(journey_datetime):
 
 
 @journeys.route('/<journey_datetime>/<program_name>', methods=['GET'])
+@cached_response(lambda journey_datetime, program_name: [get_journey_scope(journey_datetime), get_program_scope(program_name)])
 def api_get_journey_program(journey_datetime, program_name):
     """
     Gets data of a concrete program in journey
@@ -517,6 +549,7 @@ NOT USED METHODS
 
 
 @journeys.route('/<journey_datetime>', methods=['GET'])
+@cached_response(lambda journey_datetime: [get_journey_scope(journey_datetime)])
 def api_get_journey(journey_datetime):
     """
     Get data of complete journey
@@ -313,6 +313,104 @@ def api_get_status_videoqualityprobe():
     return jsonify(response), status
 
 
+@probe.route('/resources', methods=['GET'])
+def api_get_probe_resources():
+    """
+    Returns the resources used by videoqualityprobe
+    ---
+    get:
+        tags:
+            -  videoqualityprobe
+        summary: Gets the resources used by the probe
+        description: Gets the memory (MB), CPU (%) and open files sampled in background from videoqualityprobe, their trends per minute and the current memory breach
+        operationId: get_probe_resources
+        parameters:
+            -   name: api_key
+                in: header
+                required: false
+                schema:
+                    type: string
+            -   name: seconds
+                in: query
+                description: Only the samples of the last seconds
+                required: false
+                schema:
+                    type: number
+        responses:
+            200:
+                description: Samples and trends of the probe resources
+                content:
+                    application/json:
+                        schema: ApiResponse
+            default:
+                description: Unexpected server response
+                content:
+                    application/json:
+                        schema: ErrorResponse
+        security:
+            -  api_key:
+    """
+    status = 200
+    try:
+        seconds = request.args.get("seconds", type=float)
+        resources = gv.api_dm.probe_router.get_probe_resources(seconds)
+        response = utils.build_output(task=cfg.get_probe_resources, status=status,
+                                        message=cfg.success_msg, output=resources)
+    except Exception as e:
+        status = 500
+        gv.logger.error(e)
+        gv.logger.error(traceback.print_exc())
+        response = utils.build_output(task=cfg.get_probe_resources, status=500,
+                                        message=str(e), output={})
+    return jsonify(response), status
+
+
+@probe.route('/channels', methods=['GET'])
+def api_get_channels():
+    """
+    Returns the channels and the status of their probes
+    ---
+    get:
+        tags:
+            -  videoqualityprobe
+        summary: Gets the channels
+        description: Gets every channel of the data manager with its source and the status of its probe.
+            The rest of endpoints use the channel of the channel_id query argument or the X-Channel-Id header, the default channel (null id) otherwise
+        operationId: get_channels
+        parameters:
+            -   name: api_key
+                in: header
+                required: false
+                schema:
+                    type: string
+        responses:
+            200:
+                description: Id, url, program number, EPG channel and probe status of each channel
+                content:
+                    application/json:
+                        schema: ApiResponse
+            default:
+                description: Unexpected server response
+                content:
+                    application/json:
+                        schema: ErrorResponse
+        security:
+            -  api_key:
+    """
+    status = 200
+    try:
+        channels = gv.api_dm.get_channels()
+        response = utils.build_output(task=cfg.get_channels_task, status=status,
+                                        message=cfg.success_msg, output=channels)
+    except Exception as e:
+        status = 500
+        gv.logger.error(e)
+        gv.logger.error(traceback.print_exc())
+        response = utils.build_output(task=cfg.get_channels_task, status=500,
+                                        message=str(e), output={})
+    return jsonify(response), status
+
+
 @probe.route('/epg/channels', methods=['GET'])
 def api_get_current_epg():
     """
@@ -365,3 +463,52 @@ def api_get_current_epg():
         response = utils.build_output(task=task, status=500,
                                         message=str(e), output={})
     return jsonify(response), status
+
+
+@probe.route('/epg/now', methods=['GET'])
+def api_get_epg_now_next():
+    """
+    Get current and next EPG programs
+    ---
+    get:
+        tags:
+            - videoqualityprobe
+        summary: Gets current and next EPG programs
+        description: Gets the program shown now in a channel of the EPG and the following one
+        operationId: get_epg_now_next
+        parameters:
+            -   name: api_key
+                in: header
+                required: false
+                schema:
+                    type: string
+            -   name: channel
+                in: query
+                required: false
+                description: Name of the channel. Configured EPG channel by default
+                schema:
+                    type: string
+        responses:
+            200:
+                description: Channel and current/next programs, null if there is no program
+                content:
+                    application/json:
+                        schema: EpgNowNextSchema
+            default:
+                description: Unexpected server response
+                content:
+                    application/json:
+                        schema: ErrorResponse
+        security:
+            -  api_key:
+    """
+    status = 200
+    try:
+        response = gv.api_dm.program_router.get_epg_now_next(request.args.get("channel"))
+    except Exception as e:
+        gv.logger.error(e)
+        gv.logger.error(traceback.print_exc())
+        status = 500
+        response = utils.build_output(task=cfg.get_epg_now_next, status=500,
+                                        message=str(e), output={})
+    return jsonify(response), status
@@ -2,6 +2,7 @@ from flask import Blueprint, jsonify, abort, request
 from helper import global_variables as gv
 from helper import config as cfg
 from helper import utils
+from helper.cache import cached_response, get_program_scope
 from schemas.program import ProgramSchema
 import json
 
@@ -10,6 +11,7 @@ programs = Blueprint('programs', __name__, url_prefix="/videoAnalysis/programs")
 
 
 @programs.route('/<program_name>/data', methods=['GET'])
+@cached_response(lambda program_name: [get_program_scope(program_name)])
 def api_get_program_data(program_name):
     """
     Get data values of specific program
@@ -27,9 +29,34 @@ def api_get_program_data(program_name):
               schema:
                 type: string
                 example: news1
+            - name: init_timestamp
+              in: query
+              required: false
+              description: Minimum ingestion timestamp (ms) of the points
+              schema:
+                type: integer
+            - name: end_timestamp
+              in: query
+              required: false
+              description: Maximum ingestion timestamp (ms) of the points
+              schema:
+                type: integer
+            - name: skip
+              in: query
+              required: false
+              description: Number of points to skip
+              schema:
+                type: integer
+                default: 0
+            - name: limit
+              in: query
+              required: false
+              description: Maximum number of points to return. All of them if not provided
+              schema:
+                type: integer
         responses: 
             200:
-                description: Program data
+                description: Program data. Total number of points in X-Total-Count header
                 content:
                     application/json:
                         schema: ProgramDataSchema
@@ -51,30 +78,34 @@ def api_get_program_data(program_name):
         # Checks if the user has specified a journey datetime for the program
         if "journey_datetime" in request.args:
             pass
-        program_db = gv.api_dm.program_router.get_program(program_name=program_name)
-        if program_db in [None, {}]:
-            raise AttributeError("Program {} not found".format(program_name))
+        (program_data, total) = gv.api_dm.program_router.get_program_data(
+            program_name=program_name,
+            init_timestamp=request.args.get("init_timestamp", type=int),
+            end_timestamp=request.args.get("end_timestamp", type=int),
+            skip=request.args.get("skip", default=0, type=int),
+            limit=request.args.get("limit", type=int))
         # Response
-        program = json.loads(program_db.to_json())
-        response = jsonify(program["data"])
+        response = jsonify(program_data)
+        response.headers["X-Total-Count"] = str(total)
     except AttributeError as e:
         status = 404
         gv.logger.error(e)
         abort(status=status, description=str(e))
-        output = utils.build_output(task=cfg.get_journey_data, status=status,
+        output = utils.build_output(task=cfg.get_program_data, status=status,
                                         message=str(e), output={})
         response = json.dumps(output)
     except Exception as e:
         status = 500
         gv.logger.error(e)
         abort(status=status)
-        output = utils.build_output(task=cfg.get_journey_data, status=status,
+        output = utils.build_output(task=cfg.get_program_data, status=status,
                                         message=str(e), output={})
         response = json.dumps(output)
     return response, status
 
 
 @programs.route('/<program_name>/mos', methods=['GET'])
+@cached_response(lambda program_name: [get_program_scope(program_name)])
 def api_get_program_mos(program_name):
     """
     Gets average MOS value of specific program
@@ -145,6 +176,7 @@ def api_get_program_mos(program_name):
     return response, status
 
 @programs.route('/<program_name>/mos-percentages', methods=['GET'])
+@cached_response(lambda program_name: [get_program_scope(program_name)])
 def api_get_program_mos_percentages(program_name):
     """
     Gets MOS categories of specific program
@@ -214,6 +246,7 @@ def api_get_program_mos_percentages(program_name):
     return response, status
 
 @programs.route('/<program_name>/alert-number', methods=['GET'])
+@cached_response(lambda program_name: [get_program_scope(program_name)])
 def api_get_program_alert_number(program_name):
     """
     Gets number of alerts/warnings of specific program
@@ -274,6 +307,7 @@ def api_get_program_alert_number(program_name):
     return response
 
 @programs.route('/<program_name>/alert-list', methods=['GET'])
+@cached_response(lambda program_name: [get_program_scope(program_name)])
 def api_get_program_alert_list(program_name):
     """
     Gets a list of alerts/warnings of specific program
@@ -291,12 +325,29 @@ def api_get_program_alert_list(program_name):
               schema:
                 type: string
                 example: news1
+            - name: limit
+              in: query
+              required: false
+              description: Maximum number of alerts and of warnings to return. All of them if not provided
+              schema:
+                type: integer
+            - name: cursor
+              in: query
+              required: false
+              description: next_cursor of the previous page
+              schema:
+                type: string
         responses: 
             200:
                 description: List of alerts/warnings of specific program
                 content:
                     application/json:
                         schema: AlertListSchema
+            400: 
+                description: Invalid cursor
+                content:
+                    application/json:
+                        schema: ErrorResponse
             404: 
                 description: Program not found
                 content:
@@ -315,9 +366,14 @@ def api_get_program_alert_list(program_name):
         # Checks if the user has specified a journey datetime for the program
         if "journey_datetime" in request.args:
             pass
-        alerts = gv.api_dm.alert_router.get_alert_warning_list(program_name=program_name)
+        alerts = gv.api_dm.alert_router.get_alert_warning_list(program_name=program_name,
+            limit=request.args.get("limit", type=int), cursor=request.args.get("cursor"))
         # Response
         response = jsonify(alerts)
+    except ValueError as e:
+        status = 400
+        gv.logger.error(e)
+        abort(status=status, description=str(e))
     except AttributeError as e:
         status = 404
         gv.logger.error(e)
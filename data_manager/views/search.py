@@ -1,13 +1,15 @@
-from flask import Blueprint, jsonify, abort, request
+from flask import Blueprint, Response, jsonify, abort, request, stream_with_context
 from helper import global_variables as gv
 from helper import config as cfg
 from helper import utils
+from helper.cache import cached_response, get_search_scopes
 import json
 import traceback
 
 search = Blueprint('search', __name__, url_prefix="/videoAnalysis/search")
 
 @search.route('/data', methods=['POST'])
+@cached_response(get_search_scopes)
 def api_search_data():
     """
     Returns data from a given date range or journey search
@@ -73,7 +75,8 @@ def api_search_url():
         tags: 
             - search
         summary: Returns data from a given date range or journey search
-        description: Returns data from a given date range or journey search
+        description: Returns data from a given date range or journey search. 
+            With stream set to true, the file is returned in chunks instead of its url
         operationId: search_data
         requestBody:
             description: Data for search - Datetimes, Journey, Program and URL.
@@ -86,7 +89,7 @@ def api_search_url():
                             - SearchJourneySchema
         responses: 
             200:
-                description: Url for file resulting from search process
+                description: Url for file resulting from search process, or the file if stream is true
                 content:
                     application/json:
                         schema:
@@ -114,8 +117,13 @@ def api_search_url():
     status = 200
     try:
         body_data = request.get_json(force=True)
-        file_url = gv.api_dm.historic_router.get_historic_search_url(body_data)
-        response = jsonify({"url": file_url})
+        if body_data.get("stream"):
+            filename, mimetype, file_chunks = gv.api_dm.historic_router.get_historic_search_stream(body_data)
+            response = Response(stream_with_context(file_chunks), mimetype=mimetype)
+            response.headers.set('Content-Disposition', 'attachment', filename=filename)
+        else:
+            file_url = gv.api_dm.historic_router.get_historic_search_url(body_data)
+            response = jsonify({"url": file_url})
     except Exception as e:
         gv.logger.error(e)
         gv.logger.error(traceback.print_exc())
@@ -1,6 +1,9 @@
 import pytest
 import utils
 
+# Fixtures shared by every test
+mongo_profiler = utils.mongo_profiler
+
 def pytest_configure():
     pytest.API_BASE_URL = utils.API_BASE_URL
     pytest.DB_HOST = utils.DB_HOST
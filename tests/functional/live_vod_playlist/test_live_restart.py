@@ -0,0 +1,47 @@
+import requests
+import time
+import os
+import signal
+import psutil
+from pymongo import MongoClient
+
+import pytest
+from tests import utils
+
+class TestLiveRestart:
+    """A live probe killed by an external process must be restarted by its supervisor in less than a second.
+    A stopped probe must not be restarted.
+    """
+
+    def get_status(self):
+        mongo_client = MongoClient(pytest.DB_HOST, pytest.DB_PORT)
+        return mongo_client[pytest.DB_NAME].status_data.find_one(sort=[("_id", -1)])
+
+    def wait_new_probe_pid(self, probe_pid, timeout=1):
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            current_probe_pid = self.get_status()["probe_pid"]
+            if current_probe_pid != probe_pid:
+                return current_probe_pid
+            time.sleep(0.01)
+        return probe_pid
+
+    def test_live_restart(self):
+        _  = utils.put_config_new_url(url=pytest.STREAM_URL)
+        response_launch_live = requests.post(f"{pytest.API_BASE_URL}/probe/launch")
+        time.sleep(pytest.LAUNCH_TIME_STREAM)
+        assert response_launch_live.status_code == 200
+
+        probe_pid = self.get_status()["probe_pid"]
+        os.kill(probe_pid, signal.SIGKILL)
+        restarted_probe_pid = self.wait_new_probe_pid(probe_pid)
+        assert restarted_probe_pid != probe_pid
+        assert psutil.pid_exists(restarted_probe_pid)
+
+        response_stop_live = requests.post(f"{pytest.API_BASE_URL}/probe/stop")
+        assert response_stop_live.status_code == 200
+        assert self.wait_new_probe_pid(restarted_probe_pid) == restarted_probe_pid
+        assert not psutil.pid_exists(restarted_probe_pid)
+
+        # Clear database content
+        utils.clear_database()
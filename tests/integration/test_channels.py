@@ -0,0 +1,71 @@
+import requests
+from datetime import datetime
+from pymongo import MongoClient
+
+from tests import utils
+import pytest
+
+CHANNEL_URLS = {
+    "channel_a": "udp://224.0.1.11:5678",
+    "channel_b": "udp://224.0.1.12:5678"
+}
+SEEDED_JOURNEY_DATETIMES = {
+    "channel_a": datetime(2001, 1, 3),
+    "channel_b": datetime(2001, 1, 4)
+}
+
+class TestChannels:
+    """Configures two channels under the same API and checks that config, status and journeys
+    of each one are not seen by the other one nor by the default channel.
+    """
+
+    def test_channels_are_scoped(self):
+        mongo_client = MongoClient(pytest.DB_HOST, pytest.DB_PORT)
+        db = mongo_client[pytest.DB_NAME]
+        try:
+            for channel_id, url in CHANNEL_URLS.items():
+                assert utils.put_config_new_url(url=url, channel_id=channel_id).status_code == 200
+                db.journey.insert_one({
+                    "channel_id": channel_id,
+                    "journey_datetime": SEEDED_JOURNEY_DATETIMES[channel_id],
+                    "mos": 3.5,
+                    "measures": 0,
+                    "mos_sum": 0.0,
+                    "mos_counts": {"mos_poor": 0, "mos_regular": 0, "mos_good": 0, "mos_excellent": 0}
+                })
+
+            for channel_id, url in CHANNEL_URLS.items():
+                response_config = requests.get(f"{pytest.API_BASE_URL}/probe/config", params={"channel_id": channel_id})
+                assert response_config.status_code == 200
+                assert response_config.json()["url"] == url
+                # Same channel chosen by header
+                response_status = requests.get(f"{pytest.API_BASE_URL}/probe/status",
+                                               headers={"X-Channel-Id": channel_id})
+                assert response_status.status_code == 200
+                assert response_status.json()["STATUS"] == "stopped"
+                response_journeys = requests.get(f"{pytest.API_BASE_URL}/journeys/date-list",
+                                                 params={"channel_id": channel_id})
+                assert response_journeys.status_code == 200
+                assert len(response_journeys.json()["journey_date_list"]) == 1
+
+            response_default_config = requests.get(f"{pytest.API_BASE_URL}/probe/config")
+            assert response_default_config.json().get("url") not in CHANNEL_URLS.values()
+
+            response_channels = requests.get(f"{pytest.API_BASE_URL}/probe/channels")
+            assert response_channels.status_code == 200
+            channel_ids = [channel["channel_id"] for channel in response_channels.json()["output"]]
+            assert None in channel_ids
+            for channel_id in CHANNEL_URLS:
+                assert channel_id in channel_ids
+
+            # A source is analysed by a single channel
+            response_taken = utils.put_config_new_url(url=CHANNEL_URLS["channel_a"], channel_id="channel_c")
+            assert response_taken.status_code != 200
+
+            response_unknown = requests.get(f"{pytest.API_BASE_URL}/probe/status", params={"channel_id": "unknown"})
+            assert response_unknown.status_code == 404
+            response_invalid = requests.get(f"{pytest.API_BASE_URL}/probe/status", params={"channel_id": "bad id!"})
+            assert response_invalid.status_code == 400
+        finally:
+            # Clear database content
+            utils.clear_database()
@@ -0,0 +1,58 @@
+import math
+import sys
+from pathlib import Path
+from pymongo import MongoClient
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[2] / "data_manager"))
+from helper import utils
+
+class TestGraphDownsampling:
+    """Checks that the historic graph never returns more points than max_points,
+    downsampled with LTTB or grouped in time buckets by MongoDB.
+    """
+
+    def get_points(self, length):
+        return [(x, math.sin(x / 10) * 5) for x in range(length)]
+
+    @pytest.mark.parametrize("length,max_points", [(1000, 100), (1000, 3), (101, 100), (10, 2)])
+    def test_lttb_max_points(self, length, max_points):
+        points = self.get_points(length)
+        sampled_points = utils.downsample_lttb(points, max_points)
+        assert len(sampled_points) == max_points
+        assert sampled_points[0] == points[0] and sampled_points[-1] == points[-1]
+        assert sampled_points == sorted(sampled_points)
+
+    def test_lttb_short_series(self):
+        points = self.get_points(10)
+        assert utils.downsample_lttb(points, 10) == points
+        assert utils.downsample_lttb(points, 50) == points
+
+    def test_lttb_keeps_peak(self):
+        points = [(x, 0) for x in range(100)]
+        points[42] = (42, 100)
+        assert (42, 100) in utils.downsample_lttb(points, 10)
+
+    @pytest.mark.parametrize("init_time,end_time,resolution,max_points", [
+        (1500, 3499, None, 2), (1500, 3499, 1000, 2), (1, 10000, None, 7), (123457, 987654, 60000, 10), (0, 0, None, 5)
+    ])
+    def test_bucket_count(self, init_time, end_time, resolution, max_points):
+        mongo_client = MongoClient(pytest.DB_HOST, pytest.DB_PORT)
+        collection = mongo_client[pytest.DB_NAME].test_graph_buckets
+        collection.drop()
+        try:
+            step = max(1, (end_time - init_time) // 1000)
+            times = list(range(init_time, end_time, step)) + [end_time]
+            collection.insert_many([{"inserted_at": time} for time in times])
+            bucket_size = utils.get_graph_bucket_size(init_time, end_time, resolution, max_points)
+            buckets = list(collection.aggregate([
+                {"$group": {"_id": utils.get_bucket_start_expression("inserted_at", init_time, bucket_size)}},
+                {"$sort": {"_id": 1}}
+            ]))
+            assert 0 < len(buckets) <= max_points
+            assert buckets[0]["_id"] == init_time
+            if resolution is not None:
+                assert bucket_size >= resolution
+        finally:
+            collection.drop()
@@ -0,0 +1,66 @@
+import requests
+from datetime import datetime, timedelta, timezone
+from pymongo import MongoClient
+
+import pytest
+
+SEEDED_URL = "udp://224.0.1.98:5678"
+SEEDED_HOURS = 24 * 30
+
+class TestHistoricRollups:
+    """Searches a range older than the retention of the raw measures, which must be served from the hourly rollups.
+    Raw measures must have a TTL index.
+    """
+
+    def seed_rollups(self, db, init_datetime):
+        rollups = []
+        for hour in range(SEEDED_HOURS):
+            period_datetime = init_datetime + timedelta(hours=hour)
+            rollups.append({
+                "resolution": "hour",
+                "period_start": int(period_datetime.replace(tzinfo=timezone.utc).timestamp() * 1000),
+                "period_datetime": period_datetime,
+                "journey_datetime": period_datetime.replace(hour=0),
+                "videoSRC": {"url": SEEDED_URL, "program_name": "Rollups", "service_name": "Rollups"},
+                "measures": 1200,
+                "mos_sum": 1200 * 4.0,
+                "mos_min": 3.0,
+                "mos_max": 5.0,
+                "mos_counts": {"mos_poor": 0, "mos_regular": 0, "mos_good": 1200, "mos_excellent": 0},
+                "feature_sums": {"spat_inf_avg": 1200 * 50.0, "temp_inf_avg": 1200 * 10.0, "bitrate": 1200 * 3000.0},
+                "feature_samples": {"spat_inf_avg": 1200, "temp_inf_avg": 1200, "bitrate": 1200},
+                "timestamp": period_datetime.strftime("%Y-%m-%d %H:%M:%S UTC"),
+                "first_values": {"width": 1920, "height": 1080, "frame_rate": 25, "codec": "h264", "mode": "NR"}
+            })
+        db.video_analysis_rollup.insert_many(rollups)
+
+    def test_old_range_from_hour_rollups(self):
+        mongo_client = MongoClient(pytest.DB_HOST, pytest.DB_PORT)
+        db = mongo_client[pytest.DB_NAME]
+        init_datetime = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(days=2 * 365)
+        end_datetime = init_datetime + timedelta(hours=SEEDED_HOURS)
+        self.seed_rollups(db, init_datetime)
+        try:
+            response = requests.post(f"{pytest.API_BASE_URL}/search/data", json={
+                "init_datetime": init_datetime.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "end_datetime": end_datetime.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "url": SEEDED_URL,
+                "max_points": 100
+            })
+            assert response.status_code == 200
+            historic_data = response.json()
+            assert historic_data["tier"] == "hour"
+            assert historic_data["mos"] == 4.0
+            assert historic_data["spat_inf_avg"] == 50.0
+            assert historic_data["mos_percentages"]["mos_good"] == 1
+            graph_data = historic_data["graph_data"]
+            assert 0 < len(graph_data) < SEEDED_HOURS
+            assert sum(point["measures"] for point in graph_data) == SEEDED_HOURS * 1200
+
+            ttl_indexes = [
+                index for index in db.video_analysis.list_indexes()
+                if dict(index["key"]) == {"created_at": 1} and "expireAfterSeconds" in index
+            ]
+            assert len(ttl_indexes) == 1
+        finally:
+            db.video_analysis_rollup.delete_many({"videoSRC.url": SEEDED_URL})
@@ -0,0 +1,71 @@
+import requests
+import random
+from datetime import datetime
+
+import pytest
+
+SEEDED_DOCUMENTS = 100000
+SEEDED_GRAPH_POINTS = 1000
+SEEDED_URL = "udp://224.0.1.99:5678"
+SEEDED_JOURNEY_DATETIME = datetime(2001, 1, 1)
+
+class TestHistoricSearchBenchmark:
+    """Measures the historic search over a large seeded journey.
+    The summary used to run a count, eight distincts, four averages and four category counts before reading the graph data.
+    Now the documents are read once, so only one query (and its getmores) should reach video_analysis.
+    Downsampled graphs must fit in max_points whatever the number of documents.
+    """
+
+    def seed_documents(self, db):
+        documents = []
+        for index in range(SEEDED_DOCUMENTS):
+            documents.append({
+                "journey_datetime": SEEDED_JOURNEY_DATETIME,
+                "inserted_at": index,
+                "timestamp": index,
+                "mode": "NR",
+                "videoSRC": {"url": SEEDED_URL, "service_name": "Benchmark"},
+                "mosAnalysis": {"mos": random.uniform(1, 5)},
+                "videoSettings": {
+                    "width": 1920, "height": 1080, "frame_rate": 25, "pix_format": "yuv420p",
+                    "scan_type": "progressive", "codec": "h264", "pts": index, "video_second": index,
+                    "spat_inf_avg": random.uniform(0, 100), "temp_inf_avg": random.uniform(0, 100),
+                    "bitrate": random.uniform(1000, 5000)
+                }
+            })
+        db.video_analysis.insert_many(documents)
+
+    def test_historic_search_single_query(self, mongo_profiler):
+        db = mongo_profiler.db
+        self.seed_documents(db)
+        try:
+            with mongo_profiler:
+                response = requests.post(f"{pytest.API_BASE_URL}/search/data", json={
+                    "journey_datetime": SEEDED_JOURNEY_DATETIME.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "url": SEEDED_URL,
+                    "max_points": 0
+                })
+            assert response.status_code == 200
+            historic_data = response.json()
+            assert len(historic_data["graph_data"]) == SEEDED_DOCUMENTS
+            assert historic_data["url"] == SEEDED_URL
+            assert round(sum(historic_data["mos_percentages"].values()), 6) == 1
+
+            # Getmores of the same cursor are not counted
+            assert mongo_profiler.count("video_analysis", operations=("query", "command")) == 1
+
+            for downsampling in ["bucket", "lttb"]:
+                response = requests.post(f"{pytest.API_BASE_URL}/search/data", json={
+                    "journey_datetime": SEEDED_JOURNEY_DATETIME.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "url": SEEDED_URL,
+                    "max_points": SEEDED_GRAPH_POINTS,
+                    "downsampling": downsampling
+                })
+                assert response.status_code == 200
+                graph_data = response.json()["graph_data"]
+                assert 0 < len(graph_data) <= SEEDED_GRAPH_POINTS
+                if downsampling == "bucket":
+                    assert sum(point["measures"] for point in graph_data) == SEEDED_DOCUMENTS
+                    assert all(point["mos_min"] <= point["mos"] <= point["mos_max"] for point in graph_data)
+        finally:
+            db.video_analysis.delete_many({"videoSRC.url": SEEDED_URL})
@@ -0,0 +1,118 @@
+from datetime import datetime
+from pymongo import MongoClient
+
+import pytest
+
+SEARCH_DATETIME = datetime(2001, 1, 1)
+SEARCH_URL = "udp://224.0.1.97:5678"
+SEARCH_PROGRAM = "Index coverage"
+# Queries of the default channel filter by a null channel_id
+SEARCH_CHANNEL = "index_coverage"
+ALERT_LIST_SORT = [("start_datetime", -1), ("_id", -1)]
+
+# Query shapes issued by the managers, as (collection, filter, sort). Aggregations are listed by their $match.
+# Reads of any single document of a collection, as the configuration, are not included.
+QUERY_SHAPES = [
+    # HistoricDbManager
+    ("video_analysis", {"channel_id": SEARCH_CHANNEL, "inserted_at": {"$gte": 0, "$lte": 1}}, [("inserted_at", 1)]),
+    ("video_analysis", {
+        "channel_id": SEARCH_CHANNEL, "inserted_at": {"$gte": 0, "$lte": 1}, "videoSRC.url": SEARCH_URL
+    }, [("inserted_at", 1)]),
+    ("video_analysis", {
+        "channel_id": SEARCH_CHANNEL, "inserted_at": {"$gte": 0, "$lte": 1}, "videoSRC.url": SEARCH_URL,
+        "videoSRC.program_name": SEARCH_PROGRAM
+    }, [("inserted_at", 1)]),
+    ("video_analysis", {"channel_id": SEARCH_CHANNEL, "journey_datetime": SEARCH_DATETIME}, [("inserted_at", 1)]),
+    ("video_analysis", {
+        "channel_id": SEARCH_CHANNEL, "journey_datetime": SEARCH_DATETIME, "videoSRC.url": SEARCH_URL,
+        "videoSRC.program_name": SEARCH_PROGRAM
+    }, [("inserted_at", 1)]),
+    ("video_analysis_rollup", {
+        "channel_id": SEARCH_CHANNEL, "resolution": "minute", "period_start": {"$gte": 0, "$lte": 1},
+        "videoSRC.url": SEARCH_URL
+    }, [("period_start", 1)]),
+    ("video_analysis_rollup", {
+        "channel_id": SEARCH_CHANNEL, "resolution": "hour", "journey_datetime": SEARCH_DATETIME
+    }, [("period_start", 1)]),
+    # DocumentDbManager, AnomalyDbManager
+    ("video_analysis", {"channel_id": SEARCH_CHANNEL}, [("_id", -1)]),
+    ("video_analysis", {"channel_id": None}, [("_id", -1)]),
+    # RetentionDbManager, for every channel
+    ("video_analysis", {"inserted_at": {"$gte": 0}}, [("inserted_at", 1)]),
+    ("video_analysis", {"inserted_at": {"$lt": 1}, "created_at": {"$exists": False}}, None),
+    ("video_analysis_rollup", {"resolution": "hour"}, [("period_start", -1)]),
+    # JourneyDbManager
+    ("journey", {"channel_id": SEARCH_CHANNEL, "journey_datetime": SEARCH_DATETIME}, None),
+    ("journey", {"channel_id": SEARCH_CHANNEL}, [("journey_datetime", 1)]),
+    ("journey", {"channel_id": SEARCH_CHANNEL}, [("journey_datetime", -1)]),
+    ("journey", {"channel_id": SEARCH_CHANNEL}, [("_id", -1)]),
+    # ProgramDbManager
+    ("program", {
+        "channel_id": SEARCH_CHANNEL, "journey_datetime": SEARCH_DATETIME, "program_name": SEARCH_PROGRAM
+    }, None),
+    ("program", {"channel_id": SEARCH_CHANNEL, "journey_datetime": SEARCH_DATETIME}, [("start_datetime", -1)]),
+    ("program", {"channel_id": SEARCH_CHANNEL}, [("start_datetime", -1)]),
+    ("program", {"channel_id": SEARCH_CHANNEL}, [("_id", -1)]),
+    ("program_data_bucket", {
+        "channel_id": SEARCH_CHANNEL, "journey_datetime": SEARCH_DATETIME, "program_name": SEARCH_PROGRAM,
+        "bucket_start": {"$gte": 0, "$lte": 1}
+    }, [("bucket_start", 1), ("_id", 1)]),
+    # AlertDbManager
+    ("alert_counter", {"channel_id": SEARCH_CHANNEL, "journey_datetime": SEARCH_DATETIME, "program_name": ""}, None),
+    ("alert_counter", {"channel_id": SEARCH_CHANNEL, "program_name": SEARCH_PROGRAM}, None),
+    # EpgManager, shared by every channel
+    ("epg", {}, [("_id", -1)]),
+    ("epg_program", {"end_datetime": {"$gte": SEARCH_DATETIME}}, None),
+    ("epg_program", {
+        "channel": {"$in": [SEARCH_PROGRAM]}, "start_datetime": {"$gte": SEARCH_DATETIME},
+        "end_datetime": {"$lte": SEARCH_DATETIME}
+    }, None),
+    ("epg_program", {
+        "channel": SEARCH_PROGRAM, "start_datetime": {"$lte": SEARCH_DATETIME}, "end_datetime": {"$gt": SEARCH_DATETIME}
+    }, [("start_datetime", -1)]),
+    ("epg_program", {"channel": SEARCH_PROGRAM, "start_datetime": {"$gte": SEARCH_DATETIME}}, [("start_datetime", 1)]),
+    # IngestPipeline, LiveFeed, StatusCache
+    ("ingest_job", {"channel_id": SEARCH_CHANNEL}, [("_id", 1)]),
+    ("live_event", {"seq": {"$ne": None}}, [("seq", -1)]),
+    ("live_event", {"channel_id": SEARCH_CHANNEL, "seq": {"$gt": 0}}, [("seq", 1)]),
+    ("status_data", {"channel_id": SEARCH_CHANNEL}, [("_id", -1)]),
+    ("status_data", {"channel_id": None}, [("_id", -1)])
+]
+for alert_collection in ["alert", "warn"]:
+    QUERY_SHAPES += [
+        (alert_collection, {
+            "channel_id": SEARCH_CHANNEL, "journey_datetime": SEARCH_DATETIME, "program_name": SEARCH_PROGRAM,
+            "category": "MOS"
+        }, [("start_datetime", -1)]),
+        (alert_collection, {
+            "channel_id": SEARCH_CHANNEL, "journey_datetime": SEARCH_DATETIME, "program_name": SEARCH_PROGRAM
+        }, ALERT_LIST_SORT),
+        (alert_collection, {"channel_id": SEARCH_CHANNEL, "journey_datetime": SEARCH_DATETIME}, ALERT_LIST_SORT),
+        (alert_collection, {"channel_id": SEARCH_CHANNEL, "program_name": SEARCH_PROGRAM}, ALERT_LIST_SORT),
+        (alert_collection, {"channel_id": SEARCH_CHANNEL}, ALERT_LIST_SORT),
+        (alert_collection, {
+            "channel_id": SEARCH_CHANNEL, "start_datetime": {"$gte": SEARCH_DATETIME, "$lte": SEARCH_DATETIME}
+        }, ALERT_LIST_SORT)
+    ]
+
+class TestIndexCoverage:
+    """Explains every query shape of the managers against the indexes created by the API at startup.
+    None of them may scan a whole collection.
+    """
+
+    def get_plan_stages(self, plan):
+        stages = [plan.get("stage")]
+        for input_plan in [plan.get("inputStage")] + plan.get("inputStages", []):
+            if input_plan is not None:
+                stages += self.get_plan_stages(input_plan)
+        return stages
+
+    @pytest.mark.parametrize("collection_name,query,sort", QUERY_SHAPES)
+    def test_query_uses_index(self, collection_name, query, sort):
+        mongo_client = MongoClient(pytest.DB_HOST, pytest.DB_PORT)
+        cursor = mongo_client[pytest.DB_NAME][collection_name].find(query)
+        if sort is not None:
+            cursor = cursor.sort(sort)
+        winning_plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        assert "COLLSCAN" not in self.get_plan_stages(winning_plan), \
+            f"{collection_name} {query} sorted by {sort} scans the collection: {winning_plan}"
@@ -0,0 +1,73 @@
+import os
+import requests
+import signal
+import time
+from bson.objectid import ObjectId
+from pymongo import MongoClient
+
+from tests import utils
+import pytest
+
+RECOVERED_MEASURES = 10
+# Recovery interval of the workers, with margin for the predictions
+RECOVERY_TIMEOUT = 60
+
+class TestIngestRecovery:
+    """Checks that measures acknowledged by the batch endpoint are inserted even if their worker is killed mid-batch.
+    Jobs of a killed worker are taken by any worker when their lease expires, even if its PID is running again.
+    """
+
+    def get_measures(self, db):
+        measures = []
+        for document in db.video_analysis.find({}, {"_id": 0, "mosAnalysis": 0, "inserted_at": 0}).limit(RECOVERED_MEASURES):
+            measures.append(document)
+        return measures
+
+    def wait_inserted(self, db, document_ids):
+        deadline = time.time() + RECOVERY_TIMEOUT
+        while time.time() < deadline:
+            inserted = db.video_analysis.count_documents({"_id": {"$in": [ObjectId(document_id) for document_id in document_ids]}})
+            if inserted == len(document_ids):
+                return inserted
+            time.sleep(1)
+        return inserted
+
+    def test_killed_worker_measures_inserted(self):
+        mongo_client = MongoClient(pytest.DB_HOST, pytest.DB_PORT)
+        db = mongo_client[pytest.DB_NAME]
+        response_put_config = utils.put_config_new_url(url=pytest.STREAM_URL)
+        assert response_put_config.status_code == 200
+        response_launch = requests.post(f"{pytest.API_BASE_URL}/probe/launch")
+        assert response_launch.status_code == 200
+        time.sleep(pytest.LAUNCH_TIME_STREAM)
+        response_stop = requests.post(f"{pytest.API_BASE_URL}/probe/stop")
+        assert response_stop.status_code == 200
+        measures = self.get_measures(db)
+        assert len(measures) == RECOVERED_MEASURES
+
+        response = requests.post(f"{pytest.API_BASE_URL}/documents/batch", json=measures)
+        assert response.status_code == 200
+        document_ids = response.json()["output"]["document IDs"]
+        ingest_job = db.ingest_job.find_one({"document_ids": document_ids[0]})
+        if ingest_job is not None:
+            # Killed mid-batch. Its lease is expired so the test does not wait for it
+            os.kill(ingest_job["worker_pid"], signal.SIGKILL)
+            db.ingest_job.update_one({"_id": ingest_job["_id"]}, {"$set": {"leased_at": 0}})
+        assert self.wait_inserted(db, document_ids) == len(document_ids)
+
+        # Worker that accepted the measures stopped before persisting them, and its PID is running again
+        stopped_document_ids = [str(ObjectId()) for _ in measures]
+        db.ingest_job.insert_one({
+            "measures": measures[len(measures) // 2:],
+            "document_ids": stopped_document_ids[len(measures) // 2:],
+            "headers": {},
+            "worker_pid": os.getpid(),
+            "owner": "stopped-worker",
+            "leased_at": 0,
+            "accepted_at": 0
+        })
+        assert self.wait_inserted(db, stopped_document_ids[len(measures) // 2:]) == len(measures) - len(measures) // 2
+        assert db.ingest_job.count_documents({"owner": "stopped-worker"}) == 0
+
+        # Clear database content
+        utils.clear_database()
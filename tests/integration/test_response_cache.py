@@ -0,0 +1,35 @@
+import requests
+from datetime import datetime
+
+import pytest
+
+SEEDED_JOURNEY_DATETIME = datetime(2001, 1, 2)
+DASHBOARD_REFRESHES = 20
+
+class TestResponseCache:
+    """Counts the queries of repeated dashboard requests for a closed journey using the MongoDB profiler.
+    Only the first request should reach MongoDB, the rest are served from the shared response cache.
+    """
+
+    def test_closed_journey_cached(self, mongo_profiler):
+        db = mongo_profiler.db
+        db.journey.insert_one({
+            "journey_datetime": SEEDED_JOURNEY_DATETIME,
+            "mos": 3.5,
+            "measures": 2,
+            "mos_sum": 7.0,
+            "mos_counts": {"mos_poor": 0, "mos_regular": 0, "mos_good": 2, "mos_excellent": 0}
+        })
+        journey_url = f"{pytest.API_BASE_URL}/journeys/{SEEDED_JOURNEY_DATETIME.strftime('%Y-%m-%dT%H:%M:%SZ')}"
+        try:
+            first_response = requests.get(f"{journey_url}/mos")
+            assert first_response.status_code == 200
+
+            with mongo_profiler:
+                for _ in range(DASHBOARD_REFRESHES):
+                    response = requests.get(f"{journey_url}/mos")
+                    assert response.status_code == 200
+                    assert response.json() == first_response.json()
+            assert mongo_profiler.count("journey") == 0
+        finally:
+            db.journey.delete_many({"journey_datetime": SEEDED_JOURNEY_DATETIME})
@@ -0,0 +1,35 @@
+import requests
+import time
+
+from tests import utils
+import pytest
+
+class TestStatusCache:
+    """Counts the StatusData round trips made per inserted measure using the MongoDB profiler.
+    Before the status cache each insert issued more than a dozen reads of the latest status.
+    """
+
+    def test_status_reads_per_insert(self, mongo_profiler):
+        db = mongo_profiler.db
+        response_put_config = utils.put_config_new_url(url=pytest.STREAM_URL)
+        assert response_put_config.status_code == 200
+        response_launch = requests.post(f"{pytest.API_BASE_URL}/probe/launch")
+        assert response_launch.status_code == 200
+        # Wait until the probe is inserting documents
+        time.sleep(pytest.LAUNCH_TIME_STREAM)
+
+        with mongo_profiler:
+            documents_before = db.video_analysis.count_documents({})
+            time.sleep(pytest.LAUNCH_TIME_STREAM)
+            documents_after = db.video_analysis.count_documents({})
+
+        status_reads = mongo_profiler.count("status_data")
+        inserted_documents = documents_after - documents_before
+        response_stop = requests.post(f"{pytest.API_BASE_URL}/probe/stop")
+        assert response_stop.status_code == 200
+        assert inserted_documents > 0
+
+        assert status_reads < 2 * inserted_documents
+
+        # Clear database content
+        utils.clear_database()
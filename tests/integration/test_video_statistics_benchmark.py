@@ -0,0 +1,90 @@
+import importlib
+import random
+import sys
+import time
+from pathlib import Path
+from bson.objectid import ObjectId
+from pymongo import MongoClient
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[2] / "data_manager"))
+from db_models.video_analysis import VIDEO_STATISTICS_LAYOUTS, VIDEO_STATISTICS_UNPACKED, VIDEO_STATISTICS_VERSION, \
+    pack_video_statistics, unpack_video_statistics
+
+SEEDED_DOCUMENTS = 20000
+
+class TestVideoStatisticsBenchmark:
+    """Compares the storage of the VideoSettings statistics as named fields and packed.
+    The compact layout must round-trip every statistic and take notably less space.
+    """
+
+    def get_video_settings(self, index):
+        # Seeded by index, so the stored statistics can be compared with the generated ones
+        index_random = random.Random(index)
+        video_settings = {
+            "width": 1920, "height": 1080, "frame_rate": 25, "pix_format": "yuv420p",
+            "scan_type": "progressive", "codec": "h264", "pts": index, "video_second": index, "bitrate": 3000.0
+        }
+        for statistic in VIDEO_STATISTICS_LAYOUTS[VIDEO_STATISTICS_VERSION] + VIDEO_STATISTICS_UNPACKED:
+            video_settings[statistic] = index_random.uniform(0, 100)
+        return video_settings
+
+    def insert_documents(self, collection, compact):
+        documents = []
+        for index in range(SEEDED_DOCUMENTS):
+            video_settings = self.get_video_settings(index)
+            if compact:
+                pack_video_statistics(video_settings)
+            documents.append({"inserted_at": index, "videoSettings": video_settings})
+        start_time = time.perf_counter()
+        collection.insert_many(documents)
+        return time.perf_counter() - start_time
+
+    def read_documents(self, collection):
+        start_time = time.perf_counter()
+        video_settings_list = [
+            unpack_video_statistics(document["videoSettings"])
+            for document in collection.find({}, {"_id": 0, "videoSettings": 1}).sort("inserted_at", 1)
+        ]
+        return video_settings_list, time.perf_counter() - start_time
+
+    def test_compact_statistics_smaller(self):
+        mongo_client = MongoClient(pytest.DB_HOST, pytest.DB_PORT)
+        db = mongo_client[pytest.DB_NAME]
+        try:
+            sizes = {}
+            timings = {}
+            for layout, compact in [("named", False), ("compact", True)]:
+                collection = db[f"benchmark_video_statistics_{layout}"]
+                collection.drop()
+                insert_time = self.insert_documents(collection, compact)
+                sizes[layout] = db.command("collStats", collection.name)["size"]
+                stored, read_time = self.read_documents(collection)
+                timings[layout] = {"insert": insert_time, "read": read_time}
+
+                # Every statistic round-trips with the same value in both layouts
+                assert stored == [self.get_video_settings(index) for index in range(SEEDED_DOCUMENTS)]
+            assert sizes["compact"] < sizes["named"] * 0.6
+            for layout_timings in timings.values():
+                assert layout_timings["insert"] > 0 and layout_timings["read"] > 0
+        finally:
+            db.benchmark_video_statistics_named.drop()
+            db.benchmark_video_statistics_compact.drop()
+
+    def test_compact_statistics_published_named(self):
+        # The managers are imported after global_variables, as the service does, to avoid a circular import
+        importlib.import_module("helper.global_variables")
+        from db_models import VideoAnalysis
+        from db_models.video_analysis import VideoSettings
+        from managers.db_managers import DocumentDbManager
+
+        video_settings = self.get_video_settings(0)
+        videoanalysis_db_document = VideoAnalysis(id=ObjectId(), videoSettings=VideoSettings(**video_settings))
+        videoanalysis_db_document.videoSettings.stats_version = VIDEO_STATISTICS_VERSION
+        assert "stats" in videoanalysis_db_document.to_mongo()["videoSettings"]
+
+        published = DocumentDbManager.get_document_dict(videoanalysis_db_document)["videoSettings"]
+        assert "stats" not in published and "stats_version" not in published
+        for statistic in VIDEO_STATISTICS_LAYOUTS[VIDEO_STATISTICS_VERSION] + VIDEO_STATISTICS_UNPACKED:
+            assert published[statistic] == video_settings[statistic]
@@ -23,6 +23,16 @@ class TestVideoQualityProbe:
         # Confirm that the request-response cycle completed successfully.
         assert response.status_code == 200
 
+    def test_resources(self):
+        url = "{}/probe/resources".format(pytest.API_BASE_URL)
+        response = requests.get(url, params={"seconds": 60})
+
+        assert response.status_code == 200
+        resources = response.json()["output"]
+        assert set(resources["trends"]) == {"rss_mb", "cpu_percent", "open_files"}
+        for sample in resources["samples"]:
+            assert sample["time"] >= resources["samples"][-1]["time"] - 60
+
     def test_stop(self):
         url = "{}/probe/stop".format(pytest.API_BASE_URL)
         # Send a request to the mock API server and store the response.
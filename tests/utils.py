@@ -1,6 +1,7 @@
 import requests
 import utils
 import os
+import pytest
 from pymongo import MongoClient
 
 API_BASE_URL = "http://0.0.0.0:{}/videoAnalysis".format(os.getenv("API_PORT"))
@@ -41,8 +42,9 @@ def upload_sample_video(filename=""):
     return response_upload_vod
 
 
-def put_config_new_url(url="url"):
+def put_config_new_url(url="url", channel_id=None):
     response_put_config = requests.put(f"{API_BASE_URL}/probe/config",
+        params={"channel_id": channel_id} if channel_id is not None else None,
         headers={"Content-type": "application/json"},
         json={
                 "alert_mos_threshold": 3.0,
@@ -65,4 +67,49 @@ def put_config_new_url(url="url"):
 def clear_database():
     # Clear database content
     mongo_client = MongoClient(DB_HOST, DB_PORT)
-    mongo_client.drop_database(DB_NAME)
\ No newline at end of file
+    mongo_client.drop_database(DB_NAME)
+
+
+class MongoProfiler:
+    """Records the operations that reach the test database with the MongoDB profiler, while used as a context manager
+
+    :param db: Test database
+    :type db: pymongo.database.Database
+    """
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.command("profile", 0)
+        self.db.system.profile.drop()
+        self.db.command("profile", 2)
+        return self
+
+    def __exit__(self, *args):
+        self.db.command("profile", 0)
+
+    def count(self, collection_name, operations=("query", "command", "getmore")):
+        """Number of operations recorded on a collection
+
+        :param collection_name: Name of the collection
+        :type collection_name: str
+        :param operations: Types of operation counted, defaults to reads
+        :type operations: tuple, optional
+        :return: Number of operations
+        :rtype: int
+        """
+        return self.db.system.profile.count_documents({
+            "ns": f"{DB_NAME}.{collection_name}",
+            "op": {"$in": list(operations)}
+        })
+
+
+@pytest.fixture
+def mongo_profiler():
+    """MongoProfiler of the test database. The profiler is always turned off at the end of the test
+    """
+    mongo_client = MongoClient(DB_HOST, DB_PORT)
+    profiler = MongoProfiler(mongo_client[DB_NAME])
+    yield profiler
+    profiler.db.command("profile", 0)
+    mongo_client.close()